@@ -0,0 +1,159 @@
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class CacheNamespace:
+    """
+    Read-through cache for a family of API payloads
+
+    Every key embeds a global version and a per-scope (usually per-user)
+    version. Invalidation bumps a version instead of hunting down keys, so all
+    variants of a payload (query strings, cursors, page sizes) go stale at
+    once. Cache outages are logged and reads fall back to the database.
+    """
+
+    def __init__(self, name: str, timeout: Optional[int] = DEFAULT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+
+    def _version_key(self, scope) -> str:
+        return f"{self.name}:v:{scope}"
+
+    def _key(self, scope, key: str) -> str:
+        global_key, scope_key = self._version_key('all'), self._version_key(scope)
+        versions = cache.get_many([global_key, scope_key])
+        return f"{self.name}:{versions.get(global_key, 0)}:{scope}:{versions.get(scope_key, 0)}:{key}"
+
+    def get_or_load(self, scope, key: str, loader: Callable[[], Any]) -> Any:
+        """Return the cached value for (scope, key), computing and storing it on a miss"""
+        try:
+            cache_key = self._key(scope, key)
+            value = cache.get(cache_key)
+        except Exception as e:
+            logger.warning(f"Cache read failed for {self.name}: {str(e)}")
+            return loader()
+
+        if value is not None:
+            return value
+
+        value = loader()
+        if value is not None:
+            try:
+                cache.set(cache_key, value, timeout=self.timeout)
+            except Exception as e:
+                logger.warning(f"Cache write failed for {self.name}: {str(e)}")
+        return value
+
+    def invalidate(self, scope='all') -> None:
+        """Drop every cached payload of one scope (or of all scopes)"""
+        version_key = self._version_key(scope)
+        try:
+            if cache.add(version_key, 1, timeout=None):
+                return
+            cache.incr(version_key)
+        except ValueError:
+            # The version expired between add() and incr()
+            cache.set(version_key, 1, timeout=None)
+        except Exception as e:
+            logger.warning(f"Cache invalidation failed for {self.name}: {str(e)}")
+
+
+platform_cache = CacheNamespace('platforms')
+tag_cache = CacheNamespace('tags')
+asset_library_cache = CacheNamespace('asset-libraries')
+campaign_cache = CacheNamespace('campaign-detail')
+
+
+class NotificationCounters:
+    """
+    Per-user notification counters (total, unread, email_sent) kept in the cache
+
+    Counters are seeded from one aggregate query on first read and then moved
+    with atomic INCR/DECR as notifications are created, read or emailed.
+    Writers never seed: adjusting a missing counter is a no-op and writers read
+    through peek(), so a counter is either absent or complete. Bulk deletes (campaign cascades, cleanup) reset
+    the affected users' counters; the TTL bounds drift from other raw writes.
+    """
+    FIELDS = ('total', 'unread', 'email_sent')
+
+    def __init__(self, timeout: Optional[int] = None):
+        self._timeout = timeout
+
+    @property
+    def timeout(self) -> int:
+        if self._timeout is not None:
+            return self._timeout
+        from django.conf import settings
+        return getattr(settings, 'NOTIFICATION_COUNTER_TTL_SECONDS', 3600)
+
+    def _key(self, user_id: int, field: str) -> str:
+        return f"notifications:{user_id}:{field}"
+
+    def _count(self, user_id: int) -> Dict[str, int]:
+        from django.db.models import Count, Q
+        from .models import Notification
+        return Notification.objects.filter(user_id=user_id).aggregate(
+            total=Count('id'),
+            unread=Count('id', filter=Q(is_read=False)),
+            email_sent=Count('id', filter=Q(email_sent=True)),
+        )
+
+    def get(self, user_id: int) -> Dict[str, int]:
+        keys = {field: self._key(user_id, field) for field in self.FIELDS}
+        try:
+            values = cache.get_many(keys.values())
+        except Exception as e:
+            logger.warning(f"Notification counter read failed for user {user_id}: {str(e)}")
+            return self._count(user_id)
+
+        if len(values) == len(keys):
+            return {field: values[key] for field, key in keys.items()}
+
+        counts = self._count(user_id)
+        try:
+            cache.set_many({keys[field]: counts[field] for field in self.FIELDS}, timeout=self.timeout)
+        except Exception as e:
+            logger.warning(f"Notification counter seed failed for user {user_id}: {str(e)}")
+        return counts
+
+    def peek(self, user_id: int) -> Optional[Dict[str, int]]:
+        """Return the counters if they are seeded, else None; never counts or seeds"""
+        keys = {field: self._key(user_id, field) for field in self.FIELDS}
+        try:
+            values = cache.get_many(keys.values())
+        except Exception as e:
+            logger.warning(f"Notification counter read failed for user {user_id}: {str(e)}")
+            return None
+        if len(values) != len(keys):
+            return None
+        return {field: values[key] for field, key in keys.items()}
+
+    def adjust(self, user_id: int, **deltas: int) -> None:
+        """Atomically add deltas (e.g. unread=-1) to the counters that are currently seeded"""
+        for field, delta in deltas.items():
+            if not delta:
+                continue
+            try:
+                cache.incr(self._key(user_id, field), delta)
+            except ValueError:
+                # Not seeded; the next read counts from the table
+                pass
+            except Exception as e:
+                logger.warning(f"Notification counter update failed for user {user_id}: {str(e)}")
+                self.reset(user_id)
+                return
+
+    def reset(self, *user_ids: int) -> None:
+        """Forget the counters of these users; they are recounted on next read"""
+        try:
+            cache.delete_many([self._key(user_id, field) for user_id in user_ids for field in self.FIELDS])
+        except Exception as e:
+            logger.warning(f"Notification counter reset failed: {str(e)}")
+
+
+notification_counters = NotificationCounters()
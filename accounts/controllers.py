@@ -1,60 +1,303 @@
-from django.db import transaction, models
+from django.db import transaction, models, IntegrityError
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from typing import List, Dict, Any, Optional, Union
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import random
 import os
+import threading
+import time
+import httpx
 import openai
 from datetime import datetime, timedelta
 import requests
 import json
 
-from .models import User, Platform, Tag, AssetLibrary, Asset, Campaign, CampaignPost, PostAsset, PostLog,Notification
+from .models import User, Platform, Tag, AssetLibrary, Asset, Campaign, CampaignPost, PostAsset, PostLog,Notification, ImageAnalysis, AssetReservation
+from .cache import notification_counters
+from .events import publish_event
+from .storage import content_hash_from_name
 from .serializers import (
     UserSerializer, PlatformSerializer, TagSerializer, AssetLibrarySerializer, AssetSerializer, 
     CampaignSerializer, CampaignPostSerializer, PostAssetSerializer, PostLogSerializer,NotificationSerializer
 )
 
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+OPENROUTER_CONTENT_MODEL = "openai/gpt-3.5-turbo"
+OPENROUTER_VISION_MODEL = "openai/gpt-4-vision-preview"
+LINKEDIN_SYSTEM_PROMPT = "You are a professional LinkedIn content creator. Create engaging, professional LinkedIn posts that are optimized for the platform. Keep posts concise, professional, and include relevant hashtags when appropriate."
+IMAGE_ANALYSIS_PROMPT = "Analyze this image and provide a detailed description suitable for creating a LinkedIn post. Include what you see, the mood, colors, and any text or objects that could be relevant for social media content."
+
+
+# Process-wide pooled OpenRouter clients
+_openrouter_client = None
+_openrouter_client_pid = None
+_async_openrouter_client = None
+_async_openrouter_client_pid = None
+_openrouter_client_lock = threading.Lock()
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional ``h2`` package"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _openrouter_http_limits() -> httpx.Limits:
+    """Connection pool limits for the shared OpenRouter HTTP clients"""
+    from django.conf import settings
+    return httpx.Limits(
+        max_connections=getattr(settings, 'OPENROUTER_HTTP_MAX_CONNECTIONS', 20),
+        max_keepalive_connections=getattr(settings, 'OPENROUTER_HTTP_MAX_KEEPALIVE', 10),
+        keepalive_expiry=getattr(settings, 'OPENROUTER_HTTP_KEEPALIVE_EXPIRY', 60.0),
+    )
+
+
+def get_openrouter_client() -> openai.OpenAI:
+    """
+    Return the process-wide OpenRouter client
+    
+    The client keeps a pooled, keep-alive HTTP connection (HTTP/2 when ``h2`` is
+    installed) so views and Celery tasks skip the TLS handshake on every call.
+    It is rebuilt after a fork so prefork workers never share sockets.
+    """
+    global _openrouter_client, _openrouter_client_pid
+    from django.conf import settings
+    
+    pid = os.getpid()
+    if _openrouter_client is not None and _openrouter_client_pid == pid:
+        return _openrouter_client
+    
+    with _openrouter_client_lock:
+        if _openrouter_client is None or _openrouter_client_pid != pid:
+            _openrouter_client = openai.OpenAI(
+                base_url=OPENROUTER_BASE_URL,
+                api_key=settings.OPENROUTER_API_KEY,
+                http_client=openai.DefaultHttpxClient(
+                    http2=_http2_available(),
+                    limits=_openrouter_http_limits(),
+                ),
+            )
+            _openrouter_client_pid = pid
+    return _openrouter_client
+
+
+def get_async_openrouter_client() -> openai.AsyncOpenAI:
+    """
+    Return the process-wide async OpenRouter client
+    
+    Built once per process on the same pooled keep-alive (HTTP/2 when ``h2`` is
+    installed) transport settings as the sync client, and rebuilt after a fork.
+    It is meant for the process's long-lived event loop (the ASGI server's).
+    """
+    global _async_openrouter_client, _async_openrouter_client_pid
+    from django.conf import settings
+    
+    pid = os.getpid()
+    if _async_openrouter_client is not None and _async_openrouter_client_pid == pid:
+        return _async_openrouter_client
+    
+    with _openrouter_client_lock:
+        if _async_openrouter_client is None or _async_openrouter_client_pid != pid:
+            _async_openrouter_client = openai.AsyncOpenAI(
+                base_url=OPENROUTER_BASE_URL,
+                api_key=settings.OPENROUTER_API_KEY,
+                http_client=openai.DefaultAsyncHttpxClient(
+                    http2=_http2_available(),
+                    limits=_openrouter_http_limits(),
+                ),
+            )
+            _async_openrouter_client_pid = pid
+    return _async_openrouter_client
+
+
+class RecordingNotFound(ValidationError):
+    """Replay mode was asked for a response that was never recorded"""
+
+
+class ResponseMemoizer:
+    """
+    Opt-in memoization of generate_content and analyze_image responses
+    
+    Modes (settings.AI_RESPONSE_CACHE_MODE):
+        off     - always call the model (default)
+        memory  - in-process LRU cache with TTL eviction
+        record  - memory mode, plus every response is written to the file store
+        replay  - serve responses only from the file store; a miss is an error,
+                  so whole pipelines can be load-tested offline
+    
+    Keys are the SHA-256 of (prompt, model, max_tokens, temperature) for text and
+    of (image content hash, model, prompt) for image analyses.
+    """
+    
+    MODES = ('off', 'memory', 'record', 'replay')
+    
+    def __init__(self, mode: str = 'off', max_entries: int = 1000, ttl_seconds: float = 3600, store_dir: Optional[str] = None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown AI response cache mode: {mode}")
+        self.mode = mode
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.store_dir = store_dir
+        self._entries = OrderedDict()  # key -> (expires_at, response)
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off'
+    
+    @staticmethod
+    def make_key(prompt: str, model: str, max_tokens: int, temperature: float) -> str:
+        payload = json.dumps([prompt, model, max_tokens, temperature], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def make_image_key(content_hash: str, model: str, prompt: str) -> str:
+        payload = json.dumps(['image', content_hash, model, prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Return a memoized response, or None on a miss"""
+        if self.mode == 'replay':
+            return self._read_recording(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+    
+    def set(self, key: str, response: str, request: Dict[str, Any]) -> None:
+        """Memoize a fresh response (and record it in record mode)"""
+        if self.mode in ('off', 'replay'):
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if self.mode == 'record':
+            self._write_recording(key, response, request)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def _recording_path(self, key: str) -> str:
+        return os.path.join(self.store_dir, f"{key}.json")
+    
+    def _read_recording(self, key: str) -> str:
+        try:
+            with open(self._recording_path(key), encoding='utf-8') as f:
+                return json.load(f)['response']
+        except FileNotFoundError:
+            raise RecordingNotFound(f"No recorded AI response for request {key} (replay mode)")
+    
+    def _write_recording(self, key: str, response: str, request: Dict[str, Any]) -> None:
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp_path = f"{self._recording_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'request': request, 'response': response}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._recording_path(key))
+
+
+_response_memoizer = None
+
+
+def get_response_memoizer() -> ResponseMemoizer:
+    """Return the process-wide response memoizer configured from settings"""
+    global _response_memoizer
+    from django.conf import settings
+    
+    if _response_memoizer is None:
+        with _openrouter_client_lock:
+            if _response_memoizer is None:
+                _response_memoizer = ResponseMemoizer(
+                    mode=getattr(settings, 'AI_RESPONSE_CACHE_MODE', 'off'),
+                    max_entries=getattr(settings, 'AI_RESPONSE_CACHE_MAX_ENTRIES', 1000),
+                    ttl_seconds=getattr(settings, 'AI_RESPONSE_CACHE_TTL_SECONDS', 3600),
+                    store_dir=str(getattr(settings, 'AI_RESPONSE_RECORDINGS_DIR', settings.BASE_DIR / 'ai_recordings')),
+                )
+    return _response_memoizer
+
+
 # Simple OpenRouter AI Provider
 class OpenRouterAI:
     """Simple OpenRouter AI provider for content generation"""
     
+    provider_name = 'OpenRouter'
+    
     def __init__(self):
-        from django.conf import settings
-        self.client = openai.OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=settings.OPENROUTER_API_KEY,
-        )
+        self.client = get_openrouter_client()
     
-    def generate_content(self, prompt: str, max_tokens: int = 300) -> str:
-        """Generate content using OpenRouter"""
+    def generate_content(self, prompt: str, max_tokens: int = 300, temperature: float = 0.7) -> str:
+        """Generate content using OpenRouter (memoized when AI_RESPONSE_CACHE_MODE is set)"""
+        memoizer = get_response_memoizer()
+        key = memoizer.make_key(prompt, OPENROUTER_CONTENT_MODEL, max_tokens, temperature)
         try:
+            if memoizer.enabled:
+                cached = memoizer.get(key)
+                if cached is not None:
+                    return cached
+            
             response = self.client.chat.completions.create(
-                model="openai/gpt-3.5-turbo",
+                model=OPENROUTER_CONTENT_MODEL,
                 messages=[
-                    {"role": "system", "content": "You are a professional LinkedIn content creator. Create engaging, professional LinkedIn posts that are optimized for the platform. Keep posts concise, professional, and include relevant hashtags when appropriate."},
+                    {"role": "system", "content": LINKEDIN_SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
                 max_tokens=max_tokens,
-                temperature=0.7,
+                temperature=temperature,
             )
             
-            return response.choices[0].message.content.strip()
-            
+            content = response.choices[0].message.content.strip()
+            memoizer.set(key, content, {
+                'prompt': prompt,
+                'model': OPENROUTER_CONTENT_MODEL,
+                'max_tokens': max_tokens,
+                'temperature': temperature,
+            })
+            return content
+            
+        except RecordingNotFound:
+            raise
         except Exception as e:
             raise ValidationError(f"Error generating content with OpenRouter: {str(e)}")
     
-    def analyze_image(self, image_url: str) -> str:
-        """Analyze image using OpenRouter Vision"""
+    def analyze_image(self, image_url: str, content_hash: Optional[str] = None) -> str:
+        """
+        Analyze image using OpenRouter Vision
+        
+        With the image's content hash the analysis is memoized like
+        generate_content, so replay mode never calls the vision API.
+        """
+        memoizer = get_response_memoizer()
+        key = memoizer.make_image_key(content_hash, OPENROUTER_VISION_MODEL, IMAGE_ANALYSIS_PROMPT) if content_hash else None
         try:
+            if key and memoizer.enabled:
+                cached = memoizer.get(key)
+                if cached is not None:
+                    return cached
+            elif memoizer.mode == 'replay':
+                raise RecordingNotFound("Image analyses can only be replayed by content hash")
+            
             response = self.client.chat.completions.create(
-                model="openai/gpt-4-vision-preview",
+                model=OPENROUTER_VISION_MODEL,
                 messages=[
                     {
                         "role": "user",
                         "content": [
-                            {"type": "text", "text": "Analyze this image and provide a detailed description suitable for creating a LinkedIn post. Include what you see, the mood, colors, and any text or objects that could be relevant for social media content."},
+                            {"type": "text", "text": IMAGE_ANALYSIS_PROMPT},
                             {"type": "image_url", "image_url": {"url": image_url}}
                         ]
                     }
@@ -62,12 +305,204 @@ class OpenRouterAI:
                 max_tokens=500
             )
             
-            return response.choices[0].message.content.strip()
+            analysis = response.choices[0].message.content.strip()
+            if key:
+                memoizer.set(key, analysis, {
+                    'image_sha256': content_hash,
+                    'image_url': image_url,
+                    'model': OPENROUTER_VISION_MODEL,
+                    'prompt': IMAGE_ANALYSIS_PROMPT,
+                })
+            return analysis
             
+        except RecordingNotFound:
+            raise
         except Exception as e:
             raise ValidationError(f"Error analyzing image with OpenRouter Vision: {str(e)}")
 
 
+class AsyncOpenRouterAI:
+    """Async OpenRouter AI provider backed by the process-wide async client"""
+    
+    provider_name = 'OpenRouter'
+    
+    def __init__(self):
+        self.client = get_async_openrouter_client()
+    
+    async def generate_content(self, prompt: str, max_tokens: int = 300, temperature: float = 0.7) -> str:
+        """Generate content using OpenRouter (memoized when AI_RESPONSE_CACHE_MODE is set)"""
+        memoizer = get_response_memoizer()
+        key = memoizer.make_key(prompt, OPENROUTER_CONTENT_MODEL, max_tokens, temperature)
+        try:
+            if memoizer.enabled:
+                cached = memoizer.get(key)
+                if cached is not None:
+                    return cached
+            
+            response = await self.client.chat.completions.create(
+                model=OPENROUTER_CONTENT_MODEL,
+                messages=[
+                    {"role": "system", "content": LINKEDIN_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=max_tokens,
+                temperature=temperature,
+            )
+            
+            content = response.choices[0].message.content.strip()
+            memoizer.set(key, content, {
+                'prompt': prompt,
+                'model': OPENROUTER_CONTENT_MODEL,
+                'max_tokens': max_tokens,
+                'temperature': temperature,
+            })
+            return content
+            
+        except RecordingNotFound:
+            raise
+        except Exception as e:
+            raise ValidationError(f"Error generating content with OpenRouter: {str(e)}")
+    
+    async def analyze_image(self, image_url: str, content_hash: Optional[str] = None) -> str:
+        """Analyze image using OpenRouter Vision (memoized by content hash like OpenRouterAI)"""
+        memoizer = get_response_memoizer()
+        key = memoizer.make_image_key(content_hash, OPENROUTER_VISION_MODEL, IMAGE_ANALYSIS_PROMPT) if content_hash else None
+        try:
+            if key and memoizer.enabled:
+                cached = memoizer.get(key)
+                if cached is not None:
+                    return cached
+            elif memoizer.mode == 'replay':
+                raise RecordingNotFound("Image analyses can only be replayed by content hash")
+            
+            response = await self.client.chat.completions.create(
+                model=OPENROUTER_VISION_MODEL,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": IMAGE_ANALYSIS_PROMPT},
+                            {"type": "image_url", "image_url": {"url": image_url}}
+                        ]
+                    }
+                ],
+                max_tokens=500
+            )
+            
+            analysis = response.choices[0].message.content.strip()
+            if key:
+                memoizer.set(key, analysis, {
+                    'image_sha256': content_hash,
+                    'image_url': image_url,
+                    'model': OPENROUTER_VISION_MODEL,
+                    'prompt': IMAGE_ANALYSIS_PROMPT,
+                })
+            return analysis
+            
+        except RecordingNotFound:
+            raise
+        except Exception as e:
+            raise ValidationError(f"Error analyzing image with OpenRouter Vision: {str(e)}")
+
+
+def get_ai_provider(async_: bool = False) -> Union[OpenRouterAI, AsyncOpenRouterAI]:
+    """
+    Factory shared by views and Celery tasks for the configured AI provider
+    
+    Both providers reuse the process-wide pooled clients above; pass
+    ``async_=True`` from async views for the awaitable provider.
+    """
+    if async_:
+        return AsyncOpenRouterAI()
+    return OpenRouterAI()
+
+
+def compute_file_hash(file_field, chunk_size: int = 64 * 1024) -> str:
+    """SHA-256 of a stored file, read in chunks so large files never sit in memory"""
+    # Content-addressed blobs carry their hash in the name
+    content_hash = content_hash_from_name(file_field.name)
+    if content_hash:
+        return content_hash
+    digest = hashlib.sha256()
+    file_field.open('rb')
+    try:
+        for chunk in file_field.chunks(chunk_size):
+            digest.update(chunk)
+    finally:
+        file_field.close()
+    return digest.hexdigest()
+
+
+class ImageAnalysisCache:
+    """
+    Persistent, content-addressed cache for vision-model image analyses
+    
+    Entries are keyed by the SHA-256 of the image bytes, so identical files share
+    one analysis. Entries older than IMAGE_ANALYSIS_CACHE_TTL_DAYS are ignored; a
+    daily task deletes them and the least recently used rows beyond
+    IMAGE_ANALYSIS_CACHE_MAX_ENTRIES.
+    """
+    
+    def __init__(self, model: str = OPENROUTER_VISION_MODEL):
+        from django.conf import settings
+        self.model = model
+        self.ttl = timedelta(days=getattr(settings, 'IMAGE_ANALYSIS_CACHE_TTL_DAYS', 90))
+        self.max_entries = getattr(settings, 'IMAGE_ANALYSIS_CACHE_MAX_ENTRIES', 10000)
+    
+    def get(self, content_hash: str) -> Optional[str]:
+        """Return the cached analysis for a content hash, or None on miss/expiry"""
+        entry = ImageAnalysis.objects.filter(
+            content_hash=content_hash,
+            model=self.model,
+            created_at__gte=timezone.now() - self.ttl
+        ).only('id', 'analysis').first()
+        if entry is None:
+            return None
+        ImageAnalysis.objects.filter(id=entry.id).update(last_used_at=timezone.now())
+        return entry.analysis
+    
+    def set(self, content_hash: str, analysis: str) -> None:
+        """Store an analysis; a re-analysed image starts a fresh TTL"""
+        now = timezone.now()
+        ImageAnalysis.objects.update_or_create(
+            content_hash=content_hash,
+            defaults={'model': self.model, 'analysis': analysis, 'created_at': now, 'last_used_at': now}
+        )
+    
+    def evict(self) -> int:
+        """Delete expired entries and anything beyond the size limit (run periodically by evict_image_analyses)"""
+        deleted, _ = ImageAnalysis.objects.filter(created_at__lt=timezone.now() - self.ttl).delete()
+        overflow_ids = list(
+            ImageAnalysis.objects.order_by('-last_used_at').values_list('id', flat=True)[self.max_entries:]
+        )
+        if overflow_ids:
+            deleted += ImageAnalysis.objects.filter(id__in=overflow_ids).delete()[0]
+        return deleted
+    
+    def get_or_analyze(self, file_field, image_url: str, ai_provider) -> str:
+        """Return the analysis for an image file, calling the vision model only on a miss"""
+        content_hash = compute_file_hash(file_field)
+        analysis = self.get(content_hash)
+        if analysis is None:
+            analysis = ai_provider.analyze_image(image_url, content_hash=content_hash)
+            self.set(content_hash, analysis)
+        return analysis
+
+
+def pick_random_row(queryset: models.QuerySet) -> Optional[models.Model]:
+    """
+    Return one uniformly random row of a queryset without loading the candidate set
+    
+    Uses COUNT plus a random OFFSET on the primary key index, so only a single
+    row is ever fetched into Python.
+    """
+    total = queryset.count()
+    if not total:
+        return None
+    offset = random.randrange(total)
+    return queryset.order_by('pk')[offset:offset + 1].first()
+
+
 class BaseController:
     """Base controller with common CRUD operations"""
     
@@ -265,19 +700,22 @@ class AssetController(BaseController):
         """Get assets by file type"""
         return self.get_all(file_type=file_type)
     
-    def get_ready_assets(self, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
-        """Get assets that have files"""
+    def _ready_assets_queryset(self, user_id: Optional[int] = None) -> models.QuerySet:
         queryset = Asset.objects.filter(file__isnull=False)
         if user_id:
             queryset = queryset.filter(library__user_id=user_id)
-        serializer = self.serializer(queryset, many=True)
+        return queryset
+    
+    def get_ready_assets(self, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get assets that have files"""
+        serializer = self.serializer(self._ready_assets_queryset(user_id), many=True)
         return serializer.data
     
     def get_random_asset(self, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """Get a random ready asset"""
-        ready_assets = self.get_ready_assets(user_id)
-        if ready_assets:
-            return random.choice(ready_assets)
+        asset = pick_random_row(self._ready_assets_queryset(user_id))
+        if asset:
+            return self.serializer(asset).data
         return None
     
     def add_tags(self, asset_id: int, tag_ids: List[int]) -> bool:
@@ -316,14 +754,15 @@ class AssetController(BaseController):
         except ObjectDoesNotExist:
             return False
     
+    def _unused_assets_queryset(self, user_id: Optional[int] = None) -> models.QuerySet:
+        queryset = Asset.objects.filter(is_used_by_ai=False)
+        if user_id:
+            queryset = queryset.filter(library__user_id=user_id)
+        return queryset
+    
     def get_unused_assets(self, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """Get assets that haven't been used by AI yet"""
-        filters = {'is_used_by_ai': False}
-        if user_id:
-            queryset = Asset.objects.filter(**filters, library__user_id=user_id)
-        else:
-            queryset = Asset.objects.filter(**filters)
-        serializer = self.serializer(queryset, many=True)
+        serializer = self.serializer(self._unused_assets_queryset(user_id), many=True)
         return serializer.data
     
     def get_used_assets(self, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
@@ -355,11 +794,47 @@ class AssetController(BaseController):
     
     def get_random_unused_asset(self, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """Get a random asset that hasn't been used by AI yet"""
-        unused_assets = self.get_unused_assets(user_id)
-        if unused_assets:
-            return random.choice(unused_assets)
+        asset = pick_random_row(self._unused_assets_queryset(user_id))
+        if asset:
+            return self.serializer(asset).data
         return None
     
+    def reserve_for_campaign(self, campaign_id: int, asset_id: int) -> bool:
+        """
+        Atomically claim an asset for a campaign until the reservation expires
+        
+        The (campaign, asset) unique constraint makes the claim race-free across
+        workers without anyone waiting on a lock: a losing worker gets False and
+        simply tries another asset.
+        """
+        from django.conf import settings
+        now = timezone.now()
+        ttl = timedelta(seconds=getattr(settings, 'ASSET_RESERVATION_TTL_SECONDS', 900))
+        
+        with transaction.atomic():
+            # Stale claims from crashed workers do not block the asset
+            AssetReservation.objects.filter(
+                campaign_id=campaign_id, asset_id=asset_id, expires_at__lte=now
+            ).delete()
+            try:
+                with transaction.atomic():
+                    AssetReservation.objects.create(
+                        campaign_id=campaign_id, asset_id=asset_id, expires_at=now + ttl
+                    )
+            except IntegrityError:
+                return False
+            
+            # Another worker may have finished with this asset since it was selected
+            if PostAsset.objects.filter(post__campaign_id=campaign_id, asset_id=asset_id).exists():
+                AssetReservation.objects.filter(campaign_id=campaign_id, asset_id=asset_id).delete()
+                return False
+        
+        return True
+    
+    def release_reservation(self, campaign_id: int, asset_id: int) -> None:
+        """Release a campaign's claim on an asset"""
+        AssetReservation.objects.filter(campaign_id=campaign_id, asset_id=asset_id).delete()
+    
     def reset_asset_usage(self, asset_id: int) -> bool:
         """Reset asset usage tracking (for testing or manual reset)"""
         try:
@@ -523,7 +998,7 @@ class CampaignPostController(BaseController):
             asset = Asset.objects.get(id=asset_id)
             
             # Setup AI provider
-            ai_provider = OpenRouterAI()
+            ai_provider = get_ai_provider()
             
             # Prepare prompt
             prompt = campaign.prompt or "Create an engaging social media post."
@@ -598,19 +1073,23 @@ class LinkedInContentController:
     """Controller for LinkedIn content generation using OpenRouter"""
     
     def __init__(self):
-        self.ai_provider = OpenRouterAI()
+        self.ai_provider = get_ai_provider()
+        self.image_analysis_cache = ImageAnalysisCache()
         self.campaign_controller = CampaignController()
         self.asset_controller = AssetController()
         self.post_controller = CampaignPostController()
         self.used_assets_in_session = set()  # Track assets used in current session
     
-    def generate_linkedin_content(self, campaign_id: int, user_id: Optional[int] = None) -> Dict[str, Any]:
+    def generate_linkedin_content(self, campaign_id: int, user_id: Optional[int] = None, persist: bool = True) -> Dict[str, Any]:
         """
         Generate LinkedIn content using OpenAI with random asset selection
         
         Args:
             campaign_id: ID of the campaign to generate content for
             user_id: Optional user ID to filter assets by user
+            persist: Save the post (linked to its asset) immediately. With False nothing
+                is written and the asset stays reserved until the caller saves it with
+                save_generated_posts (or releases the reservation)
             
         Returns:
             Dict containing the generated content and metadata
@@ -628,16 +1107,20 @@ class LinkedInContentController:
             if not campaign.prompt:
                 raise ValidationError("Campaign must have a prompt for content generation")
             
-            # Get random unused asset from the campaign's asset library
-            asset = self._get_random_unused_asset(campaign.asset_library_id, user_id, campaign_id, self.used_assets_in_session)
+            # Get random unused asset from the campaign's asset library; the reservation
+            # keeps concurrent generations (other threads or workers) off the same asset
+            asset = self._reserve_random_unused_asset(campaign.asset_library_id, user_id, campaign_id, self.used_assets_in_session)
             if not asset:
                 raise ValidationError("No unused assets available for content generation")
             
-            # Add asset to session tracking
             self.used_assets_in_session.add(asset.id)
             
-            # Generate content based on asset type
-            generated_content = self._generate_content_for_asset(campaign, asset)
+            # Generate content based on asset type; give the asset back if that fails
+            try:
+                generated_content = self._generate_content_for_asset(campaign, asset)
+            except Exception:
+                self.asset_controller.release_reservation(campaign_id, asset.id)
+                raise
             
             # Create campaign post with generated content
             post_data = {
@@ -647,15 +1130,17 @@ class LinkedInContentController:
                 'status': 'PENDING'  # Set initial status to PENDING
             }
             print(post_data)
-            publish_date = timezone.now() + timedelta(days=campaign.execution_period)
-            # Create the post in database
-            post = CampaignPost.objects.create(
-                campaign=campaign,
-                content=generated_content,
-                publish_date=publish_date,
-                status=CampaignPost.Status.PENDING
-            )
-            print(f"Created post in database: {post}")
+            if persist:
+                publish_date = timezone.now() + timedelta(days=campaign.execution_period)
+                # Create the post in database; linking the asset consumes the reservation
+                saved = self.save_generated_posts(campaign_id, [{
+                    'content': generated_content,
+                    'publish_date': publish_date,
+                    'asset_id': asset.id
+                }])
+                if not saved['posts']:
+                    raise ValidationError("Asset has already been used in this campaign")
+                print(f"Created post in database: {saved['posts'][0]}")
             
         
             
@@ -688,6 +1173,82 @@ class LinkedInContentController:
                 'error_type': 'unexpected_error'
             }
     
+    def save_generated_posts(self, campaign_id: int, drafts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Persist a batch of generated posts in one transaction
+        
+        Args:
+            campaign_id: ID of the campaign the posts belong to
+            drafts: Dicts with 'content', 'publish_date' and optional 'asset_id', as
+                produced by generate_linkedin_content(..., persist=False)
+            
+        Returns:
+            Dict with the created 'posts' and the 'rejected' drafts whose asset is
+            already used by another post of the campaign (or twice in the batch)
+        """
+        asset_ids = [draft['asset_id'] for draft in drafts if draft.get('asset_id')]
+        # One query replaces PostAsset.clean() for the whole batch
+        taken = set(PostAsset.objects.filter(
+            post__campaign_id=campaign_id, asset_id__in=asset_ids
+        ).values_list('asset_id', flat=True))
+        
+        accepted, rejected = [], []
+        for draft in drafts:
+            asset_id = draft.get('asset_id')
+            if asset_id and asset_id in taken:
+                rejected.append(draft)
+                continue
+            if asset_id:
+                taken.add(asset_id)
+            accepted.append(draft)
+        
+        with transaction.atomic():
+            posts = CampaignPost.objects.bulk_create([
+                CampaignPost(
+                    campaign_id=campaign_id,
+                    content=draft['content'],
+                    publish_date=draft['publish_date'],
+                    status=CampaignPost.Status.PENDING
+                )
+                for draft in accepted
+            ])
+            links = [
+                PostAsset(post=post, asset_id=draft['asset_id'])
+                for post, draft in zip(posts, accepted) if draft.get('asset_id')
+            ]
+            PostAsset.objects.bulk_create(links)
+            PostLog.objects.bulk_create([PostLog(post=post, status='generated') for post in posts])
+            # The linked assets are now permanently used; their claims are consumed
+            AssetReservation.objects.filter(
+                campaign_id=campaign_id, asset_id__in=[link.asset_id for link in links]
+            ).delete()
+        
+        rejected_asset_ids = [draft['asset_id'] for draft in rejected]
+        if rejected_asset_ids:
+            AssetReservation.objects.filter(campaign_id=campaign_id, asset_id__in=rejected_asset_ids).delete()
+        
+        return {'posts': posts, 'rejected': rejected}
+    
+    def _reserve_random_unused_asset(self, library_id: int, user_id: Optional[int], campaign_id: int, excluded_asset_ids: Optional[set] = None, max_attempts: int = 5) -> Optional[Asset]:
+        """
+        Pick a random unused asset and claim it for the campaign
+        
+        Parallel workers generating for the same campaign never receive the same
+        asset, so no AI call is wasted on a PostAsset collision.
+        
+        Returns:
+            The reserved Asset, or None if no asset could be claimed
+        """
+        excluded = set(excluded_asset_ids or ())
+        for _ in range(max_attempts):
+            asset = self._get_random_unused_asset(library_id, user_id, campaign_id, excluded)
+            if asset is None:
+                return None
+            if self.asset_controller.reserve_for_campaign(campaign_id, asset.id):
+                return asset
+            excluded.add(asset.id)
+        return None
+    
     def _get_random_unused_asset(self, library_id: int, user_id: Optional[int] = None, campaign_id: Optional[int] = None, excluded_asset_ids: Optional[set] = None) -> Optional[Asset]:
         """
         Get a random unused asset from the specified library
@@ -721,18 +1282,21 @@ class LinkedInContentController:
                     post__campaign_id=campaign_id
                 ).values_list('asset_id', flat=True)
                 
-                # Exclude already used assets
-                unused_assets = unused_assets.exclude(id__in=used_asset_ids)
+                # Assets currently claimed by another in-flight generation
+                reserved_asset_ids = AssetReservation.objects.filter(
+                    campaign_id=campaign_id,
+                    expires_at__gt=timezone.now()
+                ).values_list('asset_id', flat=True)
+                
+                # Exclude already used and reserved assets
+                unused_assets = unused_assets.exclude(id__in=used_asset_ids).exclude(id__in=reserved_asset_ids)
             
             # If excluded_asset_ids is provided, exclude those assets too
             if excluded_asset_ids:
                 unused_assets = unused_assets.exclude(id__in=excluded_asset_ids)
             
-            if not unused_assets.exists():
-                return None
-            
-            # Get random asset
-            return random.choice(list(unused_assets))
+            # Get random asset without materializing the candidate set
+            return pick_random_row(unused_assets)
             
         except Exception as e:
             raise ValidationError(f"Error selecting random asset: {str(e)}")
@@ -796,10 +1360,16 @@ class LinkedInContentController:
                 #image_url = asset.file.url if hasattr(asset.file, 'url') else str(asset.file)
             
                 
-                image_analysis_result = self.ai_provider.analyze_image(image_url)
+                # Identical image content reuses the stored analysis instead of a new vision call
+                image_analysis_result = self.image_analysis_cache.get_or_analyze(
+                    asset.file, image_url, self.ai_provider
+                )
                 
                 image_analysis = f"\n\nImage Analysis: {image_analysis_result}"
             
+            except RecordingNotFound:
+                # Replaying offline: a missing analysis must fail loudly, not leak into the prompt
+                raise
             except Exception as e:
                 # If image processing fails, continue without it
                 image_analysis = f"\n\nNote: Could not analyze image ({str(e)})"
@@ -851,40 +1421,68 @@ Instructions:
         """Reset the session asset tracking"""
         self.used_assets_in_session.clear()
     
-    def generate_multiple_posts(self, campaign_id: int, count: int = 3, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    def generate_multiple_posts(self, campaign_id: int, count: int = 3, user_id: Optional[int] = None, max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
         """
-        Generate multiple LinkedIn posts for a campaign
+        Generate multiple LinkedIn posts for a campaign concurrently
+        
+        Generations are fanned out over a bounded thread pool so a batch takes
+        roughly as long as a single AI round-trip. Results keep the request order.
+        Every pool thread uses its own controller (and AI provider), so no mutable
+        state is shared; asset reservations keep threads off each other's assets.
         
         Args:
             campaign_id: ID of the campaign
             count: Number of posts to generate
             user_id: Optional user ID for filtering
+            max_workers: Optional concurrency limit (defaults to settings.CONTENT_GENERATION_MAX_WORKERS)
             
         Returns:
             List of generated post results
         """
+        from django.conf import settings
+        
         # Reset session tracking for new batch
         self.reset_session_tracking()
         
-        results = []
+        count = int(count)
+        if count <= 0:
+            return []
         
-        for i in range(count):
+        if max_workers is None:
+            max_workers = getattr(settings, 'CONTENT_GENERATION_MAX_WORKERS', 5)
+        max_workers = max(1, min(int(max_workers), count))
+        
+        def generate_one(controller: 'LinkedInContentController', index: int) -> Dict[str, Any]:
             try:
-                result = self.generate_linkedin_content(campaign_id, user_id)
-                results.append(result)
-                
-                # Add small delay between generations to avoid rate limits
-                if i < count - 1:
-                    import time
-                    time.sleep(1)
-                    
+                return controller.generate_linkedin_content(campaign_id, user_id)
             except Exception as e:
-                results.append({
+                return {
                     'success': False,
-                    'error': f"Failed to generate post {i+1}: {str(e)}",
+                    'error': f"Failed to generate post {index+1}: {str(e)}",
                     'error_type': 'generation_error'
-                })
+                }
+        
+        if max_workers == 1:
+            return [generate_one(self, i) for i in range(count)]
+        
+        workers = threading.local()
+        
+        def generate_one_in_worker(index: int) -> Dict[str, Any]:
+            from django.db import connection
+            controller = getattr(workers, 'controller', None)
+            if controller is None:
+                controller = workers.controller = LinkedInContentController()
+            try:
+                return generate_one(controller, index)
+            finally:
+                # Each worker thread opens its own DB connection; release it
+                connection.close()
         
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='content-gen') as executor:
+            results = list(executor.map(generate_one_in_worker, range(count)))
+        self.used_assets_in_session.update(
+            result['asset_used']['id'] for result in results if result.get('success')
+        )
         return results
     
     def get_generation_stats(self, campaign_id: int, user_id: Optional[int] = None) -> Dict[str, Any]:
@@ -1004,8 +1602,8 @@ Instructions:
         """
         return {
             'provider': 'OpenRouter',
-            'model': 'openai/gpt-3.5-turbo',
-            'vision_model': 'openai/gpt-4-vision-preview',
+            'model': OPENROUTER_CONTENT_MODEL,
+            'vision_model': OPENROUTER_VISION_MODEL,
             'description': 'OpenRouter provides access to multiple AI models including GPT-3.5, GPT-4, and Claude',
             'features': [
                 'Content generation for LinkedIn posts',
@@ -1066,12 +1664,19 @@ class NotificationController(BaseController):
             # Create new notification
             notification_url = f"{base_url}/campaign/{campaign_id}/posts"
             notification_data = {
-                'campaign_id': campaign_id,
-                'user_id': user_id,
+                'campaign': campaign_id,
+                'user': user_id,
                 'notification_url': notification_url
             }
             
-            return self.create(notification_data)
+            notification = self.create(notification_data)
+            notification_counters.adjust(user_id, total=1, unread=1)
+            payload = {'notification': notification}
+            counts = notification_counters.peek(user_id)
+            if counts is not None:
+                payload['unread_count'] = counts['unread']
+            publish_event(user_id, 'notification.created', payload)
+            return notification
             
         except Exception as e:
             raise ValidationError(f"Error creating notification: {str(e)}")
@@ -1082,9 +1687,12 @@ class NotificationController(BaseController):
             notification = Notification.objects.get(id=notification_id)
             
             # Update notification as sent
+            was_sent = notification.email_sent
             notification.email_sent = True
             notification.email_sent_at = timezone.now()
             notification.save()
+            if not was_sent:
+                notification_counters.adjust(notification.user_id, email_sent=1)
             
             # Here you would integrate with your email service
             # For now, we'll just mark it as sent
@@ -1098,14 +1706,19 @@ class NotificationController(BaseController):
             raise ValidationError(f"Error sending email notification: {str(e)}")
     
     def get_notification_stats(self, user_id: Optional[int] = None) -> Dict[str, Any]:
-        """Get notification statistics"""
-        queryset = Notification.objects.all()
+        """Get notification statistics (per-user stats come from the cached counters)"""
         if user_id:
-            queryset = queryset.filter(user_id=user_id)
+            counts = notification_counters.get(user_id)
+        else:
+            counts = Notification.objects.aggregate(
+                total=models.Count('id'),
+                unread=models.Count('id', filter=models.Q(is_read=False)),
+                email_sent=models.Count('id', filter=models.Q(email_sent=True)),
+            )
         
-        total_notifications = queryset.count()
-        unread_notifications = queryset.filter(is_read=False).count()
-        email_sent_count = queryset.filter(email_sent=True).count()
+        total_notifications = counts['total']
+        unread_notifications = counts['unread']
+        email_sent_count = counts['email_sent']
         
         return {
             'total_notifications': total_notifications,
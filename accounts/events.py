@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+USER_CHANNEL_PREFIX = 'events:user:'
+
+_publisher: Optional[redis.Redis] = None
+
+
+def user_channel(user_id: int) -> str:
+    return f"{USER_CHANNEL_PREFIX}{user_id}"
+
+
+def get_event_publisher() -> redis.Redis:
+    """Process-wide Redis client used to publish events (redis-py pools are fork-safe)"""
+    global _publisher
+    if _publisher is None:
+        _publisher = redis.Redis.from_url(settings.EVENTS_REDIS_URL)
+    return _publisher
+
+
+def publish_event(user_id: int, event: str, data: Dict[str, Any]) -> None:
+    """
+    Push an event to every stream the user has open
+
+    Publishing happens after the surrounding transaction commits, so clients
+    never hear about rows they cannot read yet. Failures are logged; clients
+    recover by polling.
+    """
+    message = json.dumps({'event': event, 'data': data}, default=str)
+
+    def send():
+        try:
+            get_event_publisher().publish(user_channel(user_id), message)
+        except Exception as e:
+            logger.warning(f"Could not publish {event} for user {user_id}: {str(e)}")
+
+    transaction.on_commit(send)
+
+
+def publish_post_status_changed(post, user_id: int) -> None:
+    publish_event(user_id, 'post.status_changed', {
+        'post_id': post.id,
+        'campaign_id': post.campaign_id,
+        'status': post.status,
+    })
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Encode one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class EventBroker:
+    """
+    Fans Redis pub/sub messages out to the SSE connections of this process
+
+    One pattern subscription per process serves every open stream, so an idle
+    client costs an asyncio queue rather than a Redis connection.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._queues: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+        self._listener: Optional[asyncio.Task] = None
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._queues[user_id].add(queue)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._queues.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._queues[user_id]
+        if not self._queues and self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    def dispatch(self, channel: str, message: str) -> None:
+        """Hand a published message to the user's open streams, dropping it for stalled ones"""
+        try:
+            user_id = int(channel[len(USER_CHANNEL_PREFIX):])
+        except ValueError:
+            return
+        for queue in list(self._queues.get(user_id, ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                logger.warning(f"Dropping event for a stalled stream of user {user_id}")
+
+    async def _listen(self) -> None:
+        """Relay published messages while any stream is open, reconnecting after Redis errors"""
+        while self._queues:
+            client = aioredis.Redis.from_url(settings.EVENTS_REDIS_URL)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{USER_CHANNEL_PREFIX}*")
+                async for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    channel, data = message['channel'], message['data']
+                    self.dispatch(
+                        channel.decode() if isinstance(channel, bytes) else channel,
+                        data.decode() if isinstance(data, bytes) else data,
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Event listener lost its Redis subscription: {str(e)}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+
+
+event_broker = EventBroker()
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-17 05:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_imageanalysis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reserved_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='accounts.asset')),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='asset_reservations', to='accounts.campaign')),
+            ],
+            options={
+                'unique_together': {('campaign', 'asset')},
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.4 on 2026-10-17 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_assetreservation'),
+        ('django_celery_beat', '0019_alter_periodictasks_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(condition=models.Q(('is_used_by_ai', False)), fields=['library'], name='asset_library_unused_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['library', 'is_used_by_ai'], name='asset_library_used_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['start_date', 'end_date'], name='campaign_active_dates_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['user', 'status'], name='campaign_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaignpost',
+            index=models.Index(fields=['campaign', 'publish_date'], name='post_campaign_publish_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaignpost',
+            index=models.Index(fields=['campaign', 'status', 'created_at'], name='post_campaign_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaignschedule',
+            index=models.Index(condition=models.Q(('is_enabled', True)), fields=['next_run_at'], name='schedule_enabled_next_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read'], name='notification_user_read_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['user'], name='notification_user_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['is_read', 'email_sent', 'sent_at'], name='notification_read_sent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('email_sent', True), ('is_read', False)), fields=['sent_at'], name='notification_reminder_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+LEGACY_TASK_NAME_PREFIXES = (
+    'Auto schedule posts for campaign ',
+    'Custom schedule for campaign ',
+    'Schedule posts for campaign ',
+)
+
+
+def remove_per_campaign_periodic_tasks(apps, schema_editor):
+    """Campaign periods are now dispatched by process_due_campaigns; drop the per-campaign beat rows"""
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTasks = apps.get_model('django_celery_beat', 'PeriodicTasks')
+    deleted = 0
+    for prefix in LEGACY_TASK_NAME_PREFIXES:
+        deleted += PeriodicTask.objects.filter(name__startswith=prefix).delete()[0]
+    if deleted:
+        # Tell running beat schedulers to reload
+        PeriodicTasks.objects.update_or_create(ident=1, defaults={'last_update': timezone.now()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_pagination_ordering_indexes'),
+        ('django_celery_beat', '0019_alter_periodictasks_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_per_campaign_periodic_tasks, migrations.RunPython.noop),
+    ]
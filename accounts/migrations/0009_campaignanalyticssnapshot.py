@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_remove_per_campaign_periodic_tasks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignAnalyticsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_posts', models.PositiveIntegerField(default=0)),
+                ('published_posts', models.PositiveIntegerField(default=0)),
+                ('pending_posts', models.PositiveIntegerField(default=0)),
+                ('assets_used', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField()),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analytics_snapshots', to='accounts.campaign')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'unique_together': {('campaign', 'date')},
+            },
+        ),
+    ]
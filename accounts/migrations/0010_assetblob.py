@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:19
+
+import accounts.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def seed_blob_references(apps, schema_editor):
+    """Track files stored before deduplication; they keep their names and are not re-hashed"""
+    Asset = apps.get_model('accounts', 'Asset')
+    AssetBlob = apps.get_model('accounts', 'AssetBlob')
+    references = Asset.objects.exclude(file='').values('file').annotate(refs=Count('id')).order_by()
+    AssetBlob.objects.bulk_create(
+        [AssetBlob(name=row['file'], ref_count=row['refs']) for row in references.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_campaignanalyticssnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('content_hash', models.CharField(blank=True, db_index=True, max_length=64, null=True)),
+                ('size', models.BigIntegerField(blank=True, null=True)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='asset',
+            name='file',
+            field=models.FileField(storage=accounts.storage.get_asset_storage, upload_to='assets/'),
+        ),
+        migrations.RunPython(seed_blob_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:21
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_assetblob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('file_type', models.CharField(choices=[('image', 'Image'), ('video', 'Video'), ('audio', 'Audio'), ('other', 'Other')], max_length=20)),
+                ('file_name', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField(help_text='Total file size in bytes')),
+                ('part_size', models.PositiveIntegerField(help_text='Size of every part but the last, in bytes')),
+                ('sha256', models.CharField(help_text='Expected SHA-256 of the whole file (hex)', max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('asset', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='accounts.asset')),
+                ('library', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to='accounts.assetlibrary')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='asset_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
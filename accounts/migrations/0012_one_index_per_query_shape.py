@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# One index per query shape. The indexes kept, and the query each serves:
+#   asset_library_unused_idx      unused assets of a library (AI asset picking)
+#   asset library FK index        any other filter on a library's assets
+#   campaign_active_dates_idx     running campaigns (due-post checks, status updates)
+#   campaign_user_status_idx      a user's campaigns, with or without status
+#   post_campaign_publish_idx     a campaign's posts by publish date
+#   post_campaign_status_idx      a campaign's posts by status, newest first
+#   notification_user_unread_idx  a user's unread notifications
+#   notification user FK index    all of a user's notifications
+#   notification_reminder_idx     reminder emails for emailed, still unread notifications
+#   notification sent_at index    cleanup of old read notifications
+# The removed indexes and FK indexes were prefixes or supersets of these.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_assetupload'),
+    ]
+
+    operations = [
+        # Same leading column as the library FK index; the bare boolean cannot use the second column
+        migrations.RemoveIndex(
+            model_name='asset',
+            name='asset_library_used_idx',
+        ),
+        # Unread lookups use notification_user_unread_idx, user-only lookups the user FK index
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notification_user_read_idx',
+        ),
+        # Reminders use notification_reminder_idx, cleanup the sent_at index
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notification_read_sent_idx',
+        ),
+        # Covered by campaign_user_status_idx
+        migrations.AlterField(
+            model_name='campaign',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        # Covered by post_campaign_publish_idx and post_campaign_status_idx
+        migrations.AlterField(
+            model_name='campaignpost',
+            name='campaign',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='posts', to='accounts.campaign'),
+        ),
+    ]
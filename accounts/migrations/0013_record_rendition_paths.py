@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_one_index_per_query_shape'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='rendition_paths',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
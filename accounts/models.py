@@ -1,11 +1,22 @@
-from django.db import models
+import logging
+import uuid
+
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django_celery_beat.models import CrontabSchedule
 
 
 from django.contrib.auth.models import AbstractUser
 
+from .cache import notification_counters
+from .events import publish_event
+from .storage import content_hash_from_name, get_asset_storage
+
+logger = logging.getLogger(__name__)
+
+
 class User(AbstractUser):
     class Role(models.TextChoices):
         ADMIN = "ADMIN", "Admin"
@@ -78,18 +89,174 @@ class Asset(models.Model):
     library = models.ForeignKey(AssetLibrary, on_delete=models.CASCADE, related_name='assets')
     name = models.CharField(max_length=100)
     file_type = models.CharField(max_length=20, choices=FILE_TYPES)
-    file = models.FileField(upload_to='assets/')
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Stored content-addressed: assets with identical bytes share one AssetBlob
+    file = models.FileField(upload_to='assets/', storage=get_asset_storage)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     tags = models.ManyToManyField(Tag, blank=True)
     # Usage tracking fields
     is_used_by_ai = models.BooleanField(default=False, help_text="Whether this asset has been used by AI for content generation")
     used_at = models.DateTimeField(null=True, blank=True, help_text="When this asset was last used by AI")
     usage_count = models.PositiveIntegerField(default=0, help_text="Number of times this asset has been used by AI")
+    # Rendition name -> storage path (a generated file or the original), written when renditions are generated
+    rendition_paths = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Boolean filters are emitted as bare "col"/"NOT col", which only partial indexes can serve.
+            # Unused assets of a library (AI asset picking); other library filters use the library FK index
+            models.Index(fields=['library'], condition=models.Q(is_used_by_ai=False), name='asset_library_unused_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class AssetBlob(models.Model):
+    """
+    A stored asset file and the number of Asset rows referencing it
+
+    Asset create/update/delete signals acquire and release references; the
+    file and its renditions are removed once the last reference is released.
+    Files stored before deduplication have no content_hash.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    size = models.BigIntegerField(null=True, blank=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+    @classmethod
+    def acquire(cls, name: str) -> None:
+        """
+        Record one more Asset referencing the stored file ``name``
+
+        Storage reuses an existing blob without writing, so a release of the
+        same content can delete the file between that decision and this call.
+        Holding the row lock, a newly created row therefore re-checks the file
+        and writes the reused upload back.
+        """
+        if not name:
+            return
+        storage = get_asset_storage()
+        content = storage.take_reused_content(name)
+        with transaction.atomic():
+            blob, created = cls.objects.select_for_update().get_or_create(
+                name=name,
+                defaults={'content_hash': content_hash_from_name(name), 'size': cls._stored_size(name)},
+            )
+            cls.objects.filter(pk=blob.pk).update(ref_count=models.F('ref_count') + 1)
+            restorable = content is not None and not getattr(content, 'closed', False)
+            if created and restorable and storage.restore(name, content):
+                logger.warning(f"Restored blob {name} deleted by a concurrent release")
+                cls.objects.filter(pk=blob.pk).update(size=cls._stored_size(name))
+
+    @classmethod
+    def release(cls, name: str) -> None:
+        """
+        Drop one reference to ``name``, deleting the file after commit when it was the last
+
+        Untracked files (rows written with bulk_create) are deleted only when
+        no Asset refers to them any more.
+        """
+        if not name:
+            return
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                if Asset.objects.filter(file=name).exists():
+                    return
+            elif blob.ref_count > 1:
+                cls.objects.filter(pk=blob.pk).update(ref_count=models.F('ref_count') - 1)
+                return
+            else:
+                blob.delete()
+            transaction.on_commit(lambda: cls.delete_if_unreferenced(name))
+
+    @staticmethod
+    def _stored_size(name: str):
+        try:
+            return get_asset_storage().size(name)
+        except OSError:
+            return None
+
+    @classmethod
+    def delete_if_unreferenced(cls, name: str) -> None:
+        """Delete the stored file ``name`` and its renditions unless an Asset references it"""
+        from .renditions import delete_renditions
+        with transaction.atomic():
+            # Hold the row (a placeholder if the release removed it) so a
+            # concurrent acquire waits until the file is gone and restores it
+            blob, _ = cls.objects.select_for_update().get_or_create(
+                name=name, defaults={'content_hash': content_hash_from_name(name)}
+            )
+            # The same content may have been uploaded again since the release
+            if blob.ref_count > 0:
+                return
+            storage = get_asset_storage()
+            delete_renditions(name, storage)
+            storage.delete(name)
+            blob.delete()
+
+
+class AssetUpload(models.Model):
+    """
+    A resumable chunked upload of one asset file
+
+    Parts are written at their offsets into one preallocated file, which
+    completion checks against ``sha256`` and moves into storage as an Asset.
+    The random primary key also names the upload directory.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('completed', 'Completed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='asset_uploads')
+    library = models.ForeignKey(AssetLibrary, on_delete=models.CASCADE, related_name='uploads')
+    name = models.CharField(max_length=100)
+    file_type = models.CharField(max_length=20, choices=Asset.FILE_TYPES)
+    file_name = models.CharField(max_length=255)
+    size = models.BigIntegerField(help_text="Total file size in bytes")
+    part_size = models.PositiveIntegerField(help_text="Size of every part but the last, in bytes")
+    sha256 = models.CharField(max_length=64, help_text="Expected SHA-256 of the whole file (hex)")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    asset = models.ForeignKey(Asset, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
+
+    @property
+    def part_count(self) -> int:
+        return -(-self.size // self.part_size)
+
+    def part_length(self, index: int) -> int:
+        """Expected byte length of part ``index`` (0-based)"""
+        if index == self.part_count - 1:
+            return self.size - self.part_size * index
+        return self.part_size
+
+
+class ImageAnalysis(models.Model):
+    """Cached vision-model analysis of an image, keyed by the SHA-256 of its content"""
+    content_hash = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+    analysis = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Image Analysis"
+        verbose_name_plural = "Image Analyses"
+
+    def __str__(self):
+        return f"Analysis {self.content_hash[:12]} ({self.model})"
+
+
 class Campaign(models.Model):
     SESSION_TYPES = (
         ('single', 'Single Session'),
@@ -103,7 +270,8 @@ class Campaign(models.Model):
         ('paused', 'Paused'),
     )
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Indexed by campaign_user_status_idx, whose leading column serves user-only filters
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     title = models.CharField(max_length=200)
     start_date = models.DateTimeField()
     end_date = models.DateTimeField()
@@ -117,6 +285,14 @@ class Campaign(models.Model):
     prompt = models.TextField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # Running campaigns (due-post checks, status updates)
+            models.Index(fields=['start_date', 'end_date'], condition=models.Q(is_active=True), name='campaign_active_dates_idx'),
+            # A user's campaigns, optionally by status
+            models.Index(fields=['user', 'status'], name='campaign_user_status_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -147,6 +323,9 @@ class CampaignSchedule(models.Model):
     class Meta:
         verbose_name = "Campaign Schedule"
         verbose_name_plural = "Campaign Schedules"
+        indexes = [
+            models.Index(fields=['next_run_at'], condition=models.Q(is_enabled=True), name='schedule_enabled_next_idx'),
+        ]
         
         
 class CampaignPost(models.Model):
@@ -157,7 +336,8 @@ class CampaignPost(models.Model):
         PUBLISHED = "PUBLISHED", "Published"
         DRAFT = "DRAFT", "Draft"
     
-    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='posts')
+    # Indexed by the (campaign, ...) composites below, which also serve campaign-only filters
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='posts', db_index=False)
     content = models.TextField()
     publish_date = models.DateTimeField()
     status = models.CharField(
@@ -166,13 +346,18 @@ class CampaignPost(models.Model):
         default=Status.PENDING,
         help_text="Status of the post"
     )
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
     assets = models.ManyToManyField(Asset, through='PostAsset')
 
     class Meta:
         ordering = ['-created_at']
-        
+        indexes = [
+            # A campaign's posts by publish date (calendar, per-day checks)
+            models.Index(fields=['campaign', 'publish_date'], name='post_campaign_publish_idx'),
+            # A campaign's posts by status, newest first
+            models.Index(fields=['campaign', 'status', 'created_at'], name='post_campaign_status_idx'),
+        ]
 
 
     def __str__(self):
@@ -203,6 +388,45 @@ class PostAsset(models.Model):
         super().save(*args, **kwargs)
 
 
+class AssetReservation(models.Model):
+    """Short-lived claim on an asset while a post for a campaign is being generated"""
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='asset_reservations')
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='reservations')
+    reserved_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('campaign', 'asset')
+
+    def __str__(self):
+        return f"Asset {self.asset_id} reserved for campaign {self.campaign_id} until {self.expires_at}"
+
+
+class CampaignAnalyticsSnapshot(models.Model):
+    """Daily rollup of a campaign's post counters, written by generate_campaign_analytics"""
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='analytics_snapshots')
+    date = models.DateField()
+    total_posts = models.PositiveIntegerField(default=0)
+    published_posts = models.PositiveIntegerField(default=0)
+    pending_posts = models.PositiveIntegerField(default=0)
+    assets_used = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        # The (campaign, date) unique index also serves the analytics endpoint's
+        # (-date, -id) keyset: SQLite index entries end in the rowid, so the
+        # tie-break needs no sort step
+        unique_together = ('campaign', 'date')
+        ordering = ['-date']
+
+    @property
+    def success_rate(self):
+        return (self.published_posts / self.total_posts * 100) if self.total_posts > 0 else 0
+
+    def __str__(self):
+        return f"Analytics for campaign {self.campaign_id} on {self.date}"
+
+
 class PostLog(models.Model):
     post = models.OneToOneField(CampaignPost, on_delete=models.CASCADE, related_name='log')
     status = models.CharField(max_length=50)
@@ -313,7 +537,7 @@ class Notification(models.Model):
     campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='notifications')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
     notification_url = models.URLField(max_length=500, help_text="URL sent to user for posting")
-    sent_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(auto_now_add=True, db_index=True)
     is_read = models.BooleanField(default=False, help_text="Whether user has accessed the notification URL")
     accessed_at = models.DateTimeField(null=True, blank=True)
     email_sent = models.BooleanField(default=False)
@@ -322,12 +546,30 @@ class Notification(models.Model):
     class Meta:
         unique_together = ('campaign', 'user')
         ordering = ['-sent_at']
+        indexes = [
+            # Unread notifications of a user; all of a user's notifications use the user FK index
+            models.Index(fields=['user'], condition=models.Q(is_read=False), name='notification_user_unread_idx'),
+            # Reminder emails for notifications still unread a day after the email
+            models.Index(
+                fields=['sent_at'], condition=models.Q(is_read=False, email_sent=True), name='notification_reminder_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"Notification for {self.campaign.title} - {self.user.username}"
     
     def mark_as_read(self):
         """Mark notification as read and set accessed time"""
+        now = timezone.now()
+        # Conditional UPDATE: only the request that actually flips is_read moves the counter
+        flipped = Notification.objects.filter(pk=self.pk, is_read=False).update(is_read=True, accessed_at=now)
         self.is_read = True
-        self.accessed_at = timezone.now()
-        self.save()
\ No newline at end of file
+        if flipped:
+            self.accessed_at = now
+            notification_counters.adjust(self.user_id, unread=-1)
+            payload = {'notification_id': self.pk}
+            counts = notification_counters.peek(self.user_id)
+            if counts is not None:
+                payload['unread_count'] = counts['unread']
+            publish_event(self.user_id, 'notification.read', payload)
+        return bool(flipped)
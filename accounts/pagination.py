@@ -0,0 +1,25 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination used by every list endpoint
+
+    Pages are addressed by an opaque cursor on an indexed column instead of an
+    OFFSET, so deep pages cost the same as the first one. Views choose the
+    ordering with a ``cursor_ordering`` attribute (first field is the cursor
+    position, the rest break ties); clients may pass ``?page_size=``.
+    """
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        from django.conf import settings
+        return getattr(settings, 'API_MAX_PAGE_SIZE', 200)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', None) or self.ordering
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
@@ -0,0 +1,226 @@
+import hashlib
+import io
+import logging
+import posixpath
+from typing import Dict, Optional
+
+from django.core.files.base import ContentFile
+from django.urls import reverse
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+# name -> bounding box; images are scaled down to fit, never up
+RENDITIONS = {
+    'thumb': (320, 320),
+    'preview': (1024, 1024),
+    'full': (1920, 1080),
+}
+
+RENDITION_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+RENDITION_EXTENSION = 'webp' if RENDITION_FORMAT == 'WEBP' else 'jpg'
+RENDITION_QUALITY = 82
+# Sources in these formats are served as they are for renditions they already fit
+WEB_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+
+
+def _rendition_dir(file_name: str) -> str:
+    return posixpath.join('renditions', hashlib.sha1(file_name.encode()).hexdigest()[:16])
+
+
+def rendition_path(asset, name: str) -> str:
+    """
+    Deterministic storage path of an asset rendition
+
+    The directory is derived from the stored file name only: assets sharing a
+    deduplicated blob share its renditions, and replacing an asset's file
+    yields new paths so stale renditions are never served.
+    """
+    return posixpath.join(_rendition_dir(asset.file.name), f"{name}.{RENDITION_EXTENSION}")
+
+
+# EXIF orientations that swap width and height once applied
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def _fitted_size(size, box):
+    ratio = min(box[0] / size[0], box[1] / size[1], 1)
+    return max(1, round(size[0] * ratio)), max(1, round(size[1] * ratio))
+
+
+def render_renditions(source, boxes: Dict[str, tuple]) -> Dict[str, Optional[bytes]]:
+    """
+    Encode several renditions of one image with a single decode
+
+    ``source`` is a path, a file object or raw bytes. JPEGs are decoded with
+    draft mode at the smallest DCT scale that still covers the largest
+    rendition, so a 24MP photo is never fully decoded for a 1920px output.
+    Smaller renditions are derived from the larger ones.
+
+    A rendition the source already fits maps to None when the source is
+    upright and in a format browsers display: the original serves it and
+    nothing is decoded or encoded. Otherwise it is transcoded once and shared.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    with Image.open(source) as image:
+        orientation = image.getexif().get(0x0112, 1)
+        transposed = orientation in _TRANSPOSED_ORIENTATIONS
+        raw_size = image.size
+        upright_size = raw_size[::-1] if transposed else raw_size
+        targets = {name: _fitted_size(upright_size, box) for name, box in boxes.items()}
+
+        servable = image.format in WEB_FORMATS and orientation == 1
+        encoded = {name: None for name, target in targets.items() if servable and target == raw_size}
+        targets = {name: target for name, target in targets.items() if name not in encoded}
+        if not targets:
+            return encoded
+
+        largest = max(targets.values())
+        image.draft('RGB', largest[::-1] if transposed else largest)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        by_size = {}
+        for name, target in sorted(targets.items(), key=lambda item: item[1], reverse=True):
+            if target not in by_size:
+                if image.size != target:
+                    image = image.resize(target, Image.Resampling.LANCZOS, reducing_gap=2.0)
+                output = io.BytesIO()
+                image.save(output, format=RENDITION_FORMAT, quality=RENDITION_QUALITY)
+                by_size[target] = output.getvalue()
+            encoded[name] = by_size[target]
+    return encoded
+
+
+def recorded_rendition(asset, name: str) -> Optional[str]:
+    """
+    Storage path recorded for a rendition when it was generated, else None
+
+    Only paths matching the asset's current file count, so replacing the file
+    invalidates them without touching storage.
+    """
+    path = (asset.rendition_paths or {}).get(name)
+    if path in (rendition_path(asset, name), asset.file.name):
+        return path
+    return None
+
+
+def _record_renditions(asset, paths: Dict[str, str]) -> None:
+    """Record rendition paths on every asset sharing the stored file"""
+    from .models import Asset
+    recorded = {**(asset.rendition_paths or {}), **paths}
+    # QuerySet.update: the blob reference signals must not run for this bookkeeping
+    Asset.objects.filter(file=asset.file.name).update(rendition_paths=recorded)
+    asset.rendition_paths = recorded
+
+
+def get_or_create_rendition(asset, name: str) -> str:
+    """
+    Return the storage path of a rendition, generating it on first request
+
+    Raises KeyError for an unknown rendition name.
+    """
+    size = RENDITIONS[name]
+    path = recorded_rendition(asset, name)
+    if path:
+        return path
+
+    storage = asset.file.storage
+    path = rendition_path(asset, name)
+    if not storage.exists(path):
+        with asset.file.open('rb') as source:
+            data = render_renditions(source, {name: size})[name]
+        if data is None:
+            # The original already fits
+            path = asset.file.name
+        elif not storage.exists(path):
+            # A concurrent request may have written it meanwhile; keep a single copy
+            storage.save_as(path, ContentFile(data))
+            logger.info(f"Generated {name} rendition for asset {asset.id}")
+    _record_renditions(asset, {name: path})
+    return path
+
+
+def rendition_urls(asset, request=None) -> Optional[Dict[str, str]]:
+    """
+    URLs of every rendition of an image asset
+
+    Renditions recorded on the asset point straight at the media URL; the
+    others point at the endpoint that generates them on first request.
+    Storage is never consulted, so listings cost no filesystem calls.
+    """
+    if asset.file_type != 'image' or not asset.file:
+        return None
+    storage = asset.file.storage
+    urls = {}
+    for name in RENDITIONS:
+        path = recorded_rendition(asset, name)
+        if path:
+            url = storage.url(path)
+        else:
+            url = reverse('asset-rendition', kwargs={'pk': asset.id, 'rendition': name})
+        urls[name] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+def _missing_renditions(asset) -> Dict[str, tuple]:
+    storage = asset.file.storage
+    return {
+        name: box for name, box in RENDITIONS.items()
+        if not recorded_rendition(asset, name) and not storage.exists(rendition_path(asset, name))
+    }
+
+
+def _save_renditions(asset, encoded: Dict[str, Optional[bytes]]) -> int:
+    storage = asset.file.storage
+    created = 0
+    for name, data in encoded.items():
+        path = rendition_path(asset, name)
+        if data is not None and not storage.exists(path):
+            storage.save_as(path, ContentFile(data))
+            created += 1
+    return created
+
+
+def _asset_source(asset):
+    """A local path when the storage has one, else the bytes"""
+    try:
+        return asset.file.path
+    except NotImplementedError:
+        with asset.file.open('rb') as source:
+            return source.read()
+
+
+def generate_renditions(asset) -> int:
+    """
+    Eagerly generate every missing rendition of an image asset from one decode
+
+    Records where every rendition is stored on the asset rows; returns how
+    many rendition files were made.
+    """
+    boxes = _missing_renditions(asset)
+    encoded = render_renditions(_asset_source(asset), boxes) if boxes else {}
+    created = _save_renditions(asset, encoded)
+    paths = {}
+    for name in RENDITIONS:
+        if name not in encoded:
+            paths[name] = recorded_rendition(asset, name) or rendition_path(asset, name)
+        else:
+            paths[name] = rendition_path(asset, name) if encoded[name] is not None else asset.file.name
+    if paths != asset.rendition_paths:
+        _record_renditions(asset, paths)
+    return created
+
+
+def delete_renditions(file_name: str, storage) -> None:
+    """Remove every generated rendition of a stored file"""
+    root = _rendition_dir(file_name)
+    try:
+        _, file_names = storage.listdir(root)
+    except FileNotFoundError:
+        return
+    for rendition in file_names:
+        storage.delete(posixpath.join(root, rendition))
@@ -0,0 +1,199 @@
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from celery.signals import worker_process_init
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CampaignSchedule
+
+logger = logging.getLogger(__name__)
+
+CHANGE_MARKER_KEY = 'campaign_schedules:version'
+
+
+def mark_schedules_changed() -> Optional[int]:
+    """
+    Bump the shared change marker so every process reloads its index
+
+    CampaignSchedule signals call this after commit; writes that bypass
+    signals (QuerySet.update, bulk_create, bulk_update) must call it too.
+    Returns the new marker, or None when the cache is unavailable.
+    """
+    try:
+        if cache.add(CHANGE_MARKER_KEY, 1, timeout=None):
+            return 1
+        return cache.incr(CHANGE_MARKER_KEY)
+    except ValueError:
+        # The marker was evicted between add() and incr()
+        cache.set(CHANGE_MARKER_KEY, 1, timeout=None)
+        return 1
+    except Exception as e:
+        logger.warning(f"Could not bump the schedule change marker: {str(e)}")
+        return None
+
+
+def _read_change_marker() -> Optional[int]:
+    try:
+        return cache.get(CHANGE_MARKER_KEY, 0)
+    except Exception as e:
+        logger.warning(f"Could not read the schedule change marker: {str(e)}")
+        return None
+
+
+class DueScheduleIndex:
+    """
+    In-process min-heap of enabled CampaignSchedules ordered by next_run_at
+
+    process_due_campaigns asks the heap which schedules are due instead of
+    scanning the table. Entries are replaced lazily: the heap may hold stale
+    (time, id) pairs, and only the pair matching ``_next_run`` for an id is live.
+
+    The heap is per process. Local writes are applied through CampaignSchedule
+    signals; writes in any other process bump a shared change marker in the
+    cache (``mark_schedules_changed``), and ``ensure_fresh`` rebuilds the heap
+    when the marker moved past the version it was loaded at. A quiet tick
+    therefore costs one cache read and a heap pop, never a table query (while
+    the cache is unreachable every tick reloads instead). The heap is also
+    rebuilt at worker start and every ``refresh_seconds`` in case a marker
+    bump was lost.
+    """
+
+    def __init__(self, refresh_seconds: float = 300):
+        self.refresh_seconds = refresh_seconds
+        self._heap = []  # (next_run_at, schedule_id)
+        self._next_run: Dict[int, datetime] = {}
+        self._loaded_at: Optional[float] = None
+        self._version: Optional[int] = None
+        self._lock = threading.RLock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def rebuild(self, version: Optional[int] = None) -> int:
+        """
+        Reload every enabled schedule from the database
+
+        ``version`` is the change marker read *before* the query, so a change
+        committed while loading moves the marker past it and forces a reload.
+        """
+        if version is None:
+            version = _read_change_marker()
+        rows = CampaignSchedule.objects.filter(
+            is_enabled=True, next_run_at__isnull=False
+        ).values_list('id', 'next_run_at')
+        with self._lock:
+            self._next_run = dict(rows)
+            self._heap = [(next_run_at, schedule_id) for schedule_id, next_run_at in self._next_run.items()]
+            heapq.heapify(self._heap)
+            self._loaded_at = time.monotonic()
+            self._version = version
+        logger.info(f"Due schedule index rebuilt with {len(self._next_run)} schedules")
+        return len(self._next_run)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def ensure_fresh(self) -> None:
+        """Rebuild when unloaded, expired or another process changed a schedule"""
+        version = _read_change_marker()
+        with self._lock:
+            stale = (
+                self._loaded_at is None
+                or version is None
+                or version != self._version
+                or time.monotonic() - self._loaded_at > self.refresh_seconds
+            )
+        if stale:
+            self.rebuild(version)
+
+    def mark_changed(self) -> None:
+        """
+        Publish a change this process already applied to its own heap
+
+        The bumped marker is adopted when nothing else changed in between, so
+        the writer does not reload for its own write.
+        """
+        version = mark_schedules_changed()
+        with self._lock:
+            if version is not None and self._version is not None and version == self._version + 1:
+                self._version = version
+
+    def upsert(self, schedule_id: int, next_run_at: Optional[datetime]) -> None:
+        """Track a schedule's new due time; ``None`` removes it"""
+        with self._lock:
+            if next_run_at is None:
+                self._next_run.pop(schedule_id, None)
+                return
+            if self._next_run.get(schedule_id) == next_run_at:
+                return
+            self._next_run[schedule_id] = next_run_at
+            heapq.heappush(self._heap, (next_run_at, schedule_id))
+
+    def remove(self, schedule_id: int) -> None:
+        self.upsert(schedule_id, None)
+
+    def _drop_stale_head(self) -> None:
+        while self._heap and self._next_run.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_due_at(self) -> Optional[datetime]:
+        with self._lock:
+            self._drop_stale_head()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[int]:
+        """Remove and return the ids of every schedule due at or before ``now``"""
+        due = []
+        with self._lock:
+            self._drop_stale_head()
+            while self._heap and self._heap[0][0] <= now:
+                _, schedule_id = heapq.heappop(self._heap)
+                self._next_run.pop(schedule_id, None)
+                due.append(schedule_id)
+                self._drop_stale_head()
+        return due
+
+    def __len__(self) -> int:
+        return len(self._next_run)
+
+
+def _build_index() -> DueScheduleIndex:
+    from django.conf import settings
+    return DueScheduleIndex(refresh_seconds=getattr(settings, 'SCHEDULE_INDEX_REFRESH_SECONDS', 300))
+
+
+due_schedule_index = _build_index()
+
+
+@receiver(post_save, sender=CampaignSchedule)
+def sync_due_schedule_index(sender, instance, **kwargs):
+    if due_schedule_index.is_loaded:
+        due_schedule_index.upsert(instance.id, instance.next_run_at if instance.is_enabled else None)
+    transaction.on_commit(due_schedule_index.mark_changed)
+
+
+@receiver(post_delete, sender=CampaignSchedule)
+def remove_from_due_schedule_index(sender, instance, **kwargs):
+    if due_schedule_index.is_loaded:
+        due_schedule_index.remove(instance.id)
+    transaction.on_commit(due_schedule_index.mark_changed)
+
+
+@worker_process_init.connect
+def rebuild_due_schedule_index(**kwargs):
+    """Load the index when a worker process starts so the first tick is already warm"""
+    try:
+        due_schedule_index.rebuild()
+    except Exception as e:
+        # The first process_due_campaigns tick will retry the load
+        due_schedule_index.invalidate()
+        logger.error(f"Could not rebuild due schedule index at worker start: {str(e)}")
@@ -1,5 +1,8 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Platform, Tag, AssetLibrary, Asset, Campaign, CampaignPost, PostAsset, PostLog,User,CampaignSchedule, Notification
+from .renditions import rendition_urls
+from .uploads import received_parts
+from .models import Platform, Tag, AssetLibrary, Asset, Campaign, CampaignPost, PostAsset, PostLog,User,CampaignSchedule, Notification, CampaignAnalyticsSnapshot, AssetUpload
 
 
 
@@ -37,13 +40,52 @@ class AssetSerializer(serializers.ModelSerializer):
     library_name = serializers.CharField(source='library.name', read_only=True)
     # برای نمایش تگ‌ها
     tags = TagSerializer(many=True, read_only=True) # برای نمایش جزئیات تگ‌ها
+    # نسخه‌های کوچک‌شده تصویر (thumb / preview / full)؛ در اولین درخواست ساخته می‌شوند
+    renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Asset
-        fields = "__all__"
+        # rendition_paths is bookkeeping behind `renditions`
+        exclude = ('rendition_paths',)
         # اگر فایل باید آپلود شود، اطمینان حاصل کنید که 'file' در 'fields' باشد
         # و در view مربوطه از Parser مناسب استفاده کنید (مثل MultiPartParser)
 
+    def get_renditions(self, obj):
+        return rendition_urls(obj, self.context.get('request'))
+
+class AssetUploadSerializer(serializers.ModelSerializer):
+    """Resumable upload session; part_size is chosen by the server (ASSET_UPLOAD_PART_SIZE)"""
+    part_count = serializers.IntegerField(read_only=True)
+    received_parts = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AssetUpload
+        fields = [
+            'id', 'library', 'name', 'file_type', 'file_name', 'size', 'sha256', 'part_size',
+            'part_count', 'received_parts', 'status', 'asset', 'created_at'
+        ]
+        read_only_fields = ['part_size', 'status', 'asset', 'created_at']
+
+    def get_received_parts(self, obj):
+        return received_parts(obj)
+
+    def validate_library(self, library):
+        request = self.context.get('request')
+        if request and library.user_id != request.user.id:
+            raise serializers.ValidationError('Asset library not found.')
+        return library
+
+    def validate_size(self, size):
+        if size < 1 or size > settings.ASSET_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f'Size must be between 1 and {settings.ASSET_UPLOAD_MAX_SIZE} bytes.')
+        return size
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if len(value) != 64 or any(c not in '0123456789abcdef' for c in value):
+            raise serializers.ValidationError('Expected a hex-encoded SHA-256 digest.')
+        return value
+
 class PostAssetSerializer(serializers.ModelSerializer):
     asset_name = serializers.CharField(source='asset.name', read_only=True)
     # برای اعتبارسنجی 'clean' در مدل PostAsset:
@@ -88,7 +130,7 @@ class CampaignScheduleSerializer(serializers.ModelSerializer):
         read_only_fields = ['last_run_at', 'next_run_at']
 
 class CampaignSerializer(serializers.ModelSerializer):
-    platform_title = serializers.CharField(source='platform.title', read_only=True)
+    platform_title = serializers.CharField(source='platform.get_name_display', read_only=True)
     asset_library_name = serializers.CharField(source='asset_library.name', read_only=True)
     tags = TagSerializer(many=True, read_only=True)
 
@@ -112,6 +154,16 @@ class CampaignSerializer(serializers.ModelSerializer):
             })
         return data
 
+class CampaignAnalyticsSnapshotSerializer(serializers.ModelSerializer):
+    success_rate = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = CampaignAnalyticsSnapshot
+        fields = [
+            'date', 'total_posts', 'published_posts', 'pending_posts',
+            'assets_used', 'success_rate', 'computed_at'
+        ]
+
 class PostLogSerializer(serializers.ModelSerializer):
     post_id = serializers.IntegerField(source='post.id', read_only=True)
     post_content = serializers.CharField(source='post.content', read_only=True)
@@ -1,8 +1,8 @@
-import json
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.db import transaction
 from django.dispatch import receiver
-from django_celery_beat.models import PeriodicTask, CrontabSchedule
-from .models import Campaign, CampaignSchedule
+from .cache import asset_library_cache, campaign_cache, notification_counters, platform_cache, tag_cache
+from .models import Asset, AssetBlob, AssetLibrary, Campaign, CampaignSchedule, Platform, Tag
 from .tasks import schedule_campaign_posts
 from django.utils import timezone
 
@@ -24,7 +24,9 @@ def create_initial_campaign_schedule(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=CampaignSchedule)
 def update_next_run_on_schedule_save(sender, instance, created, **kwargs):
-    if created or instance.next_run_at is None:
+    # Only fill in a missing first run; a schedule disabled by the dispatcher
+    # (next_run_at=None) must stay disabled
+    if created and instance.next_run_at is None:
         next_run = instance.start_date or timezone.now()
         instance.next_run_at = next_run
         instance.is_enabled = True
@@ -36,95 +38,80 @@ def campaign_created_handler(sender, instance, created, **kwargs):
     """
     وقتی کمپین جدید ساخته می‌شود:
     - اجرای فوری تسک schedule_campaign_posts
-    - ثبت برنامه زمان‌بندی در Celery Beat بر اساس execution_period کمپین
+    
+    Later periods are dispatched by process_due_campaigns from the campaign's
+    CampaignSchedule, so no per-campaign Celery Beat entry is created.
     """
     if created:
         print(f"🚀 New campaign created: {instance.id} - {instance.title}")
 
-        # اجرای فوری تسک برای ساخت پست‌های اولیه
-        schedule_campaign_posts.delay()
-
-        # -----------------------------
-        # ساخت زمان‌بندی بر اساس execution_period
-        # -----------------------------
-        # اگر execution_period به روز باشد (مثلاً 3 یعنی هر سه روز)
-        try:
-            period_days = int(instance.execution_period)
-        except (ValueError, TypeError):
-            period_days = 1  # پیش‌فرض روزانه
-
-        if period_days <= 0:
-            period_days = 1
-
-        # ساخت الگوی کرون برای اجرای هر N روز
-        # کرون استاندارد پشتیبانی مستقیم از "هر N روز" ندارد، پس از day_of_month یا day_of_week استفاده می‌کنیم
-        # اگر کمتر از 7 روز → تکرار در week-based pattern
-        if period_days < 7:
-            # هر چند روز یک‌بار بر اساس day_of_week
-            day_of_week_pattern = ",".join(str(i) for i in range(0, 7, period_days))
-            schedule, _ = CrontabSchedule.objects.get_or_create(
-                minute='0',
-                hour='10',
-                day_of_week=day_of_week_pattern,
-                day_of_month='*',
-                month_of_year='*',
-                timezone='Asia/Tehran'
-            )
-        else:
-            # اگر بزرگتر مساوی یک هفته → از day_of_month استفاده می‌کنیم
-            day_of_month_pattern = ",".join(str(i) for i in range(1, 32, period_days))
-            schedule, _ = CrontabSchedule.objects.get_or_create(
-                minute='0',
-                hour='10',
-                day_of_week='*',
-                day_of_month=day_of_month_pattern,
-                month_of_year='*',
-                timezone='Asia/Tehran'
-            )
-
-        # ثبت در Celery Beat
-        PeriodicTask.objects.create(
-            crontab=schedule,
-            name=f"Auto schedule posts for campaign {instance.id}",
-            task='campaigns.tasks.schedule_campaign_posts',
-            args=json.dumps([]),  # بدون پارامتر چون تسک خودش همه کمپین‌ها رو پیدا می‌کند
-            start_time=instance.start_date,
-            expires=instance.end_date
-        )
+        # اجرای فوری تسک برای ساخت پست‌های اولیه (فقط همین کمپین)
+        transaction.on_commit(lambda: schedule_campaign_posts.delay(instance.id))
 
-        print(f"📅 Celery Beat periodic task created for campaign {instance.id} with execution_period={period_days} days")
 
+# --- Asset blob reference counting ---
+# Identical uploads share one stored file; each Asset holds a reference on it
 
-@receiver(post_save, sender=CampaignSchedule)
-def campaign_schedule_created_handler(sender, instance, created, **kwargs):
-    """
-    وقتی یک CampaignSchedule ساخته میشه:
-    - یک periodic task با الگوی کرون‌تب مشخص در Celery Beat ثبت می‌کنه
-    """
-    if created and instance.is_enabled:
-        # اگر crontab_schedule تعریف نشده بود، یک الگوی پیش‌فرض استفاده می‌کنیم
-        crontab = getattr(instance, 'crontab_schedule', '0 10 * * 1')  # دوشنبه ساعت 10
-
-        try:
-            minute, hour, day_of_month, month_of_year, day_of_week = crontab.split()
-        except ValueError:
-            # اگر مقدار crontab نادرست بود، از پیش‌فرض استفاده کن
-            minute, hour, day_of_month, month_of_year, day_of_week = '0', '10', '*', '*', '1'
-
-        schedule, _ = CrontabSchedule.objects.get_or_create(
-            minute=minute,
-            hour=hour,
-            day_of_month=day_of_month,
-            month_of_year=month_of_year,
-            day_of_week=day_of_week,
-            timezone='Asia/Tehran'
-        )
+_DEFERRED = object()
+
+def _stored_file_name(instance, default=None):
+    # Read the raw attribute so deferred loads (.only()) do not trigger a query
+    value = instance.__dict__.get('file', default)
+    if value is _DEFERRED:
+        return value
+    return getattr(value, 'name', value) or None
+
+@receiver(post_init, sender=Asset)
+def remember_asset_file(sender, instance, **kwargs):
+    instance._loaded_file_name = _stored_file_name(instance, _DEFERRED)
+
+@receiver(post_save, sender=Asset)
+def acquire_asset_blob(sender, instance, created, update_fields=None, **kwargs):
+    previous = None if created else instance._loaded_file_name
+    if previous is _DEFERRED or (update_fields and 'file' not in update_fields):
+        # This save could not have changed the file
+        return
+    name = _stored_file_name(instance)
+    if created or name != previous:
+        AssetBlob.acquire(name)
+        AssetBlob.release(previous)
+    instance._loaded_file_name = name
+
+@receiver(post_delete, sender=Asset)
+def release_asset_blob(sender, instance, **kwargs):
+    AssetBlob.release(_stored_file_name(instance))
+
+
+# --- Cache invalidation ---
+# Platforms and tags are shared, so their changes drop every user's campaign
+# payloads; libraries and campaigns only invalidate their owner's entries
+
+@receiver([post_save, post_delete], sender=Platform)
+def invalidate_platform_cache(sender, instance, **kwargs):
+    platform_cache.invalidate()
+    campaign_cache.invalidate()
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tag_cache(sender, instance, **kwargs):
+    tag_cache.invalidate()
+    campaign_cache.invalidate()
+
+@receiver([post_save, post_delete], sender=AssetLibrary)
+def invalidate_asset_library_cache(sender, instance, **kwargs):
+    asset_library_cache.invalidate(instance.user_id)
+    campaign_cache.invalidate(instance.user_id)
+
+@receiver([post_save, post_delete], sender=Campaign)
+def invalidate_campaign_cache(sender, instance, **kwargs):
+    campaign_cache.invalidate(instance.user_id)
+    if kwargs.get('signal') is post_delete:
+        # The campaign's notifications were cascade-deleted; Notification has no
+        # delete receivers to move the counters, so recount them on next read
+        notification_counters.reset(instance.user_id)
 
-        PeriodicTask.objects.create(
-            crontab=schedule,
-            name=f"Custom schedule for campaign {instance.campaign.id}",
-            task='accounts.tasks.schedule_campaign_posts',
-            args=json.dumps([instance.campaign.id]),
-            start_time=instance.start_date,
-            expires=instance.end_date
-        )
\ No newline at end of file
+@receiver(m2m_changed, sender=Campaign.tags.through)
+def invalidate_campaign_cache_on_tags(sender, instance, **kwargs):
+    if isinstance(instance, Campaign):
+        campaign_cache.invalidate(instance.user_id)
+    else:
+        campaign_cache.invalidate()
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+import threading
+from typing import Optional, Tuple
+
+from django.core.files.storage import FileSystemStorage
+
+BLOB_ROOT = 'blobs'
+_BLOB_NAME = re.compile(rf'^{BLOB_ROOT}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/(?P<hash>[0-9a-f]{{64}})(\.[\w]+)?$')
+# Content whose save reused an existing blob, per thread, until AssetBlob.acquire takes it
+_reused_content = threading.local()
+
+
+def content_hash_from_name(name: str) -> Optional[str]:
+    """SHA-256 encoded in a content-addressed blob name, or None for other files"""
+    match = _BLOB_NAME.match(name or '')
+    return match.group('hash') if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File storage that keeps one copy of each distinct file content
+
+    Uploads are hashed in a streaming pass and stored as
+    ``blobs/<aa>/<bb>/<sha256><ext>``; saving content that is already stored
+    writes nothing and returns the existing name. Blobs are shared, so
+    callers must not delete them directly: AssetBlob reference counts decide
+    when the last user is gone.
+    """
+
+    @staticmethod
+    def blob_name(content_hash: str, name: str) -> str:
+        """Storage name of content with this hash, keeping the extension of ``name``"""
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(BLOB_ROOT, content_hash[:2], content_hash[2:4], f"{content_hash}{extension}")
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            from django.core.files import File
+            content = File(content, name)
+
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        blob_name = self.blob_name(digest.hexdigest(), name)
+        if self.exists(blob_name):
+            # Kept so acquire can write it back if a concurrent release deletes the blob
+            self._reused().clear()
+            self._reused()[blob_name] = content
+            return blob_name
+        # A concurrent writer of the same content makes _save fall back to a
+        # suffixed name: a redundant copy, but never a corrupt one
+        content.seek(0)
+        return super()._save(blob_name, content)
+
+    def adopt(self, path: str, content_hash: str, name: str) -> Tuple[str, bool]:
+        """
+        Move a local file whose SHA-256 the caller already verified into the store
+
+        The file is renamed into place (no copy on the same filesystem), or
+        discarded when the content is already stored. Returns the blob name
+        and whether the file was moved (False when an existing blob was reused).
+        """
+        blob_name = self.blob_name(content_hash, name)
+        if self.exists(blob_name):
+            os.remove(path)
+            return blob_name, False
+        full_path = self.path(blob_name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        shutil.move(path, full_path)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return blob_name, True
+
+    @staticmethod
+    def _reused():
+        if not hasattr(_reused_content, 'blobs'):
+            _reused_content.blobs = {}
+        return _reused_content.blobs
+
+    def take_reused_content(self, blob_name: str):
+        """Content of this thread's last save that reused ``blob_name`` without writing, if any"""
+        return self._reused().pop(blob_name, None)
+
+    def restore(self, blob_name: str, content) -> bool:
+        """Write ``content`` back under ``blob_name`` if the blob is missing; returns True if written"""
+        if self.exists(blob_name):
+            return False
+        content.seek(0)
+        self._save(blob_name, content)
+        return True
+
+    def save_as(self, name, content, max_length=None):
+        """Store derived files (renditions) under the given name, bypassing content addressing"""
+        return super().save(name, content, max_length)
+
+
+def get_asset_storage():
+    """Storage used by Asset.file (a callable so migrations do not capture settings)"""
+    return asset_storage
+
+
+asset_storage = ContentAddressedStorage()
@@ -1,20 +1,24 @@
-from celery import shared_task
+from celery import shared_task, chord, group
+from django.db.models import Count, Max, Min, Q
 from django.utils import timezone
-from django.core.mail import send_mail
+from django.utils.dateparse import parse_date, parse_datetime
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection, send_mail
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 import os
 import logging
-from typing import List, Dict, Any
-from PIL import Image, ImageOps
-import io
-from django.core.files.base import ContentFile
+from typing import List, Dict, Any, Tuple
 from .models import (
-    Campaign, CampaignPost, PostAsset, PostLog, Asset, AssetLibrary, 
-    GeneratedContent, Notification, User,CampaignSchedule
+    Campaign, CampaignAnalyticsSnapshot, CampaignPost, PostLog, Asset, AssetLibrary, 
+    AssetUpload, GeneratedContent, Notification, User,CampaignSchedule
 )
-from .controllers import LinkedInContentController, NotificationController
+from .cache import campaign_cache, notification_counters
+from .controllers import ImageAnalysisCache, LinkedInContentController, NotificationController
+from .renditions import generate_renditions
+from .schedule_index import due_schedule_index
+from .uploads import discard_upload
 
 logger = logging.getLogger(__name__)
 
@@ -23,15 +27,37 @@ logger = logging.getLogger(__name__)
 def process_due_campaigns():
     """
     بررسی همه کمپین‌هایی که زمان اجرای بعدی آنها رسیده است.
+    
+    This is the single beat-driven dispatcher for campaign work. Due schedules
+    come from the in-process due_schedule_index (a min-heap), which reloads
+    itself only when another process has changed a schedule, so a quiet tick
+    never queries the table. Due ids are confirmed by primary key, one
+    schedule_campaign_posts run is enqueued per campaign and the advanced
+    next_run_at values are written back with a single bulk update.
     """
+    due_schedule_index.ensure_fresh()
     now = timezone.now()
-    schedules = CampaignSchedule.objects.filter(is_enabled=True, next_run_at__lte=now)
+    due_ids = due_schedule_index.pop_due(now)
+    if not due_ids:
+        return 0
+
+    # Another worker process may already have advanced some of these schedules
+    schedules = list(CampaignSchedule.objects.filter(
+        id__in=due_ids, is_enabled=True, next_run_at__lte=now
+    ).select_related('campaign'))
+    stale_ids = set(due_ids) - {schedule.id for schedule in schedules}
+    if stale_ids:
+        for schedule_id, next_run_at in CampaignSchedule.objects.filter(
+            id__in=stale_ids, is_enabled=True
+        ).values_list('id', 'next_run_at'):
+            due_schedule_index.upsert(schedule_id, next_run_at)
 
     for schedule in schedules:
         campaign = schedule.campaign
 
         # --- اجرای پست‌ها ---
-        print(f"Publishing posts for campaign {campaign.id}")
+        schedule_campaign_posts.delay(campaign.id)
+        print(f"Dispatched posts for campaign {campaign.id}")
 
         # --- بروزرسانی next_run_at ---
         try:
@@ -42,7 +68,11 @@ def process_due_campaigns():
             period_days = 1
 
         next_run = schedule.next_run_at + timedelta(days=period_days)
+        # A dispatcher outage must not replay every missed period
+        while next_run <= now:
+            next_run += timedelta(days=period_days)
 
+        schedule.last_run_at = now
         if campaign.end_date and next_run > campaign.end_date:
             schedule.is_enabled = False
             schedule.next_run_at = None
@@ -51,23 +81,194 @@ def process_due_campaigns():
             schedule.next_run_at = next_run
             print(f"Next run for campaign {campaign.id} set to {next_run}")
 
-        schedule.save()
+    # bulk_update sends no post_save, so keep the local index in step by hand
+    # and tell the other worker processes to reload theirs
+    CampaignSchedule.objects.bulk_update(schedules, ['last_run_at', 'next_run_at', 'is_enabled'])
+    for schedule in schedules:
+        due_schedule_index.upsert(schedule.id, schedule.next_run_at if schedule.is_enabled else None)
+    due_schedule_index.mark_changed()
+
+    return len(schedules)
+
+
+# =============================================================================
+# SET-BASED MAINTENANCE HELPERS
+# =============================================================================
+
+def _pk_chunks(queryset, chunk_size: int = None):
+    """
+    Yield (low, high] primary key ranges covering the rows of queryset
+
+    Each range holds at most chunk_size rows, so the statements run against
+    it keep their locks and transactions short however many rows match.
+    """
+    chunk_size = chunk_size or getattr(settings, 'MAINTENANCE_CHUNK_SIZE', 5000)
+    last_pk = 0
+    while True:
+        pks = list(
+            queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not pks:
+            return
+        yield last_pk, pks[-1]
+        if len(pks) < chunk_size:
+            return
+        last_pk = pks[-1]
+
+
+def update_in_chunks(queryset, chunk_size: int = None, **values) -> int:
+    """Run ``queryset.update(**values)`` one primary key range at a time; returns rows updated"""
+    updated = 0
+    for low, high in _pk_chunks(queryset, chunk_size):
+        updated += queryset.filter(pk__gt=low, pk__lte=high).update(**values)
+    return updated
+
+
+def delete_in_chunks(queryset, chunk_size: int = None) -> int:
+    """Delete the rows of queryset one primary key range at a time; returns rows deleted"""
+    deleted = 0
+    for low, high in _pk_chunks(queryset, chunk_size):
+        count, _ = queryset.filter(pk__gt=low, pk__lte=high).delete()
+        deleted += count
+    return deleted
+
+
+def start_of_today():
+    """Aware datetime for midnight today; campaign dates are datetimes, so day filters use ranges"""
+    return timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+
+
+# =============================================================================
+# CAMPAIGN SCHEDULING
+# =============================================================================
+
+def as_period_start(value) -> datetime:
+    """
+    Normalise a period start to an aware datetime
+
+    Callers pass a date, a datetime, or (through the JSON task serializer) an ISO string.
+    """
+    if isinstance(value, str):
+        value = parse_datetime(value) or parse_date(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time.min)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def campaign_period_key(campaign, when=None) -> str:
+    """
+    Idempotency key for scheduling one execution period of a campaign
+    
+    Every trigger for the same campaign inside the same period maps to the same key.
+    """
+    when = when or timezone.now()
+    try:
+        period_days = max(int(campaign.execution_period), 1)
+    except (ValueError, TypeError):
+        period_days = 1
+    elapsed_days = max((when - campaign.start_date).days, 0) if campaign.start_date else 0
+    return f"schedule-campaign-posts:{campaign.id}:{elapsed_days // period_days}"
+
+
+def claim_idempotency_key(key: str, ttl_seconds: int) -> bool:
+    """
+    Atomically claim a key; returns False if another run already holds it
+    
+    Backed by the Django cache, so it is shared between workers whenever the
+    cache is (Redis/Memcached).
+    """
+    return cache.add(key, timezone.now().isoformat(), timeout=ttl_seconds)
+
+
+# =============================================================================
+# CAMPAIGN SHARDING
+# =============================================================================
+
+# Only tasks doing per-campaign work (AI generation) are sharded; a single
+# set-based statement is cheaper than the same statement run once per shard
+
+def campaign_id_ranges(queryset, shard_count: int = None) -> List[Tuple[int, int]]:
+    """
+    Split the id span of a Campaign queryset into at most shard_count [low, high) ranges
+
+    Shards are primary key ranges, so each shard's query is an index range
+    scan rather than a full scan of the campaign table.
+    """
+    shard_count = shard_count or getattr(settings, 'CAMPAIGN_SHARD_COUNT', 8)
+    bounds = queryset.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+    step = -(-(bounds['high'] - bounds['low'] + 1) // shard_count)
+    return [(low, min(low + step, bounds['high'] + 1)) for low in range(bounds['low'], bounds['high'] + 1, step)]
+
+
+def campaigns_in_shard(queryset, id_range):
+    """Restrict a Campaign queryset to one shard's [low, high) id range"""
+    low, high = id_range
+    return queryset.filter(id__gte=low, id__lt=high)
+
+
+def dispatch_campaign_shards(task, queryset, shard_count: int = None):
+    """
+    Fan a campaign-wide task out as one subtask per id range of queryset
+    
+    The shards run in parallel on whatever workers are available; a chord
+    callback logs the combined result once every shard has finished.
+    """
+    id_ranges = campaign_id_ranges(queryset, shard_count)
+    if not id_ranges:
+        return 0
+    header = [task.s(id_range=list(id_range)) for id_range in id_ranges]
+    chord(header)(collect_shard_results.s(task.name))
+    logger.info(f"Dispatched {task.name} across {len(id_ranges)} shards")
+    return len(id_ranges)
+
+
+@shared_task
+def collect_shard_results(results, task_name: str):
+    """Chord callback summarising a sharded run"""
+    numeric = [result for result in results if isinstance(result, (int, float)) and not isinstance(result, bool)]
+    failed = sum(1 for result in results if result is False)
+    logger.info(
+        f"{task_name} finished on {len(results)} shards"
+        + (f", total {sum(numeric)}" if numeric else "")
+        + (f", {failed} shards failed" if failed else "")
+    )
+    return sum(numeric) if numeric else results
+
 
 @shared_task
-def schedule_campaign_posts():
+def schedule_campaign_posts(campaign_id=None, id_range=None):
     """
-    برای همه کمپین‌های فعال:
-    - پست‌های اولیه دوره اول رو ایجاد می‌کند
-    - بقیه پست‌ها را برای دوره‌های بعدی زمان‌بندی می‌کند
+    برای کمپین داده شده (یا در صورت عدم تعیین، همه کمپین‌های فعال):
+    - پست‌های دوره فعلی رو ایجاد می‌کند
+    
+    Later periods are not queued ahead of time: process_due_campaigns calls
+    this task once per period, so it is the only trigger for period posts.
+    Without a campaign_id the work is split into CAMPAIGN_SHARD_COUNT id-range
+    shard subtasks. Duplicate triggers for the same campaign and period collapse
+    into one run.
     """
+    active_campaigns = Campaign.objects.filter(is_active=True, status='active').select_related('user')
+    if campaign_id is None and id_range is None:
+        return dispatch_campaign_shards(schedule_campaign_posts, active_campaigns)
+
     print("✅ Running schedule_campaign_posts task...")
 
     today = timezone.now().date()
-    active_campaigns = Campaign.objects.filter(is_active=True, status='active')
-
-    print(f"Found {active_campaigns.count()} active campaigns.")
+    if campaign_id is not None:
+        active_campaigns = active_campaigns.filter(id=campaign_id)
+    else:
+        active_campaigns = campaigns_in_shard(active_campaigns, id_range)
 
     for campaign in active_campaigns:
+        period_key = campaign_period_key(campaign)
+        if not claim_idempotency_key(period_key, max(campaign.execution_period or 1, 1) * 24 * 60 * 60):
+            print(f"⏭️ Campaign {campaign.id} already scheduled for this period ({period_key}), skipping")
+            continue
+
         print(f"📌 Processing campaign: {campaign.title} (ID: {campaign.id})")
 
         try:
@@ -88,15 +289,13 @@ def schedule_campaign_posts():
             if generated:
                 print(f"✅ Generated initial posts for campaign {campaign.id}")
             else:
+                # Let a later trigger retry this period
+                cache.delete(period_key)
                 print(f"⚠️ Failed to generate initial posts for campaign {campaign.id}")
 
-            # ------------------------------
-            # 2️⃣ زمان‌بندی پست‌ها برای دوره‌های بعدی
-            # ------------------------------
-            schedule_campaign_period_posts.delay(campaign.id)
-            print(f"⏳ Scheduled future posts for campaign {campaign.id}")
-
         except Exception as e:
+            # Let a later trigger retry this period
+            cache.delete(period_key)
             print(f"❌ Error processing campaign {campaign.id}: {str(e)}")
             
             
@@ -110,6 +309,9 @@ def generate_period_posts_task(campaign_id, period_start_date, posts_per_period,
         period_start_date: Start date of the period (datetime)
         posts_per_period: Number of posts to generate
         user_id: User ID
+    
+    Content is generated first and the period's posts, asset links and logs
+    are then written together with a handful of bulk statements.
     """
     try:
         # Get the campaign
@@ -121,8 +323,8 @@ def generate_period_posts_task(campaign_id, period_start_date, posts_per_period,
             return False
         
         # Check if we're within the campaign period
-        today = timezone.now().date()
-        if today < campaign.start_date or today > campaign.end_date:
+        today = timezone.localdate()
+        if today < timezone.localdate(campaign.start_date) or today > timezone.localdate(campaign.end_date):
             print(f"Campaign {campaign_id} is outside its date range, skipping period posts generation")
             return False
         
@@ -138,64 +340,39 @@ def generate_period_posts_task(campaign_id, period_start_date, posts_per_period,
         
         # Calculate period duration based on campaign execution_period
         execution_period_days = campaign.execution_period
+        period_start_date = as_period_start(period_start_date)
         
-        # Generate posts for the period
-        generated_posts = []
+        # Generate the content first; nothing is written until the whole period is ready
+        drafts = []
         
         for i in range(posts_per_period):
             # Calculate post date within the period
             post_date = period_start_date + timedelta(days=i * (execution_period_days // posts_per_period))
             
             # Skip if post date is in the past
-            if post_date.date() < today:
+            if timezone.localdate(post_date) < today:
                 continue
             
             # Generate content
-            result = linkedin_controller.generate_linkedin_content(campaign_id, user_id)
+            result = linkedin_controller.generate_linkedin_content(campaign_id, user_id, persist=False)
             
             if result.get('success'):
-                # Create the actual post in the database
-                post_data = {
-                    'campaign_id': campaign_id,
+                drafts.append({
                     'content': result.get('generated_content', result.get('post', '')),
                     'publish_date': post_date,
-                    'status': 'PENDING'  # Set initial status to PENDING
-                }
-                
-                # Create CampaignPost
-                post = CampaignPost.objects.create(**post_data)
-                
-                # Link asset if available
-                if result.get('asset_used'):
-                    PostAsset.objects.create(
-                        post=post,
-                        asset_id=result['asset_used']['id']
-                    )
-                
-                # Create success log
-                PostLog.objects.create(
-                    post=post,
-                    status='generated',
-                    error_message=None
-                )
-                
-                generated_posts.append({
-                    'post_id': post.id,
-                    'content': post.content,
-                    'publish_date': post.publish_date,
-                    'asset_used': result.get('asset_used')
+                    'asset_id': (result.get('asset_used') or {}).get('id')
                 })
-                
-                print(f"Generated post {post.id} for campaign {campaign_id}, period starting {period_start_date}")
             else:
-                # Log the failure
-                PostLog.objects.create(
-                    post=None,
-                    status='failed',
-                    error_message=f"Failed to generate post {i+1}: {result.get('error')}"
-                )
+                # There is no post to attach a PostLog to, so the failure is only logged
+                logger.warning(f"Failed to generate post {i+1} for campaign {campaign_id}: {result.get('error')}")
                 print(f"Failed to generate post {i+1} for campaign {campaign_id}: {result.get('error')}")
         
+        # Posts, their asset links and logs are written in one transaction
+        saved = linkedin_controller.save_generated_posts(campaign_id, drafts)
+        generated_posts = saved['posts']
+        for draft in saved['rejected']:
+            logger.warning(f"Asset {draft['asset_id']} is already used in campaign {campaign_id}, post dropped")
+        
         print(f"Generated {len(generated_posts)} posts for campaign {campaign_id}, period starting {period_start_date}")
         return True
         
@@ -208,77 +385,33 @@ def generate_period_posts_task(campaign_id, period_start_date, posts_per_period,
 
 
 @shared_task
-def schedule_campaign_period_posts(campaign_id):
-    """
-    Schedule period posts for an entire campaign
-    
-    This task is called when a campaign is created to schedule all period posts
-    
-    Args:
-        campaign_id: ID of the campaign
-    """
-    try:
-        campaign = Campaign.objects.get(id=campaign_id)
-        
-        # Calculate campaign duration and periods
-        campaign_duration = (campaign.end_date - campaign.start_date).days
-        execution_period_days = campaign.execution_period
-        total_periods = (campaign_duration // execution_period_days) + 1
-        
-        # Skip first period (already handled in campaign creation)
-        periods_to_schedule = total_periods - 1
-        
-        if periods_to_schedule <= 0:
-            print(f"Campaign {campaign_id} is only one period or less, no additional scheduling needed")
-            return True
-        
-        # Calculate posts per period (general approach)
-        posts_per_period = min(5, max(3, execution_period_days // 2))
-        
-        # Schedule tasks for each subsequent period
-        for period in range(1, periods_to_schedule + 1):
-            period_start_date = campaign.start_date + timedelta(days=period * execution_period_days)
-            
-            # Schedule the period posts task
-            generate_period_posts_task.apply_async(
-                args=[campaign_id, period_start_date, posts_per_period, campaign.user.id],
-                eta=period_start_date
-            )
-            
-            print(f"Scheduled period posts for campaign {campaign_id}, period {period} starting {period_start_date}")
-        
-        return True
-        
-    except Campaign.DoesNotExist:
-        print(f"Campaign {campaign_id} not found")
-        return False
-    except Exception as e:
-        print(f"Error scheduling campaign period posts for campaign {campaign_id}: {str(e)}")
-        return False
-
-
-@shared_task
-def check_and_generate_due_posts():
+def check_and_generate_due_posts(id_range=None):
     """
     Periodic task to check for campaigns that need posts generated
     
-    This task can be run daily to ensure posts are generated for active campaigns
+    This task can be run daily to ensure posts are generated for active campaigns.
+    Called without an id_range it fans out one subtask per campaign id range.
     """
+    today = start_of_today()
+    tomorrow = today + timedelta(days=1)
+    # Active campaigns that are currently running
+    running_campaigns = Campaign.objects.filter(
+        is_active=True,
+        start_date__lt=tomorrow,
+        end_date__gte=today
+    ).select_related('user')
+    if id_range is None:
+        return dispatch_campaign_shards(check_and_generate_due_posts, running_campaigns)
+
     try:
-        today = timezone.now().date()
-        
-        # Get active campaigns that are currently running
-        active_campaigns = Campaign.objects.filter(
-            is_active=True,
-            start_date__lte=today,
-            end_date__gte=today
-        )
+        active_campaigns = campaigns_in_shard(running_campaigns, id_range)
         
         for campaign in active_campaigns:
             # Check if this campaign has posts scheduled for today
             today_posts = CampaignPost.objects.filter(
                 campaign=campaign,
-                publish_date__date=today
+                publish_date__gte=today,
+                publish_date__lt=tomorrow
             ).count()
             
             # If no posts for today, generate them
@@ -288,27 +421,20 @@ def check_and_generate_due_posts():
                 # Generate posts for today
                 linkedin_controller = LinkedInContentController()
                 
-                # Generate a single post for today
-                result = linkedin_controller.generate_linkedin_content(campaign.id, campaign.user.id)
+                # Generate a single post for today; persisting it here (not in the
+                # controller) keeps it to one post linked to its asset
+                result = linkedin_controller.generate_linkedin_content(campaign.id, campaign.user.id, persist=False)
                 
                 if result.get('success'):
-                    # Create the post
-                    post_data = {
-                        'campaign_id': campaign.id,
+                    draft = {
                         'content': result.get('generated_content', result.get('post', '')),
-                        'publish_date': timezone.now()
+                        'publish_date': timezone.now(),
+                        'asset_id': (result.get('asset_used') or {}).get('id')
                     }
+                    saved = linkedin_controller.save_generated_posts(campaign.id, [draft])
                     
-                    post = CampaignPost.objects.create(**post_data)
-                    
-                    # Link asset if available
-                    if result.get('asset_used'):
-                        PostAsset.objects.create(
-                            post=post,
-                            asset_id=result['asset_used']['id']
-                        )
-                    
-                    print(f"Generated post {post.id} for campaign {campaign.id} for today")
+                    for post in saved['posts']:
+                        print(f"Generated post {post.id} for campaign {campaign.id} for today")
                 else:
                     print(f"Failed to generate post for campaign {campaign.id}: {result.get('error')}")
         
@@ -324,10 +450,11 @@ def cleanup_expired_campaigns():
     """
     Periodic task to clean up expired campaigns
     
-    This task can be run daily to deactivate campaigns that have ended
+    This task can be run daily to deactivate campaigns that have ended.
+    Returns the number of campaigns deactivated.
     """
     try:
-        today = timezone.now().date()
+        today = start_of_today()
         
         # Find campaigns that have ended
         expired_campaigns = Campaign.objects.filter(
@@ -335,17 +462,18 @@ def cleanup_expired_campaigns():
             end_date__lt=today
         )
         
-        for campaign in expired_campaigns:
-            campaign.is_active = False
-            campaign.save()
-            print(f"Deactivated expired campaign {campaign.id}: {campaign.title}")
+        deactivated_count = update_in_chunks(expired_campaigns, is_active=False)
+        if deactivated_count:
+            # Set-based updates send no post_save, so drop cached campaign payloads here
+            campaign_cache.invalidate()
         
-        print(f"Cleaned up {expired_campaigns.count()} expired campaigns")
-        return True
+        print(f"Cleaned up {deactivated_count} expired campaigns")
+        return deactivated_count
         
     except Exception as e:
         print(f"Error cleaning up expired campaigns: {str(e)}")
-        return False 
+        return 0
+
 
 # =============================================================================
 # EMAIL NOTIFICATION TASKS
@@ -395,9 +523,12 @@ def send_email_notification_task(notification_id: int, email_template: str = Non
         )
         
         # Update notification as sent
+        was_sent = notification.email_sent
         notification.email_sent = True
         notification.email_sent_at = timezone.now()
         notification.save()
+        if not was_sent:
+            notification_counters.adjust(user.id, email_sent=1)
         
         logger.info(f"Email sent successfully to {user.email} for notification {notification_id}")
         return True
@@ -410,6 +541,43 @@ def send_email_notification_task(notification_id: int, email_template: str = Non
         return False
 
 
+def send_emails_in_batches(messages: List[EmailMessage], chunk_size: int = None) -> Dict[str, Any]:
+    """
+    Send many emails reusing one backend connection per chunk
+    
+    Messages are sent one by one over the open connection so a bad address
+    fails only its own message; a failed send reopens the connection before
+    the next one.
+    
+    Returns:
+        {'sent': number delivered, 'failed': {recipient: error}}
+    """
+    chunk_size = chunk_size or getattr(settings, 'EMAIL_BATCH_SIZE', 100)
+    sent = 0
+    failed = {}
+    
+    for offset in range(0, len(messages), chunk_size):
+        connection = get_connection(fail_silently=False)
+        try:
+            for message in messages[offset:offset + chunk_size]:
+                recipient = ', '.join(message.to)
+                try:
+                    # Opens on the first send (or after a failure); no-op while open
+                    connection.open()
+                    message.connection = connection
+                    message.send()
+                    sent += 1
+                except Exception as e:
+                    failed[recipient] = str(e)
+                    logger.error(f"Failed to send email to {recipient}: {str(e)}")
+                    # Drop a possibly broken connection; the next send reconnects
+                    connection.close()
+        finally:
+            connection.close()
+    
+    return {'sent': sent, 'failed': failed}
+
+
 @shared_task
 def send_bulk_email_notifications(user_ids: List[int], subject: str, message: str):
     """
@@ -419,37 +587,34 @@ def send_bulk_email_notifications(user_ids: List[int], subject: str, message: st
         user_ids: List of user IDs to send emails to
         subject: Email subject
         message: Email message
+    
+    Returns:
+        {'sent': number delivered, 'failed': {email: error}}
     """
     try:
-        users = User.objects.filter(id__in=user_ids, email__isnull=False)
-        success_count = 0
+        emails = User.objects.filter(id__in=user_ids, email__isnull=False).exclude(email='').values_list('email', flat=True)
+        messages = [
+            EmailMessage(subject=subject, body=message, from_email=settings.DEFAULT_FROM_EMAIL, to=[email])
+            for email in emails
+        ]
         
-        for user in users:
-            try:
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[user.email],
-                    fail_silently=False,
-                )
-                success_count += 1
-                logger.info(f"Bulk email sent to {user.email}")
-            except Exception as e:
-                logger.error(f"Failed to send bulk email to {user.email}: {str(e)}")
+        results = send_emails_in_batches(messages)
         
-        logger.info(f"Bulk email task completed. Sent {success_count}/{len(user_ids)} emails")
-        return success_count
+        logger.info(f"Bulk email task completed. Sent {results['sent']}/{len(user_ids)} emails")
+        return results
         
     except Exception as e:
         logger.error(f"Error in bulk email task: {str(e)}")
-        return 0
+        return {'sent': 0, 'failed': {}}
 
 
 @shared_task
 def send_campaign_reminder_emails():
     """
     Send reminder emails for campaigns that haven't been reviewed
+    
+    Returns:
+        {'sent': number delivered, 'failed': {email: error}}
     """
     try:
         # Find notifications that are older than 24 hours and haven't been read
@@ -458,16 +623,17 @@ def send_campaign_reminder_emails():
             sent_at__lt=yesterday,
             is_read=False,
             email_sent=True
+        ).exclude(user__email='').filter(user__email__isnull=False).select_related('user', 'campaign').only(
+            'notification_url', 'user__username', 'user__email', 'campaign__title'
         )
         
-        reminder_count = 0
-        for notification in unread_notifications:
+        messages = []
+        for notification in unread_notifications.iterator(chunk_size=2000):
             user = notification.user
             campaign = notification.campaign
             
-            if user.email:
-                subject = f"Reminder: Review Campaign - {campaign.title}"
-                message = f"""
+            subject = f"Reminder: Review Campaign - {campaign.title}"
+            message = f"""
                 Hi {user.username},
                 
                 This is a reminder that your campaign "{campaign.title}" is still waiting for review.
@@ -479,25 +645,18 @@ def send_campaign_reminder_emails():
                 Best regards,
                 Your Campaign Management Team
                 """
-                
-                try:
-                    send_mail(
-                        subject=subject,
-                        message=message,
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[user.email],
-                        fail_silently=False,
-                    )
-                    reminder_count += 1
-                except Exception as e:
-                    logger.error(f"Failed to send reminder email to {user.email}: {str(e)}")
+            messages.append(EmailMessage(
+                subject=subject, body=message, from_email=settings.DEFAULT_FROM_EMAIL, to=[user.email]
+            ))
         
-        logger.info(f"Sent {reminder_count} reminder emails")
-        return reminder_count
+        results = send_emails_in_batches(messages)
+        
+        logger.info(f"Sent {results['sent']} reminder emails ({len(results['failed'])} failed)")
+        return results
         
     except Exception as e:
         logger.error(f"Error sending reminder emails: {str(e)}")
-        return 0
+        return {'sent': 0, 'failed': {}}
 
 
 # =============================================================================
@@ -539,34 +698,55 @@ def process_uploaded_asset(asset_id: int):
         return False
 
 
+@shared_task
+def process_uploaded_assets(asset_ids: List[int]):
+    """
+    Generate renditions for a batch of uploaded assets (bulk library imports)
+    
+    One generate_asset_renditions task is queued per image, so the batch is
+    spread over every worker process (and host) instead of one worker.
+    
+    Returns:
+        Number of image assets queued
+    """
+    image_ids = list(
+        Asset.objects.filter(id__in=asset_ids, file_type='image').exclude(file='').values_list('id', flat=True)
+    )
+    if image_ids:
+        group(generate_asset_renditions.s(asset_id) for asset_id in image_ids).apply_async()
+    logger.info(f"Queued renditions for {len(image_ids)} image assets")
+    return len(image_ids)
+
+
+@shared_task
+def generate_asset_renditions(asset_id: int):
+    """
+    Decode one image once and write its missing renditions
+    
+    Failures propagate so the task is recorded as failed.
+    
+    Returns:
+        Number of renditions created
+    """
+    try:
+        asset = Asset.objects.get(id=asset_id)
+    except Asset.DoesNotExist:
+        logger.warning(f"Asset {asset_id} was deleted before its renditions were generated")
+        return 0
+    created = generate_renditions(asset)
+    logger.info(f"Generated {created} renditions for asset {asset_id}")
+    return created
+
+
 def _process_image_asset(asset: Asset) -> bool:
     """
-    Process image asset: resize, optimize, create thumbnails
+    Process image asset: pre-generate the thumb/preview/full renditions
+    
+    The uploaded original is left untouched; clients are served the renditions.
     """
     try:
-        # Open the image
-        image = Image.open(asset.file.path)
-        
-        # Convert to RGB if necessary
-        if image.mode in ('RGBA', 'P'):
-            image = image.convert('RGB')
-        
-        # Resize if too large (max 1920x1080)
-        max_size = (1920, 1080)
-        image.thumbnail(max_size, Image.Resampling.LANCZOS)
-        
-        # Save optimized image
-        output = io.BytesIO()
-        image.save(output, format='JPEG', quality=85, optimize=True)
-        output.seek(0)
-        
-        # Update the asset file
-        asset.file.save(
-            asset.file.name,
-            ContentFile(output.getvalue()),
-            save=True
-        )
-        
+        created = generate_renditions(asset)
+        logger.info(f"Generated {created} renditions for asset {asset.id}")
         return True
         
     except Exception as e:
@@ -607,11 +787,8 @@ def cleanup_unused_assets():
         deleted_count = 0
         for asset in unused_assets:
             try:
-                # Delete the file
-                if asset.file and os.path.exists(asset.file.path):
-                    os.remove(asset.file.path)
-                
-                # Delete the asset record
+                # The stored file (and its renditions) goes with the last
+                # asset referencing it; see AssetBlob.release
                 asset.delete()
                 deleted_count += 1
                 
@@ -626,6 +803,23 @@ def cleanup_unused_assets():
         return 0
 
 
+@shared_task
+def cleanup_stale_uploads():
+    """
+    Discard chunked uploads older than ASSET_UPLOAD_EXPIRY_HOURS together with their parts
+    """
+    cutoff = timezone.now() - timedelta(hours=settings.ASSET_UPLOAD_EXPIRY_HOURS)
+    discarded = 0
+    for upload in AssetUpload.objects.filter(created_at__lt=cutoff).iterator():
+        try:
+            discard_upload(upload)
+            discarded += 1
+        except Exception as e:
+            logger.error(f"Error discarding upload {upload.id}: {str(e)}")
+    logger.info(f"Discarded {discarded} stale uploads")
+    return discarded
+
+
 # =============================================================================
 # CONTENT GENERATION TASKS
 # =============================================================================
@@ -723,23 +917,20 @@ def batch_generate_content_for_campaigns(campaign_ids: List[int]):
 def update_campaign_status():
     """
     Update campaign status based on current date and campaign dates
+    
+    Each transition is one set-based UPDATE, so the task is not sharded.
     """
     try:
-        today = timezone.now().date()
-        updated_count = 0
+        today = start_of_today()
         
         # Activate campaigns that should start today
         campaigns_to_activate = Campaign.objects.filter(
-            start_date=today,
+            start_date__gte=today,
+            start_date__lt=today + timedelta(days=1),
             status='pending',
             is_active=True
         )
-        
-        for campaign in campaigns_to_activate:
-            campaign.status = 'active'
-            campaign.save()
-            updated_count += 1
-            logger.info(f"Activated campaign {campaign.id}: {campaign.title}")
+        activated_count = update_in_chunks(campaigns_to_activate, status='active')
         
         # Complete campaigns that ended
         campaigns_to_complete = Campaign.objects.filter(
@@ -747,15 +938,15 @@ def update_campaign_status():
             status='active',
             is_active=True
         )
-        
-        for campaign in campaigns_to_complete:
-            campaign.status = 'completed'
-            campaign.is_active = False
-            campaign.save()
-            updated_count += 1
-            logger.info(f"Completed campaign {campaign.id}: {campaign.title}")
-        
-        logger.info(f"Updated status for {updated_count} campaigns")
+        completed_count = update_in_chunks(campaigns_to_complete, status='completed', is_active=False)
+        
+        updated_count = activated_count + completed_count
+        if updated_count:
+            campaign_cache.invalidate()
+        logger.info(
+            f"Updated status for {updated_count} campaigns "
+            f"({activated_count} activated, {completed_count} completed)"
+        )
         return updated_count
         
     except Exception as e:
@@ -763,50 +954,68 @@ def update_campaign_status():
         return 0
 
 
+def campaign_post_rollup(campaign_ids) -> Dict[int, Dict[str, int]]:
+    """
+    Post counters for the given campaigns in a single grouped query
+
+    Returns {campaign_id: {'total_posts', 'published_posts', 'pending_posts', 'assets_used'}}
+    """
+    rows = CampaignPost.objects.filter(campaign_id__in=campaign_ids).values('campaign_id').annotate(
+        total_posts=Count('id', distinct=True),
+        published_posts=Count('id', filter=Q(status=CampaignPost.Status.PUBLISHED), distinct=True),
+        pending_posts=Count('id', filter=Q(status=CampaignPost.Status.PENDING), distinct=True),
+        assets_used=Count('postasset__asset', distinct=True),
+    ).order_by()
+    return {row.pop('campaign_id'): row for row in rows}
+
+
 @shared_task
 def generate_campaign_analytics():
     """
     Generate analytics and reports for campaigns
+    
+    Today's CampaignAnalyticsSnapshot rows are recounted in one grouped query
+    and upserted, so dashboards read precomputed rows. The current day is
+    always recounted: post status changes made with QuerySet.update() and
+    PostAsset-only edits leave no change marker on the posts to detect.
     """
     try:
-        # Get active campaigns from the last 30 days
-        start_date = timezone.now() - timedelta(days=30)
-        campaigns = Campaign.objects.filter(
-            created_at__gte=start_date,
+        now = timezone.now()
+        today = timezone.localdate()
+        
+        # Active campaigns that have run within the last 30 days
+        campaigns = list(Campaign.objects.filter(
+            end_date__gte=now - timedelta(days=30),
             is_active=True
+        ).only('id', 'title'))
+        campaign_ids = [campaign.id for campaign in campaigns]
+        recounted = campaign_post_rollup(campaign_ids)
+        
+        empty = {'total_posts': 0, 'published_posts': 0, 'pending_posts': 0, 'assets_used': 0}
+        snapshots = [
+            CampaignAnalyticsSnapshot(
+                campaign_id=campaign_id, date=today, computed_at=now, **recounted.get(campaign_id, empty)
+            )
+            for campaign_id in campaign_ids
+        ]
+        
+        CampaignAnalyticsSnapshot.objects.bulk_create(
+            snapshots,
+            update_conflicts=True,
+            unique_fields=['campaign', 'date'],
+            update_fields=['total_posts', 'published_posts', 'pending_posts', 'assets_used', 'computed_at'],
         )
         
-        analytics_data = []
-        
-        for campaign in campaigns:
-            # Calculate metrics
-            total_posts = CampaignPost.objects.filter(campaign=campaign).count()
-            published_posts = CampaignPost.objects.filter(
-                campaign=campaign,
-                status=CampaignPost.Status.PUBLISHED
-            ).count()
-            
-            pending_posts = CampaignPost.objects.filter(
-                campaign=campaign,
-                status=CampaignPost.Status.PENDING
-            ).count()
-            
-            assets_used = Asset.objects.filter(
-                postasset__post__campaign=campaign
-            ).distinct().count()
-            
-            analytics_data.append({
-                'campaign_id': campaign.id,
-                'campaign_title': campaign.title,
-                'total_posts': total_posts,
-                'published_posts': published_posts,
-                'pending_posts': pending_posts,
-                'assets_used': assets_used,
-                'success_rate': (published_posts / total_posts * 100) if total_posts > 0 else 0
-            })
-        
-        # Here you could save this data to a separate analytics model
-        # or send it to an external analytics service
+        titles = {campaign.id: campaign.title for campaign in campaigns}
+        analytics_data = [{
+            'campaign_id': snapshot.campaign_id,
+            'campaign_title': titles[snapshot.campaign_id],
+            'total_posts': snapshot.total_posts,
+            'published_posts': snapshot.published_posts,
+            'pending_posts': snapshot.pending_posts,
+            'assets_used': snapshot.assets_used,
+            'success_rate': snapshot.success_rate
+        } for snapshot in snapshots]
         
         logger.info(f"Generated analytics for {len(analytics_data)} campaigns")
         return analytics_data
@@ -863,8 +1072,10 @@ def cleanup_old_notifications():
             is_read=True
         )
         
-        deleted_count = old_notifications.count()
-        old_notifications.delete()
+        user_ids = list(old_notifications.values_list('user_id', flat=True).distinct().order_by())
+        deleted_count = delete_in_chunks(old_notifications)
+        # Recount the affected users' counters on their next read
+        notification_counters.reset(*user_ids)
         
         logger.info(f"Cleaned up {deleted_count} old notifications")
         return deleted_count
@@ -878,6 +1089,20 @@ def cleanup_old_notifications():
 # SYSTEM MAINTENANCE TASKS
 # =============================================================================
 
+@shared_task
+def evict_image_analyses():
+    """
+    Delete expired cached image analyses and the least recently used rows beyond the size limit
+    """
+    try:
+        deleted = ImageAnalysisCache().evict()
+        logger.info(f"Evicted {deleted} cached image analyses")
+        return deleted
+    except Exception as e:
+        logger.error(f"Error evicting cached image analyses: {str(e)}")
+        return 0
+
+
 @shared_task
 def health_check_task():
     """
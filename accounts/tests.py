@@ -1,3 +1,1227 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from smtplib import SMTPRecipientsRefused
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.mail import EmailMessage
+from django.core.mail.backends import locmem
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import openai
+from PIL import Image
+from rest_framework.test import APIClient
+
+from .models import (
+    Asset, AssetBlob, AssetLibrary, AssetReservation, AssetUpload, Campaign, CampaignAnalyticsSnapshot, CampaignPost, CampaignSchedule,
+    ImageAnalysis, Notification, Platform, PostAsset, PostLog, User
+)
+from .controllers import (
+    AssetController, AsyncOpenRouterAI, ImageAnalysisCache, LinkedInContentController, NotificationController, OpenRouterAI,
+    RecordingNotFound, ResponseMemoizer, compute_file_hash, get_ai_provider, get_async_openrouter_client
+)
+from .cache import notification_counters
+from .events import EventBroker, publish_event
+from .renditions import generate_renditions, get_or_create_rendition, rendition_path
+from .schedule_index import DueScheduleIndex, due_schedule_index, mark_schedules_changed
+from .storage import asset_storage
+from .tasks import (
+    campaign_id_ranges, campaigns_in_shard, check_and_generate_due_posts, cleanup_expired_campaigns,
+    cleanup_old_notifications, dispatch_campaign_shards, evict_image_analyses, generate_campaign_analytics,
+    process_due_campaigns, process_uploaded_assets, schedule_campaign_posts, send_emails_in_batches, update_campaign_status
+)
+from . import uploads
+from .uploads import complete_upload
+from core.celery import app as celery_app
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AccountsTestCase(TestCase):
+    """Base for the suite: signal handlers and views use an in-process cache instead of Redis"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def run_tasks_eagerly(self):
+        """Run .delay()/group() inline and let task exceptions propagate, as a worker would record them"""
+        previous = {key: celery_app.conf.get(key) for key in ('task_always_eager', 'task_eager_propagates')}
+        celery_app.conf.update(task_always_eager=True, task_eager_propagates=True)
+        self.addCleanup(celery_app.conf.update, **previous)
+
+    def use_temp_media_root(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+
+class CampaignFixtureMixin:
+    """An authenticated owner with a platform and an asset library, plus campaign factories"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='owner', password='secret', email='owner@example.com')
+        self.platform = Platform.objects.create(name='linkedin')
+        self.library = AssetLibrary.objects.create(user=self.user, name='Library')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_campaigns(self, count, start_date=None, end_date=None, **fields):
+        now = timezone.now()
+        # bulk_create skips the post_save scheduling signals, which need a broker
+        return Campaign.objects.bulk_create([
+            Campaign(
+                user=self.user, title=f'Campaign {i}', platform=self.platform, asset_library=self.library,
+                start_date=start_date or now - timedelta(days=1), end_date=end_date or now + timedelta(days=30),
+                prompt='Prompt', **fields
+            )
+            for i in range(count)
+        ])
+
+    def make_campaign(self, **fields):
+        return self.make_campaigns(1, **fields)[0]
+
+
+class HotQueryIndexTests(AccountsTestCase):
+    """The hottest filters must be answered from the composite indexes, not table scans"""
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f"Expected {index_name} in query plan:\n{plan}")
+
+    def test_campaign_posts_by_publish_date(self):
+        queryset = CampaignPost.objects.filter(campaign_id=1, publish_date__lte=timezone.now())
+        self.assertUsesIndex(queryset, 'post_campaign_publish_idx')
+
+    def test_campaign_posts_by_status(self):
+        queryset = CampaignPost.objects.filter(campaign_id=1, status='PENDING').order_by('-created_at')
+        self.assertUsesIndex(queryset, 'post_campaign_status_idx')
+
+    def test_unused_assets_in_library(self):
+        queryset = Asset.objects.filter(library_id=1, is_used_by_ai=False)
+        self.assertUsesIndex(queryset, 'asset_library_unused_idx')
+
+    def test_unread_notifications_for_user(self):
+        queryset = Notification.objects.filter(user_id=1, is_read=False)
+        self.assertUsesIndex(queryset, 'notification_user_unread_idx')
+
+    def test_reminder_notifications(self):
+        queryset = Notification.objects.filter(
+            is_read=False, email_sent=True, sent_at__lt=timezone.now() - timedelta(hours=24)
+        )
+        self.assertUsesIndex(queryset, 'notification_reminder_idx')
+
+    def test_due_schedules(self):
+        queryset = CampaignSchedule.objects.filter(is_enabled=True, next_run_at__lte=timezone.now())
+        self.assertUsesIndex(queryset, 'schedule_enabled_next_idx')
+
+    def test_running_campaigns(self):
+        today = timezone.now()
+        queryset = Campaign.objects.filter(is_active=True, start_date__lte=today, end_date__gte=today)
+        self.assertUsesIndex(queryset, 'campaign_active_dates_idx')
+
+    def test_campaign_analytics_keyset(self):
+        queryset = CampaignAnalyticsSnapshot.objects.filter(
+            campaign_id=1, date__lt=timezone.localdate()
+        ).order_by('-date', '-id')
+        # The (campaign, date) unique index; its name is generated by SQLite
+        plan = queryset.explain()
+        self.assertIn('USING INDEX', plan)
+        self.assertIn('campaign_id=? AND date<?', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_user_campaigns_by_status(self):
+        queryset = Campaign.objects.filter(user_id=1, status='active')
+        self.assertUsesIndex(queryset, 'campaign_user_status_idx')
+
+    def test_foreign_keys_covered_by_composites(self):
+        self.assertUsesIndex(Campaign.objects.filter(user_id=1), 'campaign_user_status_idx')
+        plan = CampaignPost.objects.filter(campaign_id=1).explain()
+        self.assertRegex(plan, 'post_campaign_(publish|status)_idx')
+
+    def test_old_read_notifications(self):
+        queryset = Notification.objects.filter(is_read=True, sent_at__lt=timezone.now() - timedelta(days=30))
+        self.assertUsesIndex(queryset, 'accounts_notification_sent_at')
+
+
+class CampaignPostsQueryCountTests(CampaignFixtureMixin, AccountsTestCase):
+    """Post+asset read paths must cost the same number of queries however many posts there are"""
+
+    def setUp(self):
+        super().setUp()
+        self.campaign = self.make_campaign()
+
+    def add_posts(self, count, assets_per_post=3):
+        publish_date = timezone.now() - timedelta(hours=1)
+        posts = CampaignPost.objects.bulk_create([
+            CampaignPost(campaign=self.campaign, content=f'Post {i}', publish_date=publish_date)
+            for i in range(count)
+        ])
+        assets = Asset.objects.bulk_create([
+            Asset(library=self.library, name=f'Asset {i}', file_type='image', file=f'assets/{i}.jpg')
+            for i in range(count * assets_per_post)
+        ])
+        PostAsset.objects.bulk_create([
+            PostAsset(post=post, asset=assets[index * assets_per_post + offset])
+            for index, post in enumerate(posts)
+            for offset in range(assets_per_post)
+        ])
+        return posts
+
+    def count_queries(self, url, method='get', data=None):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(context.captured_queries), response.json()
+
+    def test_campaign_posts_view(self):
+        url = f'/campaign/{self.campaign.id}/posts/'
+        self.add_posts(2)
+        small, _ = self.count_queries(url)
+        self.add_posts(20)
+        large, payload = self.count_queries(url)
+        self.assertEqual(small, large)
+        self.assertEqual(payload['total_posts'], 22)
+        self.assertEqual(len(payload['posts'][0]['assets']), 3)
+
+    def test_posts_by_status(self):
+        url = f'/api/campaigns/create-with-content/posts-by-status/?campaign_id={self.campaign.id}'
+        self.add_posts(2)
+        small, _ = self.count_queries(url)
+        self.add_posts(20)
+        large, payload = self.count_queries(url)
+        self.assertEqual(small, large)
+        self.assertEqual(payload['total_posts'], 22)
+
+    def test_update_post_status(self):
+        post = self.add_posts(1, assets_per_post=1)[0]
+        url = f'/api/campaigns/create-with-content/{self.campaign.id}/update-post-status/'
+        few, _ = self.count_queries(url, 'post', {'post_id': post.id, 'status': 'APPROVED'})
+
+        post = self.add_posts(1, assets_per_post=10)[0]
+        many, payload = self.count_queries(url, 'post', {'post_id': post.id, 'status': 'APPROVED'})
+        self.assertEqual(few, many)
+        self.assertEqual(len(payload['post']['assets']), 10)
+
+    def test_campaign_post_list_endpoint(self):
+        self.add_posts(2)
+        small, _ = self.count_queries('/api/campaign-posts/')
+        self.add_posts(20)
+        large, payload = self.count_queries('/api/campaign-posts/')
+        self.assertEqual(small, large)
+        self.assertEqual(len(payload['results']), 22)
+
+    def test_campaign_post_list_is_cursor_paginated(self):
+        self.add_posts(12, assets_per_post=1)
+        seen = []
+        url = '/api/campaign-posts/?page_size=5'
+        while url:
+            _, payload = self.count_queries(url)
+            self.assertLessEqual(len(payload['results']), 5)
+            seen.extend(post['id'] for post in payload['results'])
+            url = payload['next']
+        self.assertEqual(len(seen), 12)
+        self.assertEqual(len(set(seen)), 12)
+
+
+class DueScheduleIndexTests(CampaignFixtureMixin, AccountsTestCase):
+
+    def test_pop_due_returns_only_live_due_entries(self):
+        now = timezone.now()
+        index = DueScheduleIndex()
+        index.upsert(1, now - timedelta(minutes=5))
+        index.upsert(2, now + timedelta(minutes=5))
+        index.upsert(3, now - timedelta(minutes=1))
+        # Rescheduling and removal leave stale heap pairs that must be skipped
+        index.upsert(3, now + timedelta(days=1))
+        index.upsert(4, now - timedelta(minutes=2))
+        index.remove(4)
+
+        self.assertEqual(index.pop_due(now), [1])
+        self.assertEqual(index.pop_due(now), [])
+        self.assertEqual(index.next_due_at(), now + timedelta(minutes=5))
+        self.assertEqual(len(index), 2)
+
+    def test_dispatcher_sees_schedules_written_by_other_processes(self):
+        now = timezone.now()
+        first, second, third = self.make_campaigns(3, status='active')
+        moved = CampaignSchedule.objects.create(campaign=first, next_run_at=now + timedelta(days=1))
+        postponed = CampaignSchedule.objects.create(campaign=second, next_run_at=now - timedelta(minutes=1))
+        due_schedule_index.rebuild()
+        self.addCleanup(due_schedule_index.invalidate)
+
+        # QuerySet.update and bulk_create send no signals to this process, like
+        # writes made in a web process; that process only bumps the change marker
+        CampaignSchedule.objects.filter(id=moved.id).update(next_run_at=now - timedelta(minutes=1))
+        CampaignSchedule.objects.filter(id=postponed.id).update(next_run_at=now + timedelta(days=1))
+        CampaignSchedule.objects.bulk_create([CampaignSchedule(campaign=third, next_run_at=now)])
+        mark_schedules_changed()
+
+        with mock.patch.object(schedule_campaign_posts, 'delay') as delay:
+            self.assertEqual(process_due_campaigns(), 2)
+        self.assertEqual(sorted(call.args[0] for call in delay.call_args_list), [first.id, third.id])
+
+    def test_quiet_tick_only_pops_the_heap(self):
+        campaign = self.make_campaigns(1, status='active')[0]
+        CampaignSchedule.objects.create(campaign=campaign, next_run_at=timezone.now() + timedelta(days=1))
+        due_schedule_index.rebuild()
+        self.addCleanup(due_schedule_index.invalidate)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(process_due_campaigns(), 0)
+        self.assertEqual(context.captured_queries, [])
+
+    def test_own_writes_do_not_force_a_reload(self):
+        now = timezone.now()
+        campaign = self.make_campaigns(1, status='active')[0]
+        due_schedule_index.rebuild()
+        self.addCleanup(due_schedule_index.invalidate)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CampaignSchedule.objects.create(campaign=campaign, next_run_at=now - timedelta(minutes=1))
+        with mock.patch.object(schedule_campaign_posts, 'delay'), \
+                mock.patch.object(due_schedule_index, 'rebuild', wraps=due_schedule_index.rebuild) as rebuild:
+            self.assertEqual(process_due_campaigns(), 1)
+            self.assertEqual(process_due_campaigns(), 0)
+        rebuild.assert_not_called()
+
+
+class SchedulePeriodIdempotencyTests(CampaignFixtureMixin, AccountsTestCase):
+    """Triggers for the same campaign and period collapse into one generation run"""
+
+    def setUp(self):
+        super().setUp()
+        self.campaign = self.make_campaign(status='active', execution_period=7)
+        generate = mock.patch('accounts.tasks.generate_period_posts_task', return_value=True)
+        self.generate = generate.start()
+        self.addCleanup(generate.stop)
+
+    def test_duplicate_triggers_collapse(self):
+        schedule_campaign_posts(self.campaign.id)
+        schedule_campaign_posts(self.campaign.id)
+        self.assertEqual(self.generate.call_count, 1)
+
+    def test_failed_run_can_be_retried(self):
+        self.generate.return_value = False
+        schedule_campaign_posts(self.campaign.id)
+        self.generate.side_effect = RuntimeError('provider down')
+        schedule_campaign_posts(self.campaign.id)
+        self.generate.side_effect = None
+        self.generate.return_value = True
+        schedule_campaign_posts(self.campaign.id)
+        schedule_campaign_posts(self.campaign.id)
+        self.assertEqual(self.generate.call_count, 3)
+
+    def test_dispatcher_generates_each_period_once(self):
+        now = timezone.now()
+        CampaignSchedule.objects.create(campaign=self.campaign, next_run_at=now - timedelta(minutes=1))
+        due_schedule_index.invalidate()
+        self.addCleanup(due_schedule_index.invalidate)
+
+        with mock.patch.object(schedule_campaign_posts, 'delay', side_effect=schedule_campaign_posts):
+            # Two ticks in the first period, then two in the second
+            for tick in (now, now + timedelta(minutes=1), now + timedelta(days=7), now + timedelta(days=7, minutes=1)):
+                with mock.patch('django.utils.timezone.now', return_value=tick):
+                    process_due_campaigns()
+
+        period_starts = [call.args[1] for call in self.generate.call_args_list]
+        self.assertEqual(period_starts, [now.date(), (now + timedelta(days=7)).date()])
+        # No ETA runs are queued for later periods
+        self.generate.apply_async.assert_not_called()
+        self.generate.delay.assert_not_called()
+
+
+class MaintenanceTaskTests(CampaignFixtureMixin, AccountsTestCase):
+    """Lifecycle maintenance runs as chunked UPDATE/DELETE statements and reports real counts"""
+
+    def test_cleanup_expired_campaigns_counts_deactivated_rows(self):
+        now = timezone.now()
+        self.make_campaigns(7, now - timedelta(days=30), now - timedelta(days=2))
+        self.make_campaigns(2, now - timedelta(days=1), now + timedelta(days=5))
+
+        with self.settings(MAINTENANCE_CHUNK_SIZE=3):
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(cleanup_expired_campaigns(), 7)
+        # Three chunks: one SELECT for the pk range and one UPDATE each
+        self.assertEqual(len(context.captured_queries), 6)
+        self.assertEqual(Campaign.objects.filter(is_active=True).count(), 2)
+        self.assertEqual(cleanup_expired_campaigns(), 0)
+
+    def test_update_campaign_status(self):
+        now = timezone.now()
+        self.make_campaigns(3, now, now + timedelta(days=5), status='pending')
+        self.make_campaigns(4, now - timedelta(days=30), now - timedelta(days=2), status='active')
+
+        with self.settings(MAINTENANCE_CHUNK_SIZE=2):
+            self.assertEqual(update_campaign_status(), 7)
+        self.assertEqual(Campaign.objects.filter(status='active').count(), 3)
+        self.assertEqual(Campaign.objects.filter(status='completed', is_active=False).count(), 4)
+
+    def test_cleanup_old_notifications(self):
+        campaigns = self.make_campaigns(4, timezone.now(), timezone.now() + timedelta(days=5))
+        Notification.objects.bulk_create([
+            Notification(user=self.user, campaign=campaign, notification_url='https://example.com/', is_read=read)
+            for campaign, read in zip(campaigns, (True, True, True, False))
+        ])
+        Notification.objects.update(sent_at=timezone.now() - timedelta(days=31))
+
+        with self.settings(MAINTENANCE_CHUNK_SIZE=2):
+            self.assertEqual(cleanup_old_notifications(), 3)
+        self.assertEqual(Notification.objects.count(), 1)
+
+
+class CampaignShardTests(CampaignFixtureMixin, AccountsTestCase):
+    """Campaign-wide tasks fan out over contiguous id ranges"""
+
+    def test_ranges_cover_every_campaign_exactly_once(self):
+        campaigns = self.make_campaigns(10)
+        # Leave gaps in the id space
+        Campaign.objects.filter(id__in=[campaigns[2].id, campaigns[3].id, campaigns[7].id]).delete()
+        queryset = Campaign.objects.all()
+
+        for shard_count in (1, 3, 4, 20):
+            id_ranges = campaign_id_ranges(queryset, shard_count)
+            self.assertLessEqual(len(id_ranges), shard_count)
+            seen = [
+                campaign_id for id_range in id_ranges
+                for campaign_id in campaigns_in_shard(queryset, id_range).values_list('id', flat=True)
+            ]
+            self.assertEqual(sorted(seen), sorted(queryset.values_list('id', flat=True)))
+
+        self.assertEqual(campaign_id_ranges(Campaign.objects.none(), 4), [])
+
+    def test_shard_filter_is_a_primary_key_range(self):
+        sql = str(campaigns_in_shard(Campaign.objects.all(), (10, 20)).query)
+        self.assertIn('"id" >= 10', sql)
+        self.assertIn('"id" < 20', sql)
+
+    def test_dispatch_sends_one_subtask_per_range(self):
+        self.make_campaigns(6)
+        task = mock.Mock(name='task')
+        with mock.patch('accounts.tasks.chord') as chord:
+            self.assertEqual(dispatch_campaign_shards(task, Campaign.objects.all(), shard_count=3), 3)
+        ranges = [call.kwargs['id_range'] for call in task.s.call_args_list]
+        self.assertEqual(len(ranges), 3)
+        self.assertEqual(ranges[0][0], Campaign.objects.order_by('id').first().id)
+        self.assertEqual(ranges[-1][1], Campaign.objects.order_by('id').last().id + 1)
+        chord.assert_called_once()
+
+    def test_due_posts_creates_one_post_per_campaign(self):
+        campaigns = self.make_campaigns(2)
+        assets = Asset.objects.bulk_create([
+            Asset(library=self.library, name=f'Asset {i}', file_type='image', file=f'assets/{i}.jpg')
+            for i in range(2)
+        ])
+        results = iter([
+            {'success': True, 'generated_content': f'Post {i}', 'asset_used': {'id': asset.id}}
+            for i, asset in enumerate(assets)
+        ])
+        with mock.patch.object(
+            LinkedInContentController, 'generate_linkedin_content', side_effect=lambda *args, **kwargs: next(results)
+        ) as generate:
+            self.assertTrue(check_and_generate_due_posts(id_range=[campaigns[0].id, campaigns[1].id + 1]))
+            self.assertTrue(check_and_generate_due_posts(id_range=[campaigns[0].id, campaigns[1].id + 1]))
+
+        self.assertEqual(generate.call_count, 2)
+        self.assertTrue(all(call.kwargs['persist'] is False for call in generate.call_args_list))
+        for campaign in campaigns:
+            self.assertEqual(CampaignPost.objects.filter(campaign=campaign).count(), 1)
+            self.assertEqual(PostAsset.objects.filter(post__campaign=campaign).count(), 1)
+
+
+class CampaignAnalyticsRollupTests(CampaignFixtureMixin, AccountsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.campaigns = self.make_campaigns(3)
+
+    def add_posts(self, campaign, statuses):
+        posts = CampaignPost.objects.bulk_create([
+            CampaignPost(campaign=campaign, content='Post', publish_date=timezone.now(), status=post_status)
+            for post_status in statuses
+        ])
+        assets = Asset.objects.bulk_create([
+            Asset(library=self.library, name='Asset', file_type='image', file='assets/a.jpg') for _ in posts
+        ])
+        PostAsset.objects.bulk_create([PostAsset(post=post, asset=asset) for post, asset in zip(posts, assets)])
+        return posts
+
+    def test_rollup_counts_and_keeps_daily_history(self):
+        first, second, _ = self.campaigns
+        self.add_posts(first, ['PUBLISHED', 'PENDING', 'PENDING'])
+        self.add_posts(second, ['PUBLISHED'])
+
+        with CaptureQueriesContext(connection) as context:
+            data = {row['campaign_id']: row for row in generate_campaign_analytics()}
+        self.assertLessEqual(len(context.captured_queries), 6)
+        self.assertEqual(data[first.id]['total_posts'], 3)
+        self.assertEqual(data[first.id]['published_posts'], 1)
+        self.assertEqual(data[first.id]['pending_posts'], 2)
+        self.assertEqual(data[first.id]['assets_used'], 3)
+        self.assertEqual(data[second.id]['success_rate'], 100)
+
+        # Move the snapshot to yesterday so the next run builds on it
+        CampaignAnalyticsSnapshot.objects.update(date=timezone.localdate() - timedelta(days=1))
+        self.add_posts(second, ['PENDING'])
+        data = {row['campaign_id']: row for row in generate_campaign_analytics()}
+        self.assertEqual(data[first.id]['total_posts'], 3)
+        self.assertEqual(data[second.id]['total_posts'], 2)
+        self.assertEqual(data[second.id]['pending_posts'], 1)
+
+        payload = self.client.get(f'/api/campaigns/{second.id}/analytics/').json()
+        self.assertEqual([row['total_posts'] for row in payload['results']], [2, 1])
+
+    def test_rerun_picks_up_changes_without_post_timestamps(self):
+        first, second, _ = self.campaigns
+        posts = self.add_posts(first, ['PENDING', 'PENDING'])
+        self.add_posts(second, ['PENDING'])
+        generate_campaign_analytics()
+
+        # Neither change touches CampaignPost.updated_at
+        CampaignPost.objects.filter(id=posts[0].id).update(status='PUBLISHED')
+        PostAsset.objects.filter(post__campaign=second).delete()
+        data = {row['campaign_id']: row for row in generate_campaign_analytics()}
+
+        self.assertEqual(data[first.id]['published_posts'], 1)
+        self.assertEqual(data[first.id]['pending_posts'], 1)
+        self.assertEqual(data[second.id]['assets_used'], 0)
+        self.assertEqual(CampaignAnalyticsSnapshot.objects.filter(campaign=first).count(), 1)
+
+
+    def test_analytics_pages_by_date_not_insertion_order(self):
+        campaign = self.campaigns[0]
+        today = timezone.localdate()
+        # A backfilled older day gets a higher id than the days after it
+        days = [today, today - timedelta(days=1), today - timedelta(days=3), today - timedelta(days=2)]
+        CampaignAnalyticsSnapshot.objects.bulk_create([
+            CampaignAnalyticsSnapshot(campaign=campaign, date=day, computed_at=timezone.now()) for day in days
+        ])
+
+        seen, url = [], f'/api/campaigns/{campaign.id}/analytics/?page_size=3'
+        while url:
+            payload = self.client.get(url).json()
+            seen.extend(row['date'] for row in payload['results'])
+            url = payload['next']
+        self.assertEqual(seen, [day.isoformat() for day in sorted(days, reverse=True)])
+
+class SaveGeneratedPostsTests(CampaignFixtureMixin, AccountsTestCase):
+    """A period's posts are written with a fixed number of bulk statements"""
+
+    def setUp(self):
+        super().setUp()
+        self.campaign = self.make_campaign()
+        self.controller = LinkedInContentController()
+
+    def make_drafts(self, count):
+        assets = Asset.objects.bulk_create([
+            Asset(library=self.library, name=f'Asset {i}', file_type='image', file=f'assets/{i}.jpg')
+            for i in range(count)
+        ])
+        AssetReservation.objects.bulk_create([
+            AssetReservation(campaign=self.campaign, asset=asset, expires_at=timezone.now() + timedelta(minutes=5))
+            for asset in assets
+        ])
+        return [
+            {'content': f'Post {i}', 'publish_date': timezone.now(), 'asset_id': asset.id}
+            for i, asset in enumerate(assets)
+        ]
+
+    def test_query_count_does_not_grow_with_batch(self):
+        drafts = self.make_drafts(2)
+        with CaptureQueriesContext(connection) as small:
+            self.controller.save_generated_posts(self.campaign.id, drafts)
+        drafts = self.make_drafts(10)
+        with CaptureQueriesContext(connection) as large:
+            saved = self.controller.save_generated_posts(self.campaign.id, drafts)
+
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertEqual(len(saved['posts']), 10)
+        self.assertEqual(PostLog.objects.filter(post__campaign=self.campaign).count(), 12)
+        self.assertEqual(PostAsset.objects.filter(post__campaign=self.campaign).count(), 12)
+        self.assertFalse(AssetReservation.objects.exists())
+
+    def test_rejects_assets_already_used_in_campaign(self):
+        first, second = self.make_drafts(2)
+        self.controller.save_generated_posts(self.campaign.id, [first])
+        duplicate = dict(second, content='Duplicate')
+        text_only = {'content': 'Text only', 'publish_date': timezone.now()}
+        saved = self.controller.save_generated_posts(
+            self.campaign.id, [dict(first, content='Again'), second, duplicate, text_only]
+        )
+
+        self.assertEqual([post.content for post in saved['posts']], ['Post 1', 'Text only'])
+        self.assertEqual([draft['content'] for draft in saved['rejected']], ['Again', 'Duplicate'])
+
+
+class AssetReservationTests(CampaignFixtureMixin, AccountsTestCase):
+    """Assets are claimed per campaign while a post is generated and consumed when it is saved"""
+
+    def setUp(self):
+        super().setUp()
+        self.campaign = self.make_campaign(execution_period=7)
+        self.asset = Asset.objects.create(library=self.library, name='Asset', file_type='image', file='assets/a.jpg')
+        self.controller = AssetController()
+
+    def test_reserve_and_release(self):
+        self.assertTrue(self.controller.reserve_for_campaign(self.campaign.id, self.asset.id))
+        self.assertFalse(self.controller.reserve_for_campaign(self.campaign.id, self.asset.id))
+        # Claims are per campaign
+        other = self.make_campaign()
+        self.assertTrue(self.controller.reserve_for_campaign(other.id, self.asset.id))
+
+        self.controller.release_reservation(self.campaign.id, self.asset.id)
+        self.assertTrue(self.controller.reserve_for_campaign(self.campaign.id, self.asset.id))
+
+    def test_expired_reservation_can_be_taken_over(self):
+        AssetReservation.objects.create(
+            campaign=self.campaign, asset=self.asset, expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertTrue(self.controller.reserve_for_campaign(self.campaign.id, self.asset.id))
+        self.assertGreater(AssetReservation.objects.get().expires_at, timezone.now())
+
+    def test_asset_used_by_a_post_cannot_be_reserved(self):
+        post = CampaignPost.objects.create(campaign=self.campaign, content='Post', publish_date=timezone.now())
+        PostAsset.objects.create(post=post, asset=self.asset)
+        self.assertFalse(self.controller.reserve_for_campaign(self.campaign.id, self.asset.id))
+        self.assertFalse(AssetReservation.objects.exists())
+
+    def test_unique_per_campaign_and_asset(self):
+        expires_at = timezone.now() + timedelta(minutes=5)
+        AssetReservation.objects.create(campaign=self.campaign, asset=self.asset, expires_at=expires_at)
+        with self.assertRaises(IntegrityError):
+            AssetReservation.objects.create(campaign=self.campaign, asset=self.asset, expires_at=expires_at)
+
+    def test_persisted_generation_links_asset_and_consumes_reservation(self):
+        linkedin = LinkedInContentController()
+        with mock.patch.object(LinkedInContentController, '_generate_content_for_asset', return_value='Generated'):
+            result = linkedin.generate_linkedin_content(self.campaign.id, self.user.id)
+
+        self.assertTrue(result['success'])
+        post = CampaignPost.objects.get(campaign=self.campaign)
+        self.assertEqual(post.content, 'Generated')
+        self.assertEqual(list(PostAsset.objects.filter(post=post).values_list('asset_id', flat=True)), [self.asset.id])
+        self.assertFalse(AssetReservation.objects.exists())
+
+    def test_failed_generation_releases_reservation(self):
+        linkedin = LinkedInContentController()
+        with mock.patch.object(
+            LinkedInContentController, '_generate_content_for_asset', side_effect=RuntimeError('provider down')
+        ):
+            result = linkedin.generate_linkedin_content(self.campaign.id, self.user.id)
+
+        self.assertFalse(result['success'])
+        self.assertFalse(CampaignPost.objects.exists())
+        self.assertFalse(AssetReservation.objects.exists())
+
+
+class ConcurrentGenerationTests(AccountsTestCase):
+
+    def test_batch_is_bounded_ordered_and_isolates_failures(self):
+        lock = threading.Lock()
+        state = {'calls': 0, 'running': 0, 'peak': 0}
+        controllers = set()
+
+        def generate(controller, campaign_id, user_id=None, persist=True):
+            with lock:
+                state['calls'] += 1
+                call = state['calls']
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+                controllers.add(id(controller))
+            try:
+                time.sleep(0.02)
+                if call == 3:
+                    raise RuntimeError('provider down')
+                return {'success': True, 'asset_used': {'id': call}}
+            finally:
+                with lock:
+                    state['running'] -= 1
+
+        controller = LinkedInContentController()
+        with mock.patch.object(LinkedInContentController, 'generate_linkedin_content', autospec=True, side_effect=generate):
+            results = controller.generate_multiple_posts(campaign_id=1, count=6, max_workers=2)
+
+        self.assertEqual(len(results), 6)
+        failed = [index for index, result in enumerate(results) if not result['success']]
+        self.assertEqual(len(failed), 1)
+        self.assertEqual(results[failed[0]]['error'], f'Failed to generate post {failed[0] + 1}: provider down')
+        self.assertEqual(state['peak'], 2)
+        # Pool threads never touch the caller's controller
+        self.assertNotIn(id(controller), controllers)
+        self.assertLessEqual(len(controllers), 2)
+        self.assertEqual(controller.used_assets_in_session, {1, 2, 4, 5, 6})
+
+
+class AsyncProviderTests(AccountsTestCase):
+    """The async provider shares one pooled client per process"""
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(mock.patch('accounts.controllers._async_openrouter_client', None))
+        self.enterContext(mock.patch('accounts.controllers._async_openrouter_client_pid', None))
+
+    def test_async_client_is_built_once_per_process(self):
+        with mock.patch('openai.AsyncOpenAI', wraps=openai.AsyncOpenAI) as build:
+            first = get_ai_provider(async_=True)
+            second = get_ai_provider(async_=True)
+            self.assertIsInstance(first, AsyncOpenRouterAI)
+            self.assertIs(first.client, second.client)
+            self.assertIs(get_async_openrouter_client(), first.client)
+            self.assertEqual(build.call_count, 1)
+
+            # A forked worker gets its own client
+            with mock.patch('accounts.controllers.os.getpid', return_value=os.getpid() + 1):
+                self.assertIsNot(get_async_openrouter_client(), first.client)
+            self.assertEqual(build.call_count, 2)
+        self.assertIsInstance(get_ai_provider(), OpenRouterAI)
+
+    def test_generate_content_awaits_the_shared_client(self):
+        provider = get_ai_provider(async_=True)
+        provider.client = mock.Mock()
+        provider.client.chat.completions.create = mock.AsyncMock(return_value=mock.Mock(
+            choices=[mock.Mock(message=mock.Mock(content=' Hello LinkedIn. '))]
+        ))
+        memoizer = ResponseMemoizer(mode='off')
+        with mock.patch('accounts.controllers.get_response_memoizer', return_value=memoizer):
+            self.assertEqual(asyncio.run(provider.generate_content('Prompt')), 'Hello LinkedIn.')
+        provider.client.chat.completions.create.assert_awaited_once()
+
+
+class ImageAnalysisReplayTests(CampaignFixtureMixin, AccountsTestCase):
+    """Image analyses are recorded and replayed by content hash, like generated text"""
+
+    def setUp(self):
+        super().setUp()
+        self.recordings = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.recordings, ignore_errors=True)
+        self.provider = OpenRouterAI()
+        self.provider.client = mock.Mock()
+        self.provider.client.chat.completions.create.return_value.choices = [
+            mock.Mock(message=mock.Mock(content=' A navy square. '))
+        ]
+
+    def use_memoizer(self, mode):
+        memoizer = ResponseMemoizer(mode=mode, store_dir=self.recordings)
+        self.enterContext(mock.patch('accounts.controllers.get_response_memoizer', return_value=memoizer))
+
+    def test_record_then_replay_offline(self):
+        self.use_memoizer('record')
+        self.assertEqual(self.provider.analyze_image('https://example.com/a.jpg', content_hash='a' * 64), 'A navy square.')
+
+        self.use_memoizer('replay')
+        self.provider.client.chat.completions.create.side_effect = ConnectionError('offline')
+        # Another URL for the same bytes replays the same analysis
+        self.assertEqual(self.provider.analyze_image('https://cdn.example.com/a.jpg', content_hash='a' * 64), 'A navy square.')
+        self.assertEqual(self.provider.client.chat.completions.create.call_count, 1)
+
+    def test_replay_miss_raises_instead_of_reaching_the_prompt(self):
+        self.use_memoizer('replay')
+        with self.assertRaises(RecordingNotFound):
+            self.provider.analyze_image('https://example.com/b.jpg', content_hash='b' * 64)
+
+        controller = LinkedInContentController()
+        controller.ai_provider = self.provider
+        asset = Asset(library=self.library, name='Photo', file_type='image', file=f"blobs/bb/bb/{'b' * 64}.jpg")
+        with self.assertRaises(RecordingNotFound):
+            controller._get_asset_specific_prompt(asset, 'Prompt')
+        self.provider.client.chat.completions.create.assert_not_called()
+
+
+class ImageAnalysisCacheTests(AccountsTestCase):
+
+    def test_reanalysis_restarts_the_ttl(self):
+        analyses = ImageAnalysisCache()
+        analyses.set('a' * 64, 'old')
+        ImageAnalysis.objects.update(created_at=timezone.now() - analyses.ttl - timedelta(days=1))
+        self.assertIsNone(analyses.get('a' * 64))
+
+        analyses.set('a' * 64, 'new')
+        self.assertEqual(analyses.get('a' * 64), 'new')
+        self.assertEqual(evict_image_analyses(), 0)
+
+    def test_eviction_runs_in_the_periodic_task(self):
+        with self.settings(IMAGE_ANALYSIS_CACHE_MAX_ENTRIES=2):
+            analyses = ImageAnalysisCache()
+            for digit in '123':
+                analyses.set(digit * 64, digit)
+            self.assertEqual(ImageAnalysis.objects.count(), 3)
+            ImageAnalysis.objects.filter(content_hash='1' * 64).update(last_used_at=timezone.now() - timedelta(days=1))
+
+            self.assertEqual(evict_image_analyses(), 1)
+        self.assertEqual(sorted(ImageAnalysis.objects.values_list('analysis', flat=True)), ['2', '3'])
+
+
+class BatchedEmailTests(AccountsTestCase):
+
+    def test_one_connection_per_batch_with_per_recipient_results(self):
+        opened = []
+
+        class CountingBackend(locmem.EmailBackend):
+            def open(self):
+                if not getattr(self, 'is_open', False):
+                    self.is_open = True
+                    opened.append(self)
+                return True
+
+            def close(self):
+                self.is_open = False
+
+            def send_messages(self, messages):
+                if any(address.startswith('bad') for message in messages for address in message.to):
+                    raise SMTPRecipientsRefused({})
+                return super().send_messages(messages)
+
+        messages = [
+            EmailMessage(subject='Hi', body='Body', to=[f'{prefix}{i}@example.com'])
+            for i, prefix in enumerate(['user'] * 4 + ['bad'] + ['user'] * 3)
+        ]
+        with mock.patch('accounts.tasks.get_connection', lambda **kwargs: CountingBackend()):
+            results = send_emails_in_batches(messages, chunk_size=5)
+
+        self.assertEqual(results['sent'], 7)
+        self.assertEqual(list(results['failed']), ['bad4@example.com'])
+        # One connection per batch of five
+        self.assertEqual(len(opened), 2)
+        self.assertEqual(len(mail.outbox), 7)
+
+
+class ReadThroughCacheTests(CampaignFixtureMixin, AccountsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.campaign = self.make_campaign()
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(context.captured_queries), response.json()
+
+    def test_platform_list_is_cached_until_a_platform_changes(self):
+        self.get('/api/platforms/')
+        queries, payload = self.get('/api/platforms/')
+        self.assertEqual(queries, 0)
+        self.assertEqual(len(payload['results']), 1)
+
+        Platform.objects.create(name='twitter')
+        queries, payload = self.get('/api/platforms/')
+        self.assertGreater(queries, 0)
+        self.assertEqual(len(payload['results']), 2)
+
+    def test_campaign_detail_is_invalidated_per_user(self):
+        url = f'/api/campaigns/{self.campaign.id}/'
+        _, payload = self.get(url)
+        self.assertEqual(payload['platform_title'], self.platform.get_name_display())
+        self.assertEqual(self.get(url)[0], 0)
+
+        # Another user's campaign changing leaves this user's cache warm
+        other = User.objects.create_user(username='other', password='secret', email='other@example.com')
+        AssetLibrary.objects.create(user=other, name='Other library')
+        self.assertEqual(self.get(url)[0], 0)
+
+        self.campaign.title = 'Renamed'
+        self.campaign.save()
+        queries, payload = self.get(url)
+        self.assertGreater(queries, 0)
+        self.assertEqual(payload['title'], 'Renamed')
+
+
+class NotificationCounterTests(CampaignFixtureMixin, AccountsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.campaigns = self.make_campaigns(3)
+
+    def unread_count(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/notifications/unread-count/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['unread_count'], len(context.captured_queries)
+
+    def test_counter_follows_create_and_mark_read(self):
+        Notification.objects.create(user=self.user, campaign=self.campaigns[0], notification_url='https://example.com/')
+        self.assertEqual(self.unread_count(), (1, 1))  # seeded with one aggregate query
+        self.assertEqual(self.unread_count(), (1, 0))
+
+        controller = NotificationController()
+        created = controller.create_campaign_notification(self.campaigns[1].id, self.user.id, 'https://example.com')
+        self.assertEqual(self.unread_count(), (2, 0))
+
+        for _ in range(2):
+            response = self.client.post(f"/api/notifications/{created['id']}/mark-read/")
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.unread_count(), (1, 0))
+        self.assertEqual(controller.get_notification_stats(self.user.id)['total_notifications'], 2)
+
+    def test_writers_never_seed_the_counters(self):
+        controller = NotificationController()
+        with mock.patch('accounts.controllers.publish_event') as created_event, \
+                CaptureQueriesContext(connection) as context:
+            created = controller.create_campaign_notification(self.campaigns[0].id, self.user.id, 'https://example.com')
+        self.assertIsNone(notification_counters.peek(self.user.id))
+        self.assertNotIn('unread_count', created_event.call_args.args[2])
+        self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+
+        with mock.patch('accounts.models.publish_event') as read_event:
+            Notification.objects.get(id=created['id']).mark_as_read()
+        self.assertIsNone(notification_counters.peek(self.user.id))
+        self.assertEqual(read_event.call_args.args[2], {'notification_id': created['id']})
+
+        # Once a reader has seeded them, events carry the live count
+        self.assertEqual(self.unread_count()[0], 0)
+        with mock.patch('accounts.controllers.publish_event') as created_event:
+            controller.create_campaign_notification(self.campaigns[1].id, self.user.id, 'https://example.com')
+        self.assertEqual(created_event.call_args.args[2]['unread_count'], 1)
+
+    def test_api_cannot_write_notifications_behind_the_counters(self):
+        notification = Notification.objects.create(
+            user=self.user, campaign=self.campaigns[0], notification_url='https://example.com/'
+        )
+        self.assertEqual(self.unread_count()[0], 1)
+
+        url = f'/api/notifications/{notification.id}/'
+        self.assertEqual(self.client.patch(url, {'is_read': True}, format='json').status_code, 405)
+        self.assertEqual(self.client.delete(url).status_code, 405)
+        self.assertEqual(self.client.post('/api/notifications/', {
+            'user': self.user.id, 'campaign': self.campaigns[1].id, 'notification_url': 'https://example.com/'
+        }, format='json').status_code, 405)
+
+        self.assertEqual(self.unread_count()[0], 1)
+        response = self.client.get('/api/notifications/unread/')
+        self.assertEqual([row['id'] for row in response.json()['results']], [notification.id])
+
+
+class EventPublishingTests(AccountsTestCase):
+
+    def test_events_are_published_after_commit(self):
+        publisher = mock.Mock()
+        with mock.patch('accounts.events.get_event_publisher', return_value=publisher):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                publish_event(7, 'notification.read', {'notification_id': 1, 'unread_count': 0})
+                publisher.publish.assert_not_called()
+
+        self.assertEqual(len(callbacks), 1)
+        channel, message = publisher.publish.call_args.args
+        self.assertEqual(channel, 'events:user:7')
+        self.assertEqual(json.loads(message), {'event': 'notification.read', 'data': {'notification_id': 1, 'unread_count': 0}})
+
+    def test_broker_fans_out_to_the_users_streams_only(self):
+        async def scenario():
+            broker = EventBroker(queue_size=1)
+            with mock.patch.object(EventBroker, '_listen', mock.AsyncMock()):
+                first, second, other = broker.subscribe(7), broker.subscribe(7), broker.subscribe(8)
+                broker.dispatch('events:user:7', 'hello')
+                broker.dispatch('events:user:7', 'overflow')  # queue full: dropped, not blocking
+                broker.unsubscribe(7, second)
+                broker.dispatch('events:user:7', 'later')
+            return first, second, other
+
+        first, second, other = asyncio.run(scenario())
+        self.assertEqual(first.get_nowait(), 'hello')
+        self.assertEqual(second.get_nowait(), 'hello')
+        self.assertTrue(other.empty())
+        self.assertEqual(first.qsize(), 0)
+
+
+class AssetRenditionTests(CampaignFixtureMixin, AccountsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.use_temp_media_root()
+        source = io.BytesIO()
+        Image.new('RGB', (2400, 1600), 'navy').save(source, format='JPEG')
+        self.asset = Asset(library=self.library, name='Photo', file_type='image')
+        self.asset.file.save('photo.jpg', ContentFile(source.getvalue()), save=False)
+        Asset.objects.bulk_create([self.asset])
+
+    def test_rendition_is_generated_on_first_request_then_served_from_disk(self):
+        payload = self.client.get(f'/api/assets/{self.asset.id}/').json()
+        self.assertIn(f'/api/assets/{self.asset.id}/renditions/thumb/', payload['renditions']['thumb'])
+
+        response = self.client.get(f'/api/assets/{self.asset.id}/renditions/thumb/')
+        self.assertEqual(response.status_code, 302)
+        path = rendition_path(self.asset, 'thumb')
+        self.assertTrue(response['Location'].endswith(path))
+        with Image.open(self.asset.file.storage.path(path)) as thumb:
+            self.assertLessEqual(max(thumb.size), 320)
+
+        payload = self.client.get(f'/api/assets/{self.asset.id}/').json()
+        self.assertTrue(payload['renditions']['thumb'].endswith(path))
+        self.assertIn('/renditions/preview/', payload['renditions']['preview'])
+        self.assertEqual(self.client.get(f'/api/assets/{self.asset.id}/renditions/poster/').status_code, 404)
+
+    def test_batch_generation_runs_one_task_per_asset_inside_a_daemon_worker(self):
+        small = io.BytesIO()
+        Image.new('RGB', (200, 100), 'teal').save(small, format='PNG')
+        small_asset = Asset(library=self.asset.library, name='Small', file_type='image')
+        small_asset.file.save('small.png', ContentFile(small.getvalue()), save=False)
+        Asset.objects.bulk_create([small_asset])
+
+        # Prefork workers are daemonic and may not start child processes
+        process = multiprocessing.current_process()
+        self.addCleanup(setattr, process, 'daemon', process.daemon)
+        process.daemon = True
+        self.run_tasks_eagerly()
+        with mock.patch('accounts.tasks.generate_renditions', wraps=generate_renditions) as generate:
+            self.assertEqual(process_uploaded_assets([self.asset.id, small_asset.id]), 2)
+        self.assertEqual(sorted(call.args[0].id for call in generate.call_args_list), [self.asset.id, small_asset.id])
+
+        storage = self.asset.file.storage
+        with Image.open(storage.path(rendition_path(self.asset, 'full'))) as full:
+            self.assertEqual(full.size, (1620, 1080))
+        # A small PNG already fits every rendition: the original is served, nothing is encoded
+        self.assertFalse(storage.exists(rendition_path(small_asset, 'thumb')))
+        self.assertEqual(get_or_create_rendition(small_asset, 'thumb'), small_asset.file.name)
+
+    def test_listing_renditions_never_touches_storage(self):
+        small = io.BytesIO()
+        Image.new('RGB', (200, 100), 'teal').save(small, format='PNG')
+        small_asset = Asset(library=self.asset.library, name='Small', file_type='image')
+        small_asset.file.save('small.png', ContentFile(small.getvalue()), save=False)
+        Asset.objects.bulk_create([small_asset])
+        for asset in Asset.objects.all():
+            generate_renditions(asset)
+
+        storage = self.asset.file.storage
+        with mock.patch.object(type(storage), 'exists', side_effect=AssertionError('storage stat')):
+            payload = self.client.get('/api/assets/').json()
+        renditions = {row['id']: row['renditions'] for row in payload['results']}
+        self.assertTrue(renditions[self.asset.id]['full'].endswith(rendition_path(self.asset, 'full')))
+        # The original serves renditions it already fits
+        self.assertTrue(renditions[small_asset.id]['thumb'].endswith(small_asset.file.name))
+        self.assertNotIn('rendition_paths', payload['results'][0])
+
+    def test_rendition_failure_is_not_swallowed(self):
+        self.run_tasks_eagerly()
+        with mock.patch('accounts.tasks.generate_renditions', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                process_uploaded_assets([self.asset.id])
+
+
+class DeduplicatedAssetStorageTests(CampaignFixtureMixin, AccountsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.use_temp_media_root()
+
+    def upload(self, file_name, data):
+        asset = Asset(library=self.library, name=file_name, file_type='image')
+        asset.file.save(file_name, ContentFile(data))
+        return asset
+
+    def test_identical_uploads_share_one_blob_until_the_last_delete(self):
+        first = self.upload('wallpaper.JPG', b'same bytes')
+        second = self.upload('wallpaper_copy.jpg', b'same bytes')
+        other = self.upload('other.jpg', b'other bytes')
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertTrue(first.file.name.startswith('blobs/') and first.file.name.endswith('.jpg'))
+        self.assertNotEqual(first.file.name, other.file.name)
+        self.assertEqual(rendition_path(first, 'thumb'), rendition_path(second, 'thumb'))
+        blob = AssetBlob.objects.get(name=first.file.name)
+        self.assertEqual((blob.ref_count, blob.size), (2, len(b'same bytes')))
+        self.assertEqual(compute_file_hash(first.file), blob.content_hash)
+
+        storage = first.file.storage
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(second.file.name))
+        self.assertEqual(AssetBlob.objects.get(name=second.file.name).ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(storage.exists(second.file.name))
+        self.assertFalse(AssetBlob.objects.filter(name=second.file.name).exists())
+        self.assertTrue(storage.exists(other.file.name))
+
+    def test_replacing_a_file_releases_the_old_blob(self):
+        asset = self.upload('draft.jpg', b'draft')
+        old_name = asset.file.name
+        asset = Asset.objects.get(id=asset.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            asset.file.save('final.jpg', ContentFile(b'final'))
+        self.assertFalse(asset.file.storage.exists(old_name))
+        self.assertEqual(list(AssetBlob.objects.values_list('name', 'ref_count')), [(asset.file.name, 1)])
+
+    def test_upload_racing_the_last_release_keeps_its_file(self):
+        first = self.upload('photo.jpg', b'shared bytes')
+        storage = first.file.storage
+        with self.captureOnCommitCallbacks() as delete_callbacks:
+            first.delete()
+        self.assertTrue(storage.exists(first.file.name))
+
+        # The file is deleted after storage decided to reuse it, before the blob is acquired
+        original_save = storage.save
+
+        def save_then_finish_delete(*args, **kwargs):
+            name = original_save(*args, **kwargs)
+            for callback in delete_callbacks:
+                callback()
+            self.assertFalse(storage.exists(name))
+            return name
+
+        with mock.patch.object(storage, 'save', side_effect=save_then_finish_delete):
+            second = self.upload('photo_again.jpg', b'shared bytes')
+
+        self.assertTrue(storage.exists(second.file.name))
+        with storage.open(second.file.name) as stored:
+            self.assertEqual(stored.read(), b'shared bytes')
+        self.assertEqual(AssetBlob.objects.get(name=second.file.name).ref_count, 1)
+
+    def test_release_skips_files_acquired_again(self):
+        first = self.upload('photo.jpg', b'shared bytes')
+        with self.captureOnCommitCallbacks() as delete_callbacks:
+            first.delete()
+        second = self.upload('photo_again.jpg', b'shared bytes')
+        for callback in delete_callbacks:
+            callback()
+        self.assertTrue(second.file.storage.exists(second.file.name))
+        self.assertEqual(AssetBlob.objects.get(name=second.file.name).ref_count, 1)
+
+
+@override_settings(ASSET_UPLOAD_PART_SIZE=4)
+class ChunkedAssetUploadTests(CampaignFixtureMixin, AccountsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.use_temp_media_root()
+        self.data = b'0123456789'
+        self.upload = self.client.post('/api/asset-uploads/', {
+            'library': self.library.id, 'name': 'Clip', 'file_type': 'video', 'file_name': 'clip.mp4',
+            'size': len(self.data), 'sha256': hashlib.sha256(self.data).hexdigest(),
+        }, format='json').json()
+
+    def put_part(self, index, data):
+        return self.client.put(
+            f"/api/asset-uploads/{self.upload['id']}/parts/{index}/", data, content_type='application/octet-stream'
+        )
+
+    def test_parts_resume_out_of_order_and_complete_into_an_asset(self):
+        self.assertEqual((self.upload['part_size'], self.upload['part_count']), (4, 3))
+        self.assertEqual(self.put_part(2, b'89').status_code, 200)
+        self.assertEqual(self.put_part(0, b'0123').status_code, 200)
+        self.assertEqual(self.put_part(1, b'45').status_code, 400)  # truncated part is rejected
+
+        status = self.client.get(f"/api/asset-uploads/{self.upload['id']}/").json()
+        self.assertEqual(status['received_parts'], [0, 2])
+        response = self.client.post(f"/api/asset-uploads/{self.upload['id']}/complete/")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('[1]', response.json()['detail'])
+
+        self.assertEqual(self.put_part(1, b'4567').status_code, 200)
+        with mock.patch('accounts.views.process_uploaded_asset') as process, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/asset-uploads/{self.upload['id']}/complete/")
+        self.assertEqual(response.status_code, 201)
+        asset = Asset.objects.get(id=response.json()['id'])
+        process.delay.assert_called_once_with(asset.id)
+        with asset.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.data)
+        self.assertEqual(AssetBlob.objects.get(name=asset.file.name).ref_count, 1)
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, 'uploads', self.upload['id'])))
+
+        # Retrying completion is idempotent
+        response = self.client.post(f"/api/asset-uploads/{self.upload['id']}/complete/")
+        self.assertEqual((response.status_code, response.json()['id']), (200, asset.id))
+
+    def test_checksum_mismatch_creates_no_asset(self):
+        for index, part in enumerate([b'0123', b'4567', b'8X']):
+            self.put_part(index, part)
+        response = self.client.post(f"/api/asset-uploads/{self.upload['id']}/complete/")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Asset.objects.exists())
+        self.assertEqual(AssetUpload.objects.get().status, 'pending')
+
+        # Re-sending the bad part fixes the upload
+        self.assertEqual(self.put_part(2, b'89').status_code, 200)
+        with mock.patch('accounts.views.process_uploaded_asset'):
+            response = self.client.post(f"/api/asset-uploads/{self.upload['id']}/complete/")
+        self.assertEqual(response.status_code, 201)
+
+    def test_dropped_retry_keeps_the_stored_part(self):
+        for index, part in enumerate([b'0123', b'4567', b'89']):
+            self.put_part(index, part)
+        data_file = os.path.join(settings.MEDIA_ROOT, 'uploads', self.upload['id'], 'data')
+        self.assertEqual(os.path.getsize(data_file), len(self.data))
+
+        self.assertEqual(self.put_part(1, b'XX').status_code, 400)
+        status = self.client.get(f"/api/asset-uploads/{self.upload['id']}/").json()
+        self.assertEqual(status['received_parts'], [0, 1, 2])
+        with open(data_file, 'rb') as data:
+            self.assertEqual(data.read(), self.data)
+
+    def test_hashing_happens_before_the_row_lock(self):
+        for index, part in enumerate([b'0123', b'4567', b'89']):
+            self.put_part(index, part)
+        events = []
+        real_hash, real_atomic = uploads._hash_file, uploads.transaction.atomic
+
+        def hash_file(data):
+            events.append('hash')
+            return real_hash(data)
+
+        def atomic(*args, **kwargs):
+            events.append('lock')
+            return real_atomic(*args, **kwargs)
+
+        with mock.patch('accounts.uploads._hash_file', side_effect=hash_file), \
+                mock.patch('accounts.uploads.transaction.atomic', side_effect=atomic):
+            complete_upload(self.upload['id'], self.user)
+        self.assertEqual(events[:2], ['hash', 'lock'])
+
+    def test_part_sent_during_completion_never_reaches_the_blob(self):
+        for index, part in enumerate([b'0123', b'4567', b'89']):
+            self.put_part(index, part)
+        upload = AssetUpload.objects.get()
+        errors, writers = [], []
+        real_hash = uploads._hash_file
+
+        def resend_part():
+            try:
+                uploads.write_part(upload, 1, io.BytesIO(b'XXXX'))
+            except uploads.UploadError as e:
+                errors.append(str(e))
+
+        def hash_file(data):
+            # The retry opens the data file now and waits for the completion's file lock
+            writers.append(threading.Thread(target=resend_part))
+            writers[0].start()
+            time.sleep(0.1)
+            return real_hash(data)
+
+        with mock.patch('accounts.uploads._hash_file', side_effect=hash_file):
+            asset, created = complete_upload(self.upload['id'], self.user)
+        writers[0].join()
+        self.assertTrue(created)
+        self.assertEqual(errors, ['Upload is already completed.'])
+        with asset.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.data)
+
+    def test_failed_asset_save_removes_the_adopted_blob(self):
+        for index, part in enumerate([b'0123', b'4567', b'89']):
+            self.put_part(index, part)
+        blob_name = asset_storage.blob_name(hashlib.sha256(self.data).hexdigest(), 'clip.mp4')
+        with mock.patch.object(Asset, 'save', side_effect=RuntimeError('database down')):
+            with self.assertRaises(RuntimeError):
+                complete_upload(self.upload['id'], self.user)
+
+        self.assertFalse(asset_storage.exists(blob_name))
+        self.assertFalse(AssetBlob.objects.exists())
+        self.assertEqual(AssetUpload.objects.get().status, 'pending')
@@ -0,0 +1,220 @@
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+from typing import List, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Asset, AssetBlob, AssetUpload
+from .storage import asset_storage
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """A part or completion request that does not fit the upload"""
+
+
+def upload_root() -> str:
+    """Directory holding in-progress uploads; on the media filesystem so completion is a rename"""
+    return getattr(settings, 'ASSET_UPLOAD_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'uploads')
+
+
+def upload_dir(upload: AssetUpload) -> str:
+    return os.path.join(upload_root(), str(upload.id))
+
+
+def data_path(upload: AssetUpload) -> str:
+    """The file the parts are written into, each at its own offset"""
+    return os.path.join(upload_dir(upload), 'data')
+
+
+def part_path(upload: AssetUpload, index: int) -> str:
+    """Marker recording that part ``index`` is stored in full in the data file"""
+    return os.path.join(upload_dir(upload), f"{index:06d}.part")
+
+
+def received_parts(upload: AssetUpload) -> List[int]:
+    """Indexes of the parts stored in full; truncated parts from dropped connections are not counted"""
+    try:
+        file_names = os.listdir(upload_dir(upload))
+    except FileNotFoundError:
+        return []
+    received = []
+    for file_name in file_names:
+        stem, extension = os.path.splitext(file_name)
+        if extension == '.part' and stem.isdigit() and int(stem) < upload.part_count:
+            received.append(int(stem))
+    return sorted(received)
+
+
+def _open_data_file(upload: AssetUpload):
+    """Open the data file for writing, preallocating it to the full upload size"""
+    path = data_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    if os.fstat(fd).st_size < upload.size:
+        os.ftruncate(fd, upload.size)
+    return os.fdopen(fd, 'r+b')
+
+
+def _lock_data_file(data, path: str, exclusive: bool = False) -> bool:
+    """
+    flock the open data file; False when ``path`` no longer names it
+
+    Part writes share the lock and completion holds it exclusively, so no part
+    lands in the file while it is hashed or after it was moved into storage.
+    """
+    fcntl.flock(data.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        return os.path.samestat(os.fstat(data.fileno()), os.stat(path))
+    except FileNotFoundError:
+        return False
+
+
+def _copy_stream(stream, target, limit: int) -> int:
+    """Copy up to ``limit`` + 1 bytes (to detect oversized parts); returns the bytes copied"""
+    copied = 0
+    while copied <= limit:
+        chunk = stream.read(min(STREAM_CHUNK_SIZE, limit + 1 - copied))
+        if not chunk:
+            break
+        target.write(chunk)
+        copied += len(chunk)
+    return copied
+
+
+def write_part(upload: AssetUpload, index: int, stream) -> int:
+    """
+    Stream one part from a request body into the data file at ``index * part_size``
+
+    A part not yet received is written in place. A re-sent part is first
+    streamed to ``<part>.tmp`` and copied over the stored one only once it is
+    complete, so a retry dropped half way never destroys a good part.
+    Raises UploadError when the part index or length does not fit the upload.
+    """
+    if upload.status != 'pending':
+        raise UploadError('Upload is already completed.')
+    if not 0 <= index < upload.part_count:
+        raise UploadError(f'Part index must be between 0 and {upload.part_count - 1}.')
+
+    expected = upload.part_length(index)
+    offset = index * upload.part_size
+    marker = part_path(upload, index)
+    with _open_data_file(upload) as data:
+        if not _lock_data_file(data, data_path(upload)):
+            raise UploadError('Upload is already completed.')
+        if not os.path.exists(marker):
+            data.seek(offset)
+            written = _copy_stream(stream, data, expected)
+            if written != expected:
+                raise UploadError(f'Part {index} must be {expected} bytes, got {written}.')
+        else:
+            temp_path = marker + '.tmp'
+            try:
+                with open(temp_path, 'w+b') as temp:
+                    written = _copy_stream(stream, temp, expected)
+                    if written != expected:
+                        raise UploadError(f'Part {index} must be {expected} bytes, got {written}.')
+                    temp.seek(0)
+                    data.seek(offset)
+                    shutil.copyfileobj(temp, data, STREAM_CHUNK_SIZE)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+    # Only a complete part is recorded
+    open(marker, 'wb').close()
+    return written
+
+
+def _hash_file(data) -> str:
+    digest = hashlib.sha256()
+    data.seek(0)
+    while chunk := data.read(STREAM_CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _completed_asset(upload: AssetUpload) -> Asset:
+    if upload.asset is None:
+        raise UploadError('The uploaded asset has been deleted.')
+    return upload.asset
+
+
+def _adopted_elsewhere(upload_id) -> Tuple[Asset, bool]:
+    """Result for a completion whose data file another completion already moved into storage"""
+    upload = AssetUpload.objects.select_related('asset').get(id=upload_id)
+    if upload.status != 'completed':
+        raise UploadError('Another completion of this upload is in progress; retry shortly.')
+    return _completed_asset(upload), False
+
+
+def complete_upload(upload_id, user) -> Tuple[Asset, bool]:
+    """
+    Verify the SHA-256 of the data file and create the Asset
+
+    The data file is hashed under its own file lock, which keeps part writes
+    out, before the upload row is locked; the row lock is only held for the
+    rename into content-addressed storage and the inserts. Returns
+    (asset, created); completing again returns the same Asset with
+    created=False.
+    """
+    upload = AssetUpload.objects.select_related('asset').get(id=upload_id, user=user)
+    if upload.status == 'completed':
+        return _completed_asset(upload), False
+
+    missing = sorted(set(range(upload.part_count)) - set(received_parts(upload)))
+    if missing:
+        raise UploadError(f'Missing parts: {missing[:20]}')
+
+    path = data_path(upload)
+    adopted_name = None
+    try:
+        data = open(path, 'rb')
+    except FileNotFoundError:
+        return _adopted_elsewhere(upload_id)
+    try:
+        with data:
+            if not _lock_data_file(data, path, exclusive=True):
+                return _adopted_elsewhere(upload_id)
+            content_hash = _hash_file(data)
+            if content_hash != upload.sha256:
+                raise UploadError('Checksum mismatch; re-send the parts or start a new upload.')
+
+            with transaction.atomic():
+                upload = AssetUpload.objects.select_for_update().get(id=upload_id, user=user)
+                if upload.status == 'completed':
+                    return _completed_asset(upload), False
+
+                asset = Asset(library_id=upload.library_id, name=upload.name, file_type=upload.file_type)
+                blob_name, moved = asset_storage.adopt(path, content_hash, upload.file_name)
+                asset.file.name = blob_name
+                if moved:
+                    adopted_name = blob_name
+                asset.save()
+                upload.status = 'completed'
+                upload.asset = asset
+                upload.save(update_fields=['status', 'asset'])
+
+                directory = upload_dir(upload)
+                transaction.on_commit(lambda: shutil.rmtree(directory, ignore_errors=True))
+    except Exception:
+        if adopted_name:
+            # The rolled-back Asset never kept its reference; drop the moved file unless
+            # another upload of the same content has acquired it meanwhile
+            AssetBlob.delete_if_unreferenced(adopted_name)
+        raise
+    logger.info(f"Completed upload {upload.id} into asset {asset.id} ({upload.size} bytes)")
+    return asset, True
+
+
+def discard_upload(upload: AssetUpload) -> None:
+    """Delete an upload and, after commit, its stored parts"""
+    directory = upload_dir(upload)
+    upload.delete()
+    transaction.on_commit(lambda: shutil.rmtree(directory, ignore_errors=True))
@@ -7,6 +7,7 @@ router.register(r'platforms', views.PlatformViewSet)
 router.register(r'tags', views.TagViewSet)
 router.register(r'asset-libraries', views.AssetLibraryViewSet)
 router.register(r'assets', views.AssetViewSet)
+router.register(r'asset-uploads', views.AssetUploadViewSet)
 router.register(r'campaigns', views.CampaignViewSet)
 router.register(r'campaign-posts', views.CampaignPostViewSet)
 router.register(r'post-assets', views.PostAssetViewSet)
@@ -14,6 +15,8 @@ router.register(r'post-logs', views.PostLogViewSet)
 router.register(r'notifications', views.NotificationViewSet)
 router.register(r'campaigns/create-with-content', views.CampaignCreationViewSet, basename='campaign-creation')
 urlpatterns = [
+    # Must precede the router, whose notifications/<pk>/ route would otherwise match
+    path('api/notifications/stream/', views.notification_event_stream),
     path('api/', include(router.urls)),
     # اگر می‌خواهید رابط کاربری قابل مرور DRF را هم داشته باشید
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
@@ -1,30 +1,41 @@
-from rest_framework import viewsets, status,permissions
+import asyncio
+import io
+import json
+
+from asgiref.sync import sync_to_async
+from rest_framework import mixins, viewsets, status,permissions
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 # Import your controllers
+from .cache import asset_library_cache, campaign_cache, notification_counters, platform_cache, tag_cache
 from .controllers import LinkedInContentController
+from .events import event_broker, format_sse, publish_post_status_changed
+from .renditions import RENDITIONS, get_or_create_rendition, rendition_urls
+from .uploads import UploadError, complete_upload, discard_upload, write_part
 from rest_framework.exceptions import PermissionDenied
 # Import your models and serializers
-from .models import Platform, Tag, AssetLibrary, Asset, Campaign, CampaignPost, PostAsset, PostLog,CampaignSchedule, Notification
+from .models import Platform, Tag, AssetLibrary, Asset, Campaign, CampaignPost, PostAsset, PostLog,CampaignSchedule, Notification, AssetUpload
 from .serializers import (
     PlatformSerializer, TagSerializer, AssetLibrarySerializer,
     AssetSerializer, CampaignSerializer, CampaignPostSerializer,
-    PostAssetSerializer, PostLogSerializer,CampaignScheduleSerializer, NotificationSerializer
+    PostAssetSerializer, PostLogSerializer,CampaignScheduleSerializer, NotificationSerializer,
+    CampaignAnalyticsSnapshotSerializer, AssetUploadSerializer
 )
 
 # از تسک جدیدی که برای زمان‌بندی پست‌ها ساختید، ایمپورت کنید
 from .tasks import *
-from django_celery_beat.models import PeriodicTask, CrontabSchedule
-import json
 
 # Instantiate the LinkedIn content controller
 linkedin_controller = LinkedInContentController()
@@ -32,14 +43,56 @@ linkedin_controller = LinkedInContentController()
 class BaseViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
+
+# Query plans matching the nested serializers, so list endpoints run a fixed
+# number of queries instead of one per row and relation
+def asset_queryset():
+    return Asset.objects.select_related('library').prefetch_related('tags')
+
+
+def campaign_queryset():
+    return Campaign.objects.select_related('platform', 'asset_library').prefetch_related('tags')
+
+
+def campaign_post_queryset():
+    return CampaignPost.objects.select_related('campaign').prefetch_related(
+        Prefetch('assets', queryset=asset_queryset())
+    )
+
+
+def cached_response(namespace, scope, request, render):
+    """
+    Serve a GET payload through a read-through cache namespace
+
+    The full path (with query string) is the key, so every page and filter is
+    cached separately; only successful responses are stored.
+    """
+    rendered = []
+
+    def load():
+        rendered.append(render())
+        return rendered[0].data if rendered[0].status_code == status.HTTP_200_OK else None
+
+    data = namespace.get_or_load(scope, request.get_full_path(), load)
+    if rendered:
+        return rendered[0]
+    return Response(data)
+
+
 class PlatformViewSet(BaseViewSet):
     queryset = Platform.objects.all()
     serializer_class = PlatformSerializer
 
+    def list(self, request, *args, **kwargs):
+        return cached_response(platform_cache, 'all', request, lambda: super(PlatformViewSet, self).list(request, *args, **kwargs))
+
 class TagViewSet(BaseViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
+    def list(self, request, *args, **kwargs):
+        return cached_response(tag_cache, 'all', request, lambda: super(TagViewSet, self).list(request, *args, **kwargs))
+
 class AssetLibraryViewSet(BaseViewSet):
     queryset = AssetLibrary.objects.all()
     serializer_class = AssetLibrarySerializer
@@ -47,56 +100,107 @@ class AssetLibraryViewSet(BaseViewSet):
         serializer.save(user=self.request.user)
 
     def get_queryset(self):
-        return AssetLibrary.objects.filter(user=self.request.user)
+        return AssetLibrary.objects.filter(user=self.request.user).select_related('user')
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            asset_library_cache, request.user.id, request,
+            lambda: super(AssetLibraryViewSet, self).list(request, *args, **kwargs)
+        )
 
 class AssetViewSet(BaseViewSet):
     queryset = Asset.objects.all()
     serializer_class = AssetSerializer
+    cursor_ordering = ('-created_at', '-id')
     parser_classes = [MultiPartParser, FormParser]
 
     def get_queryset(self):
-        return Asset.objects.filter(library__user=self.request.user)
+        return asset_queryset().filter(library__user=self.request.user)
+
+    def perform_create(self, serializer):
+        asset = serializer.save()
+        # Renditions are generated in the background once the upload is committed
+        transaction.on_commit(lambda: process_uploaded_asset.delay(asset.id))
+
+    @action(detail=True, methods=['get'], url_path=r'renditions/(?P<rendition>[^/.]+)', url_name='rendition')
+    def rendition(self, request, pk=None, rendition=None):
+        """Redirect to a resized rendition (thumb, preview, full), generating it on first request"""
+        asset = self.get_object()
+        if asset.file_type != 'image' or not asset.file or rendition not in RENDITIONS:
+            return Response({'detail': 'Rendition not available.'}, status=status.HTTP_404_NOT_FOUND)
+        path = get_or_create_rendition(asset, rendition)
+        return HttpResponseRedirect(asset.file.storage.url(path))
+
+
+class AssetUploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin,
+                         mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Resumable chunked asset uploads
+
+    POST   /api/asset-uploads/                     start (library, name, file_type, file_name, size, sha256)
+    PUT    /api/asset-uploads/<id>/parts/<index>/  send one part as the raw request body
+    GET    /api/asset-uploads/<id>/                status; received_parts tells a client where to resume
+    POST   /api/asset-uploads/<id>/complete/       verify and create the Asset
+    DELETE /api/asset-uploads/<id>/                abort
+    """
+    queryset = AssetUpload.objects.all()
+    serializer_class = AssetUploadSerializer
+    permission_classes = [IsAuthenticated]
+    cursor_ordering = ('-created_at', '-id')
+
+    def get_queryset(self):
+        return AssetUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user, part_size=settings.ASSET_UPLOAD_PART_SIZE)
+
+    def perform_destroy(self, instance):
+        discard_upload(instance)
+
+    # No parsers: the body is streamed to the part file instead of being buffered
+    @action(detail=True, methods=['put'], url_path=r'parts/(?P<index>\d+)', url_name='part', parser_classes=[])
+    def upload_part(self, request, pk=None, index=None):
+        upload = self.get_object()
+        try:
+            written = write_part(upload, int(index), request.stream or io.BytesIO())
+        except UploadError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'part': int(index), 'size': written})
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        upload = self.get_object()
+        try:
+            asset, created = complete_upload(upload.id, request.user)
+        except UploadError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if created:
+            # Renditions are generated in the background, as for single-request uploads
+            transaction.on_commit(lambda: process_uploaded_asset.delay(asset.id))
+        serializer = AssetSerializer(asset, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
 
 class CampaignViewSet(viewsets.ModelViewSet):
     queryset = Campaign.objects.all()
     serializer_class = CampaignSerializer
+    # Actions override it through @action(cursor_ordering=...)
+    cursor_ordering = '-id'
 
     def perform_create(self, serializer):
-        campaign = serializer.save(user=self.request.user, status='active')
-
-        # اگر بخواهیم اجرای فوری هم داشته باشیم
-        schedule_campaign_posts.delay()
-
-        # ایجاد یک CampaignSchedule پیش‌فرض برای کمپین
-        if campaign.start_date:
-            schedule = CampaignSchedule.objects.create(
-                campaign=campaign,
-                start_date=campaign.start_date,
-                end_date=campaign.end_date,
-                is_enabled=True
-            )
-
-            cron_schedule, _ = CrontabSchedule.objects.get_or_create(
-                minute='0',
-                hour='10',
-                day_of_week='1',  # دوشنبه
-                day_of_month='*',
-                month_of_year='*',
-                timezone='Asia/Tehran'
-            )
-
-            PeriodicTask.objects.create(
-                crontab=cron_schedule,
-                name=f"Schedule posts for campaign {campaign.id}",
-                task='accounts.tasks.schedule_campaign_posts',
-                args=json.dumps([campaign.id]),
-                start_time=schedule.start_date,
-                expires=schedule.end_date
-            )
+        # اجرای فوری برای همین کمپین توسط سیگنال campaign_created_handler انجام می‌شود
+        # و CampaignSchedule پیش‌فرض نیز توسط سیگنال create_initial_campaign_schedule ساخته می‌شود؛
+        # اجراهای بعدی را process_due_campaigns ارسال می‌کند
+        serializer.save(user=self.request.user, status='active')
 
     def get_queryset(self):
-        return Campaign.objects.filter(user=self.request.user)
+        return campaign_queryset().filter(user=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(
+            campaign_cache, request.user.id, request,
+            lambda: super(CampaignViewSet, self).retrieve(request, *args, **kwargs)
+        )
 
     @action(detail=True, methods=['post'], url_path='generate-posts')
     def generate_posts(self, request, pk=None):
@@ -125,6 +229,15 @@ class CampaignViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'detail': f'An unexpected error occurred: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=True, methods=['get'], url_path='analytics', cursor_ordering=('-date', '-id'))
+    def analytics(self, request, pk=None):
+        """Daily analytics snapshots of the campaign, newest first (precomputed by generate_campaign_analytics)"""
+        campaign = self.get_object()
+        snapshots = campaign.analytics_snapshots.all()
+        page = self.paginate_queryset(snapshots)
+        serializer = CampaignAnalyticsSnapshotSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['post'], url_path='create-all-posts')
     def create_all_posts_for_campaign(self, request, pk=None):
         campaign = self.get_object()
@@ -141,31 +254,9 @@ class CampaignViewSet(viewsets.ModelViewSet):
         campaign_serializer.is_valid(raise_exception=True)
 
         with transaction.atomic():
-            campaign = campaign_serializer.save(user=request.user, status='active')
-
-            # الگوی crontab مثلا هر دوشنبه ساعت ۱۰ صبح
-            schedule, created = CrontabSchedule.objects.get_or_create(
-                minute='0',
-                hour='10',
-                day_of_week='1',
-                day_of_month='*',
-                month_of_year='*',
-                timezone='Asia/Tehran'
-            )
-
-            # نام یکتا برای periodic task بر اساس campaign.id
-            task_name = f"Schedule posts for campaign {campaign.id}"
-
-            # اگر هنوز این تسک ساخته نشده باشد، ایجاد شود
-            if not PeriodicTask.objects.filter(name=task_name).exists():
-                PeriodicTask.objects.create(
-                    crontab=schedule,
-                    name=task_name,
-                    task='accounts.tasks.schedule_campaign_posts',
-                    args=json.dumps([campaign.id]),
-                    start_time=campaign.start_date,
-                    expires=campaign.end_date
-                )
+            # CampaignSchedule is created by the post_save signal and dispatched
+            # by process_due_campaigns on every execution period
+            campaign_serializer.save(user=request.user, status='active')
 
         response_data = campaign_serializer.data
         return Response(response_data, status=status.HTTP_201_CREATED)
@@ -177,7 +268,7 @@ class CampaignScheduleViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         # فقط برنامه‌های زمان‌بندی مربوط به کاربر جاری را برمی‌گرداند
         user = self.request.user
-        return CampaignSchedule.objects.filter(campaign__user=user)
+        return CampaignSchedule.objects.filter(campaign__user=user).select_related('campaign')
 
     def perform_create(self, serializer):
         # فقط اجازه ساخت schedule برای کمپینی که متعلق به همین یوزر هست
@@ -188,6 +279,10 @@ class CampaignScheduleViewSet(viewsets.ModelViewSet):
 class CampaignPostViewSet(BaseViewSet):
     queryset = CampaignPost.objects.all()
     serializer_class = CampaignPostSerializer
+    cursor_ordering = ('-created_at', '-id')
+
+    def get_queryset(self):
+        return campaign_post_queryset()
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -220,10 +315,13 @@ class CampaignPostViewSet(BaseViewSet):
         serializer.is_valid(raise_exception=True)
 
         assets_data = request.data.get('assets', None)
+        previous_status = instance.status
 
         with transaction.atomic():
             self.perform_update(serializer)
             campaign_post = serializer.instance
+            if campaign_post.status != previous_status:
+                publish_post_status_changed(campaign_post, campaign_post.campaign.user_id)
 
             if assets_data is not None:
                 campaign_post.assets.clear()
@@ -238,12 +336,19 @@ class CampaignPostViewSet(BaseViewSet):
                     except Asset.DoesNotExist:
                         return Response({'detail': f'Asset with ID {asset_id} not found.'}, status=status.HTTP_400_BAD_REQUEST)
 
+        if getattr(instance, '_prefetched_objects_cache', None):
+            # The assets prefetched by get_queryset() are stale after the update
+            instance._prefetched_objects_cache = {}
+
         return Response(serializer.data)
 
 class PostAssetViewSet(BaseViewSet):
     queryset = PostAsset.objects.all()
     serializer_class = PostAssetSerializer
 
+    def get_queryset(self):
+        return PostAsset.objects.select_related('asset')
+
     def perform_create(self, serializer):
         try:
             instance = serializer.save()
@@ -256,14 +361,25 @@ class PostLogViewSet(BaseViewSet):
     serializer_class = PostLogSerializer
     http_method_names = ['get']
 
+    def get_queryset(self):
+        return PostLog.objects.select_related('post')
+
     
-class NotificationViewSet(BaseViewSet):
+class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only notifications of the current user; ``mark-read`` is the only write
+
+    Notifications are created and emailed by tasks, which keep the cached
+    per-user counters in step. Generic create/update/delete would bypass them.
+    """
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
+    permission_classes = [IsAuthenticated]
+    cursor_ordering = ('-sent_at', '-id')
 
     def get_queryset(self):
         # فقط نوتیفیکیشن‌های متعلق به کاربر فعلی را نشان می‌دهد
-        return Notification.objects.filter(user=self.request.user)
+        return Notification.objects.filter(user=self.request.user).select_related('campaign', 'user')
     
     @action(detail=True, methods=['post'], url_path='mark-read')
     def mark_as_read(self, request, pk=None):
@@ -275,13 +391,58 @@ class NotificationViewSet(BaseViewSet):
     @action(detail=False, methods=['get'], url_path='unread')
     def get_unread(self, request):
         """Get unread notifications for current user"""
-        unread_notifications = Notification.objects.filter(
-            user=request.user, 
-            is_read=False
-        )
-        serializer = self.get_serializer(unread_notifications, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        unread_notifications = self.get_queryset().filter(is_read=False)
+        if not notification_counters.get(request.user.id)['unread']:
+            # Nothing unread: answer from the counter without touching the table
+            unread_notifications = Notification.objects.none()
+        page = self.paginate_queryset(unread_notifications)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        """Unread notification count for current user, served from the cached counter"""
+        counts = notification_counters.get(request.user.id)
+        return Response({'unread_count': counts['unread'], 'total_count': counts['total']}, status=status.HTTP_200_OK)
+
+
+
+async def notification_event_stream(request):
+    """
+    Server-Sent Events stream of the current user's notifications and post status changes
+
+    GET /api/notifications/stream/
+
+    Served by the ASGI application. The first event carries the unread count;
+    afterwards events are pushed as they are published, with a comment line
+    every SSE_HEARTBEAT_SECONDS to keep proxies from closing idle streams.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    counts = await sync_to_async(notification_counters.get)(user.id)
+    heartbeat = getattr(settings, 'SSE_HEARTBEAT_SECONDS', 15)
+
+    async def events():
+        queue = event_broker.subscribe(user.id)
+        try:
+            yield format_sse('unread_count', {'unread_count': counts['unread']})
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                payload = json.loads(message)
+                yield format_sse(payload['event'], payload['data'])
+        finally:
+            event_broker.unsubscribe(user.id, queue)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 class LinkedInContentGenerationAPIView(APIView):
@@ -428,6 +589,36 @@ class CampaignNotificationAPIView(APIView):
             )
 
 
+def posts_with_assets(queryset):
+    """Attach each post's assets with a single prefetch query instead of one per post/asset"""
+    return queryset.prefetch_related(
+        Prefetch('assets', queryset=Asset.objects.only('id', 'name', 'file_type', 'file', 'rendition_paths').order_by('postasset__id'))
+    )
+
+
+def serialize_post_with_assets(post, request, fields):
+    """
+    Build the post payload shared by the campaign post endpoints
+    
+    ``post`` must come from ``posts_with_assets`` so reading its assets runs no queries.
+    """
+    post_data = {field: getattr(post, field) for field in fields}
+    post_data['assets'] = [
+        {
+            'id': asset.id,
+            'name': asset.name,
+            'file_type': asset.file_type,
+            'file_url': request.build_absolute_uri(asset.file.url) if asset.file else None,
+            'renditions': rendition_urls(asset, request)
+        }
+        for asset in post.assets.all()
+    ]
+    return post_data
+
+
+POST_DETAIL_FIELDS = ('id', 'content', 'publish_date', 'status', 'created_at', 'updated_at')
+
+
 class CampaignPostsView(APIView):
     """
     API endpoint for viewing campaign posts (accessed via notification URL)
@@ -440,16 +631,16 @@ class CampaignPostsView(APIView):
         """Get posts for a campaign that are ready for publishing"""
         try:
             # Get campaign
-            campaign = Campaign.objects.get(id=campaign_id)
+            campaign = Campaign.objects.select_related('platform').get(id=campaign_id)
             
             # Get posts that are due for publishing
             from django.utils import timezone
             now = timezone.now()
             
-            due_posts = CampaignPost.objects.filter(
+            due_posts = posts_with_assets(CampaignPost.objects.filter(
                 campaign_id=campaign_id,
                 publish_date__lte=now
-            ).order_by('publish_date')
+            ).order_by('publish_date'))
             
             # Mark notification as read if user is authenticated
             if request.user.is_authenticated:
@@ -463,25 +654,8 @@ class CampaignPostsView(APIView):
             # Serialize posts with assets
             posts_data = []
             for post in due_posts:
-                post_data = {
-                    'id': post.id,
-                    'content': post.content,
-                    'publish_date': post.publish_date,
-                    'campaign_title': campaign.title,
-                    'assets': []
-                }
-                
-                # Get assets for this post
-                post_assets = PostAsset.objects.filter(post=post)
-                for post_asset in post_assets:
-                    asset_data = {
-                        'id': post_asset.asset.id,
-                        'name': post_asset.asset.name,
-                        'file_type': post_asset.asset.file_type,
-                        'file_url': request.build_absolute_uri(post_asset.asset.file.url) if post_asset.asset.file else None
-                    }
-                    post_data['assets'].append(asset_data)
-                
+                post_data = serialize_post_with_assets(post, request, ('id', 'content', 'publish_date'))
+                post_data['campaign_title'] = campaign.title
                 posts_data.append(post_data)
             
             return Response({
@@ -489,7 +663,7 @@ class CampaignPostsView(APIView):
                 'campaign': {
                     'id': campaign.id,
                     'title': campaign.title,
-                    'platform': campaign.platform.title
+                    'platform': campaign.platform.get_name_display()
                 },
                 'posts': posts_data,
                 'total_posts': len(posts_data),
@@ -530,7 +704,7 @@ class CampaignCreationViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filter campaigns by current user"""
-        return Campaign.objects.filter(user=self.request.user)
+        return campaign_queryset().filter(user=self.request.user)
     
     def perform_create(self, serializer):
         """Assign user to campaign during creation"""
@@ -664,29 +838,21 @@ class CampaignCreationViewSet(viewsets.ModelViewSet):
                 # Calculate post date within the first period
                 post_date = start_date + timedelta(days=i * (execution_period_days // posts_per_period))
                 
-                # Generate content
-                result = linkedin_controller.generate_linkedin_content(campaign.id, user_id)
+                # Generate content; the post is saved below with its own publish date
+                result = linkedin_controller.generate_linkedin_content(campaign.id, user_id, persist=False)
                 print(result)
                 if result.get('success'):
-                    # Create the actual post in the database
-                    post_data = {
-                        'campaign_id': campaign.id,
+                    # Create the actual post in the database, linked to its asset
+                    draft = {
                         'content': result.get('generated_content', result.get('post', '')),
                         'publish_date': post_date,
-                        'status': 'PENDING'  # Set initial status to PENDING
+                        'asset_id': (result.get('asset_used') or {}).get('id')
                     }
-                    
-                    # Create CampaignPost
-                    from .models import CampaignPost
-                    post = CampaignPost.objects.create(**post_data)
-                    
-                    # Link asset if available
-                    if result.get('asset_used'):
-                        from .models import PostAsset
-                        PostAsset.objects.create(
-                            post=post,
-                            asset_id=result['asset_used']['id']
-                        )
+                    saved = linkedin_controller.save_generated_posts(campaign.id, [draft])
+                    if not saved['posts']:
+                        print(f"Skipped post {i+1}: its asset is already used in this campaign")
+                        continue
+                    post = saved['posts'][0]
                     
                     first_period_posts.append({
                         'post_id': post.id,
@@ -705,85 +871,29 @@ class CampaignCreationViewSet(viewsets.ModelViewSet):
             print(f"Error generating first period posts: {str(e)}")
             return []
     
-    def _schedule_celery_tasks(self, campaign):
+    def _schedule_celery_tasks(self, campaign, posts_per_week=None):
         """
-        Schedule Celery tasks for subsequent periods of the campaign
+        Check that subsequent periods of the campaign will be dispatched
+        
+        Later periods are generated by process_due_campaigns from the campaign's
+        CampaignSchedule; no ETA tasks are queued here, since those would
+        generate every period a second time.
         
         Args:
             campaign: Campaign object
+            posts_per_week: Accepted for the schedule-celery endpoint; the number
+                of posts per period is derived from the execution period
             
         Returns:
-            bool: True if scheduling was successful
+            bool: True if the campaign has an enabled schedule
         """
         try:
-            from datetime import timedelta
-            from django.utils import timezone
-            
-            # Calculate campaign duration and periods
-            campaign_duration = (campaign.end_date - campaign.start_date).days
-            execution_period_days = campaign.execution_period
-            total_periods = (campaign_duration // execution_period_days) + 1
-            
-            # Skip first period (already handled)
-            periods_to_schedule = total_periods - 1
-            
-            if periods_to_schedule <= 0:
-                return True  # Campaign is only one period or less
-            
-            # Calculate posts per period (general approach)
-            posts_per_period = min(5, max(3, execution_period_days // 2))
-            
-            # Schedule Celery tasks for each subsequent period
-            for period in range(1, periods_to_schedule + 1):
-                period_start_date = campaign.start_date + timedelta(days=period * execution_period_days)
-                
-                # Schedule the task using Celery
-                self._schedule_period_posts_task(
-                    campaign_id=campaign.id,
-                    period_start_date=period_start_date,
-                    posts_per_period=posts_per_period,
-                    user_id=campaign.user.id
-                )
-            
-            return True
+            return CampaignSchedule.objects.filter(campaign=campaign, is_enabled=True).exists()
             
         except Exception as e:
-            print(f"Error scheduling Celery tasks: {str(e)}")
+            print(f"Error checking campaign schedule: {str(e)}")
             return False
     
-    def _schedule_period_posts_task(self, campaign_id, period_start_date, posts_per_period, user_id):
-        """
-        Schedule a Celery task for generating period posts
-        
-        Args:
-            campaign_id: ID of the campaign
-            period_start_date: Start date of the period
-            posts_per_period: Number of posts to generate
-            user_id: User ID
-        """
-        try:
-            # Import the Celery task
-            from .tasks import generate_period_posts_task
-            
-            # Schedule the task using Celery
-            generate_period_posts_task.apply_async(
-                args=[campaign_id, period_start_date, posts_per_period, user_id],
-                eta=period_start_date
-            )
-            
-            print(f"Scheduled period posts task for campaign {campaign_id}, period starting {period_start_date}")
-            
-            # Log the scheduling
-            from .models import PostLog
-            PostLog.objects.create(
-                post_id=None,  # Will be set when posts are created
-                status='scheduled',
-                error_message=f'Period posts scheduled for period starting {period_start_date}'
-            )
-            
-        except Exception as e:
-            print(f"Error scheduling period posts task: {str(e)}")
-    
     @action(detail=True, methods=['post'], url_path='schedule-celery')
     def schedule_celery_for_campaign(self, request, pk=None):
         """
@@ -1013,7 +1123,7 @@ class CampaignCreationViewSet(viewsets.ModelViewSet):
             
             # Validate campaign exists and belongs to user
             try:
-                campaign = Campaign.objects.get(id=campaign_id, user_id=user_id)
+                campaign = Campaign.objects.select_related('platform').get(id=campaign_id, user_id=user_id)
             except Campaign.DoesNotExist:
                 return Response({
                     'success': False,
@@ -1021,43 +1131,20 @@ class CampaignCreationViewSet(viewsets.ModelViewSet):
                 }, status=status.HTTP_404_NOT_FOUND)
             
             # Get posts filtered by status
-            posts = CampaignPost.objects.filter(
+            posts = posts_with_assets(CampaignPost.objects.filter(
                 campaign_id=campaign_id,
                 status=status_filter
-            ).order_by('-created_at')[:limit]
+            ).order_by('-created_at')[:limit])
             
             # Serialize posts with assets
-            posts_data = []
-            for post in posts:
-                post_data = {
-                    'id': post.id,
-                    'content': post.content,
-                    'publish_date': post.publish_date,
-                    'status': post.status,
-                    'created_at': post.created_at,
-                    'updated_at': post.updated_at,
-                    'assets': []
-                }
-                
-                # Get assets for this post
-                post_assets = PostAsset.objects.filter(post=post)
-                for post_asset in post_assets:
-                    asset_data = {
-                        'id': post_asset.asset.id,
-                        'name': post_asset.asset.name,
-                        'file_type': post_asset.asset.file_type,
-                        'file_url': request.build_absolute_uri(post_asset.asset.file.url) if post_asset.asset.file else None
-                    }
-                    post_data['assets'].append(asset_data)
-                
-                posts_data.append(post_data)
+            posts_data = [serialize_post_with_assets(post, request, POST_DETAIL_FIELDS) for post in posts]
             
             return Response({
                 'success': True,
                 'campaign': {
                     'id': campaign.id,
                     'title': campaign.title,
-                    'platform': campaign.platform.title
+                    'platform': campaign.platform.get_name_display()
                 },
                 'posts': posts_data,
                 'total_posts': len(posts_data),
@@ -1122,7 +1209,7 @@ class CampaignCreationViewSet(viewsets.ModelViewSet):
             
             # Get the post and verify it belongs to this campaign
             try:
-                post = CampaignPost.objects.get(id=post_id, campaign=campaign)
+                post = posts_with_assets(CampaignPost.objects.filter(id=post_id, campaign=campaign)).get()
             except CampaignPost.DoesNotExist:
                 return Response({
                     'success': False,
@@ -1130,30 +1217,14 @@ class CampaignCreationViewSet(viewsets.ModelViewSet):
                 }, status=status.HTTP_404_NOT_FOUND)
             
             # Update the status
+            status_changed = post.status != new_status
             post.status = new_status
             post.save()
+            if status_changed:
+                publish_post_status_changed(post, campaign.user_id)
             
             # Prepare response data
-            post_data = {
-                'id': post.id,
-                'content': post.content,
-                'publish_date': post.publish_date,
-                'status': post.status,
-                'created_at': post.created_at,
-                'updated_at': post.updated_at,
-                'assets': []
-            }
-            
-            # Get assets for this post
-            post_assets = PostAsset.objects.filter(post=post)
-            for post_asset in post_assets:
-                asset_data = {
-                    'id': post_asset.asset.id,
-                    'name': post_asset.asset.name,
-                    'file_type': post_asset.asset.file_type,
-                    'file_url': request.build_absolute_uri(post_asset.asset.file.url) if post_asset.asset.file else None
-                }
-                post_data['assets'].append(asset_data)
+            post_data = serialize_post_with_assets(post, request, POST_DETAIL_FIELDS)
             
             return Response({
                 'success': True,
@@ -15,6 +15,11 @@ app.autodiscover_tasks()
 
 # زمان‌بندی تسک‌ها
 app.conf.beat_schedule = {
+    # دیسپچر واحد کمپین‌ها: هر ۵ ثانیه CampaignScheduleهای سررسید شده را از ایندکس درون‌حافظه‌ای اجرا می‌کند
+    'process_due_campaigns': {
+        'task': 'accounts.tasks.process_due_campaigns',
+        'schedule': 5.0,
+    },
     # بررسی کمپین‌ها و ساخت پست‌ها هر روز ساعت 8 صبح
     'check_and_generate_due_posts_daily': {
         'task': 'accounts.tasks.check_and_generate_due_posts',
@@ -35,11 +40,26 @@ app.conf.beat_schedule = {
         'task': 'accounts.tasks.cleanup_unused_assets',
         'schedule': crontab(hour=3, minute=0, day_of_week='sunday'),
     },
+    # حذف آپلودهای چندتکه‌ی ناتمام و قطعات آن‌ها هر ساعت
+    'cleanup_stale_uploads_hourly': {
+        'task': 'accounts.tasks.cleanup_stale_uploads',
+        'schedule': crontab(minute=30, hour='*'),
+    },
+    # حذف تحلیل‌های تصویری منقضی یا مازاد از کش هر روز ساعت 4 بامداد
+    'evict_image_analyses_daily': {
+        'task': 'accounts.tasks.evict_image_analyses',
+        'schedule': crontab(hour=4, minute=0),
+    },
     # آپدیت وضعیت کمپین‌ها هر نیمه‌شب
     'update_campaign_status_midnight': {
         'task': 'accounts.tasks.update_campaign_status',
         'schedule': crontab(hour=0, minute=0),
     },
+    # ساخت اسنپ‌شات روزانه آمار کمپین‌ها هر روز ساعت 2 بامداد
+    'generate_campaign_analytics_daily': {
+        'task': 'accounts.tasks.generate_campaign_analytics',
+        'schedule': crontab(hour=2, minute=0),
+    },
     # چک سلامت سیستم هر ساعت
     'health_check_hourly': {
         'task': 'accounts.tasks.health_check_task',
@@ -126,6 +126,35 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'accounts.User'
+
+# --- REST Framework ---
+# Every list endpoint uses keyset (cursor) pagination; clients may pass ?page_size=
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'accounts.pagination.KeysetPagination',
+    'PAGE_SIZE': int(os.getenv('API_PAGE_SIZE', '50')),
+}
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '200'))
+
+# --- Cache ---
+# Shared Redis cache (separate database from the Celery broker) for API payloads,
+# task idempotency keys and counters
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_CACHE_URL', 'redis://localhost:6379/1'),
+        'KEY_PREFIX': 'core',
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT_SECONDS', '300')),
+    }
+}
+# Per-user notification counters are recounted from the table at least this often
+NOTIFICATION_COUNTER_TTL_SECONDS = int(os.getenv('NOTIFICATION_COUNTER_TTL_SECONDS', '3600'))
+
+# --- Server-Sent Events ---
+# Notification/post events are published on Redis pub/sub and streamed to clients
+# from /api/notifications/stream/ (requires serving core.asgi with an ASGI server)
+EVENTS_REDIS_URL = os.getenv('EVENTS_REDIS_URL', 'redis://localhost:6379/2')
+SSE_HEARTBEAT_SECONDS = int(os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
+
 # --- Celery Configuration ---
 # Redis is our broker and backend
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
@@ -135,6 +164,13 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Asia/Tehran' # یا منطقه زمانی خودتان.
 CELERY_ENABLE_UTC = False
+# process_due_campaigns reloads its in-memory due-schedule heap when another process
+# changes a schedule (a change marker in the cache) and at least this often (seconds)
+SCHEDULE_INDEX_REFRESH_SECONDS = int(os.getenv('SCHEDULE_INDEX_REFRESH_SECONDS', '300'))
+# Campaign-wide periodic tasks are split into this many parallel subtasks (by campaign id range)
+CAMPAIGN_SHARD_COUNT = int(os.getenv('CAMPAIGN_SHARD_COUNT', '8'))
+# Maintenance tasks update/delete rows in primary key ranges of this size
+MAINTENANCE_CHUNK_SIZE = int(os.getenv('MAINTENANCE_CHUNK_SIZE', '5000'))
 
     # اگر وظیفه دیگری دارید، آن را اینجا اضافه کنید
 # --- OpenRouter API Key ---
@@ -142,6 +178,36 @@ OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY', 'sk-or-v1-ea894844ab7c153b4
 if not OPENROUTER_API_KEY:
     raise Exception("OPENROUTER_API_KEY environment variable not set!")
 
+# Connection pool for the shared OpenRouter HTTP clients (one sync and one async per process)
+OPENROUTER_HTTP_MAX_CONNECTIONS = int(os.getenv('OPENROUTER_HTTP_MAX_CONNECTIONS', '20'))
+OPENROUTER_HTTP_MAX_KEEPALIVE = int(os.getenv('OPENROUTER_HTTP_MAX_KEEPALIVE', '10'))
+OPENROUTER_HTTP_KEEPALIVE_EXPIRY = float(os.getenv('OPENROUTER_HTTP_KEEPALIVE_EXPIRY', '60'))
+
+# --- Content Generation ---
+# Maximum number of posts generated concurrently in a single batch
+CONTENT_GENERATION_MAX_WORKERS = int(os.getenv('CONTENT_GENERATION_MAX_WORKERS', '5'))
+# How long a worker may hold an asset claimed for a campaign before it is released
+ASSET_RESERVATION_TTL_SECONDS = int(os.getenv('ASSET_RESERVATION_TTL_SECONDS', '900'))
+# Vision analyses are cached by image content hash; expired or least recently
+# used entries beyond the limit are evicted daily (evict_image_analyses)
+IMAGE_ANALYSIS_CACHE_TTL_DAYS = int(os.getenv('IMAGE_ANALYSIS_CACHE_TTL_DAYS', '90'))
+IMAGE_ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv('IMAGE_ANALYSIS_CACHE_MAX_ENTRIES', '10000'))
+# Memoization of generated text: off | memory | record | replay
+# "replay" serves only responses recorded in AI_RESPONSE_RECORDINGS_DIR (offline load tests)
+AI_RESPONSE_CACHE_MODE = os.getenv('AI_RESPONSE_CACHE_MODE', 'off')
+AI_RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('AI_RESPONSE_CACHE_MAX_ENTRIES', '1000'))
+AI_RESPONSE_CACHE_TTL_SECONDS = int(os.getenv('AI_RESPONSE_CACHE_TTL_SECONDS', '3600'))
+AI_RESPONSE_RECORDINGS_DIR = os.getenv('AI_RESPONSE_RECORDINGS_DIR', str(BASE_DIR / 'ai_recordings'))
+
+# --- Asset Processing ---
+# Resumable uploads (/api/asset-uploads/) are sent in parts of this size; parts are written
+# into one file in ASSET_UPLOAD_DIR (default MEDIA_ROOT/uploads) until the upload completes
+ASSET_UPLOAD_PART_SIZE = int(os.getenv('ASSET_UPLOAD_PART_SIZE', str(8 * 1024 * 1024)))
+ASSET_UPLOAD_MAX_SIZE = int(os.getenv('ASSET_UPLOAD_MAX_SIZE', str(5 * 1024 ** 3)))
+ASSET_UPLOAD_DIR = os.getenv('ASSET_UPLOAD_DIR')
+# Uploads not completed within this many hours are discarded with their parts
+ASSET_UPLOAD_EXPIRY_HOURS = int(os.getenv('ASSET_UPLOAD_EXPIRY_HOURS', '24'))
+
 # --- CORS (برای ارتباط با اکستنشن فرانت‌اِند) ---
 # اگر اکستنشن در دامنه دیگری اجرا می‌شود
 CORS_ALLOW_ALL_ORIGINS = True # در Production این را به لیست دامنه‌های مجاز محدود کنید
@@ -158,6 +224,8 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For developm
 # EMAIL_HOST_PASSWORD = 'your-app-password'
 
 DEFAULT_FROM_EMAIL = 'noreply@yourdomain.com'
+# Bulk and reminder emails reuse one backend connection per batch of this many messages
+EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', '100'))
 
 # --- CORS (برای ارتباط با اکستنشن فرانت‌اِند) ---
 # اگر اکستنشن در دامنه دیگری اجرا می‌شود